@@ -0,0 +1,79 @@
+"""
+Compara duas rodadas do bench.run (antes → depois) pela mediana de cada caso.
+
+    python -m bench.compare bench/results/antes.json bench/results/depois.json
+    python -m bench.compare antes.json depois.json --threshold 30 --fail-on-regression   # gate de CI
+
+Piora = mediana subiu mais que --threshold % E mais que --min-ms (abaixo disso é ruído).
+"""
+import sys
+import json
+import argparse
+
+
+def load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+def compare(base: dict, new: dict, threshold: float = 20.0, min_ms: float = 0.05) -> list[dict]:
+    rows = []
+    names = list(base["results"]) + [n for n in new["results"] if n not in base["results"]]
+    for name in names:
+        a = base["results"].get(name)
+        b = new["results"].get(name)
+        if a is None or b is None:
+            rows.append({"case": name, "before": a and a["median_ms"], "after": b and b["median_ms"],
+                         "change_pct": None, "status": "novo" if a is None else "removido"})
+            continue
+        before, after = a["median_ms"], b["median_ms"]
+        change = (after - before) / before * 100 if before else 0.0
+        status = "="
+        if abs(after - before) >= min_ms:
+            if change > threshold:
+                status = "PIOROU"
+            elif change < -threshold:
+                status = "melhorou"
+        rows.append({"case": name, "before": before, "after": after, "change_pct": round(change, 1), "status": status})
+    return rows
+
+def _meta_warnings(base: dict, new: dict) -> list[str]:
+    out = []
+    for key in ("backend", "volumes", "cache"):
+        if base["meta"].get(key) != new["meta"].get(key):
+            out.append(f"{key} diferente: {base['meta'].get(key)} → {new['meta'].get(key)}")
+    return out
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.compare", description="Compara duas rodadas do benchmark.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=20.0, help="variação em %% para contar como mudança")
+    parser.add_argument("--min-ms", type=float, default=0.05, help="diferença absoluta mínima (ms)")
+    parser.add_argument("--fail-on-regression", action="store_true", help="sai com código 1 se algo piorou")
+    args = parser.parse_args(argv)
+
+    base, new = load(args.before), load(args.after)
+    print(f"antes:  {base['meta'].get('git')} {base['meta']['started_at']} ({base['meta']['server']})")
+    print(f"depois: {new['meta'].get('git')} {new['meta']['started_at']} ({new['meta']['server']})")
+    for w in _meta_warnings(base, new):
+        print(f"⚠️  {w} — os números não são comparáveis")
+    print()
+
+    rows = compare(base, new, args.threshold, args.min_ms)
+    fmt = lambda v: "—" if v is None else f"{v:.3f}"
+    print(f"{'caso':<36} {'antes (ms)':>11} {'depois (ms)':>12} {'var.':>8}")
+    for r in rows:
+        change = "" if r["change_pct"] is None else f"{r['change_pct']:+.1f}%"
+        mark = "" if r["status"] == "=" else f"  {r['status']}"
+        print(f"{r['case']:<36} {fmt(r['before']):>11} {fmt(r['after']):>12} {change:>8}{mark}")
+
+    worse = [r for r in rows if r["status"] == "PIOROU"]
+    better = [r for r in rows if r["status"] == "melhorou"]
+    print(f"\n{len(better)} melhorou, {len(worse)} piorou (limite {args.threshold:g}% e {args.min_ms:g} ms)")
+    if worse and args.fail_on_regression:
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,385 @@
+"""
+Gerador de dados sintéticos para o benchmark (reprodutível: mesma semente → mesmos dados).
+
+    python -m bench.generate --profile medium
+    python -m bench.generate --backend postgres --profile large
+    python -m bench.generate --profile small --users 3 --events 50000   # perfil + ajustes
+
+Volumes por perfil em PROFILES; qualquer um pode ser trocado pela linha de comando.
+Os alimentos passam pelo upsert_foods (como o import da TACO); o resto entra em lote
+direto nas tabelas, em blocos de CHUNK linhas. No fim: diet_totals, manutenção dos
+eventos (partições/rotação + agregados) e ANALYZE.
+"""
+import sys
+import json
+import random
+import argparse
+from datetime import date, datetime, timedelta
+
+from bench import DEFAULT_PG_URL, DEFAULT_SQLITE_PATH, setup_backend
+
+CHUNK = 10_000
+DATASET_META_KEY = "bench_dataset"
+DATASET_VERSION = 2            # muda quando o formato dos dados gerados muda (força gerar de novo)
+# todos os usuários do benchmark: nutri1@bench.local, nutri2@... com essa senha (bench.load faz login)
+BENCH_PASSWORD = "bench123"
+
+PROFILES = {
+    "small": dict(
+        users=2, patients_per_user=50, years=1, assessments_per_year=12, diets_per_patient=2,
+        items_per_diet=10, appointments_per_patient=6, events=10_000, event_days=60, foods=600,
+    ),
+    "medium": dict(
+        users=5, patients_per_user=200, years=2, assessments_per_year=26, diets_per_patient=4,
+        items_per_diet=20, appointments_per_patient=12, events=200_000, event_days=90, foods=600,
+    ),
+    "large": dict(
+        users=10, patients_per_user=500, years=3, assessments_per_year=26, diets_per_patient=6,
+        items_per_diet=25, appointments_per_patient=24, events=1_000_000, event_days=180, foods=600,
+    ),
+}
+
+FIRST_NAMES = [
+    "Ana", "Bruno", "Carla", "Daniel", "Eduarda", "Felipe", "Gabriela", "Heitor", "Isabela", "João",
+    "Karina", "Lucas", "Mariana", "Nicolas", "Olívia", "Pedro", "Rafaela", "Samuel", "Tatiane", "Vinícius",
+]
+LAST_NAMES = [
+    "Silva", "Santos", "Oliveira", "Souza", "Rodrigues", "Ferreira", "Alves", "Pereira", "Lima", "Gomes",
+    "Costa", "Ribeiro", "Martins", "Carvalho", "Almeida", "Lopes", "Soares", "Fernandes", "Vieira", "Barbosa",
+]
+FOOD_BASES = [
+    "Arroz branco", "Arroz integral", "Feijão carioca", "Feijão preto", "Lentilha", "Grão-de-bico",
+    "Frango peito", "Frango coxa", "Carne bovina patinho", "Carne bovina acém", "Carne suína lombo",
+    "Peixe tilápia", "Peixe sardinha", "Ovo de galinha", "Batata inglesa", "Batata doce", "Mandioca",
+    "Abóbora cabotiá", "Cenoura", "Beterraba", "Brócolis", "Couve manteiga", "Espinafre", "Abobrinha",
+    "Berinjela", "Chuchu", "Vagem", "Tomate", "Cebola", "Pimentão", "Milho verde", "Ervilha",
+    "Macarrão", "Pão francês", "Pão integral", "Aveia", "Tapioca", "Cuscuz de milho", "Quinoa",
+    "Banana prata", "Maçã", "Mamão papaia", "Laranja pera", "Manga", "Abacate", "Morango", "Uva",
+    "Leite integral", "Leite desnatado", "Iogurte natural", "Queijo minas", "Queijo muçarela",
+    "Requeijão", "Castanha-do-pará", "Amendoim", "Azeite de oliva", "Manteiga", "Açúcar mascavo",
+    "Mel", "Chocolate amargo",
+]
+FOOD_STYLES = ["cru", "cozido", "grelhado", "assado", "refogado", "frito", "no vapor", "light", "orgânico", "congelado"]
+MEALS = ["Café da manhã", "Lanche manhã", "Almoço", "Lanche tarde", "Jantar", "Ceia"]
+APPOINTMENT_TYPES = ["Consulta", "Retorno", "Reavaliação"]
+DIET_METAS = ["Déficit (-15%)", "Déficit (-20%)", "Manutenção (0%)", "Superávit (+10%)", "Superávit (+15%)"]
+OBJETIVOS = ["Emagrecimento", "Ganho de massa", "Manutenção", "Performance/saúde"]
+ATIVIDADES = ["Sedentário", "Leve", "Moderado", "Alto", "Muito alto"]
+EVENT_NAMES = [
+    "patient_created", "patient_updated", "appointment_created", "appointment_updated", "assessment_created",
+    "pdf_generated", "diet_item_added", "diet_item_deleted", "error",
+]
+FEEDBACK_PAGES = ["Home", "Cadastro", "Agenda", "Avaliação", "Dieta", "Relatório", "Montar refeições"]
+
+
+# --------------------------------------------------
+# Banco
+# --------------------------------------------------
+
+def reset_database(db, force: bool = False):
+    """Apaga o banco do benchmark (arquivo SQLite ou o banco inteiro no Postgres)."""
+    if not db.USE_POSTGRES:
+        db.close_pool()
+        for suffix in ("", "-wal", "-shm"):
+            p = db.SQLITE_PATH.with_name(db.SQLITE_PATH.name + suffix)
+            if p.exists():
+                p.unlink()
+        return
+
+    from urllib.parse import urlparse
+    psycopg2 = db._psycopg2()
+    url = urlparse(db.DATABASE_URL)
+    name = url.path.lstrip("/")
+    if not name.endswith("_bench") and not force:
+        raise SystemExit(f"Recusando apagar '{name}': o banco do benchmark precisa terminar em _bench (ou --force)")
+    db.close_pool()
+    admin = psycopg2.connect(db.DATABASE_URL.replace(url.path, "/postgres", 1))
+    admin.autocommit = True
+    with admin.cursor() as cur:
+        cur.execute(f'DROP DATABASE IF EXISTS "{name}"')
+        cur.execute(f'CREATE DATABASE "{name}"')
+    admin.close()
+
+def _bulk(db, table: str, columns: tuple, rows: list):
+    if not rows:
+        return
+    cols = ", ".join(columns)
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        if db.USE_POSTGRES:
+            from psycopg2.extras import execute_values
+            execute_values(cur, f"INSERT INTO {table} ({cols}) VALUES %s", rows, page_size=1000)
+        else:
+            cur.executemany(f"INSERT INTO {table} ({cols}) VALUES ({', '.join(['?'] * len(columns))})", rows)
+
+def _bulk_chunks(db, table: str, columns: tuple, rows) -> int:
+    """Insere um gerador de linhas em blocos de CHUNK (memória fica constante)."""
+    n = 0
+    buf = []
+    for row in rows:
+        buf.append(row)
+        if len(buf) >= CHUNK:
+            _bulk(db, table, columns, buf)
+            n += len(buf)
+            buf = []
+    _bulk(db, table, columns, buf)
+    return n + len(buf)
+
+def _select(db, sql: str) -> list[dict]:
+    with db.get_conn(readonly=True, primary=True) as conn:
+        cur = conn.cursor()
+        cur.execute(sql)
+        return db._dicts(cur.fetchall())
+
+def table_counts(db) -> dict:
+    tables = ("users", "patients", "assessments", "diets", "diet_items", "appointments", "foods", "feedback")
+    out = {}
+    with db.get_conn(readonly=True, primary=True) as conn:
+        cur = conn.cursor()
+        for t in tables:
+            cur.execute(f"SELECT COUNT(*) FROM {t}")
+            out[t] = int(db._scalar(cur.fetchone()) or 0)
+        from utils import event_store
+        event_tables = ["event_logs"] + ([] if db.USE_POSTGRES else list(event_store.month_tables(cur).values()))
+        total = 0
+        for t in event_tables:
+            cur.execute(f"SELECT COUNT(*) FROM {t}")
+            total += int(db._scalar(cur.fetchone()) or 0)
+        out["event_logs"] = total
+    return out
+
+def bench_email(i: int) -> str:
+    return f"nutri{i + 1}@bench.local"
+
+def dataset_key(volumes: dict, seed: int) -> dict:
+    """O que identifica um banco gerado (comparado com app_meta antes de reaproveitar)."""
+    return dict(volumes, seed=seed, version=DATASET_VERSION)
+
+def dataset_info(db) -> dict | None:
+    """Parâmetros com que o banco do benchmark foi gerado (None se não foi)."""
+    try:
+        rows = _select(db, f"SELECT value FROM app_meta WHERE key = '{DATASET_META_KEY}'")
+    except Exception:
+        return None
+    return json.loads(rows[0]["value"]) if rows else None
+
+
+# --------------------------------------------------
+# Linhas
+# --------------------------------------------------
+
+def _foods(rng: random.Random, n: int) -> list[dict]:
+    out = []
+    for i in range(n):
+        base = FOOD_BASES[i % len(FOOD_BASES)]
+        style = FOOD_STYLES[(i // len(FOOD_BASES)) % len(FOOD_STYLES)]
+        nome = f"{base}, {style}" + (f" {i // (len(FOOD_BASES) * len(FOOD_STYLES)) + 1}" if i >= len(FOOD_BASES) * len(FOOD_STYLES) else "")
+        out.append({
+            "nome": nome,
+            "kcal": round(rng.uniform(15, 600), 1),
+            "proteina_g": round(rng.uniform(0, 35), 1),
+            "carbo_g": round(rng.uniform(0, 80), 1),
+            "gordura_g": round(rng.uniform(0, 40), 1),
+            "fibra_g": round(rng.uniform(0, 12), 1),
+            "sodio_mg": round(rng.uniform(0, 900), 0),
+        })
+    return out
+
+def _patients(rng, user_ids, per_user):
+    for uid in user_ids:
+        for _ in range(per_user):
+            sexo = rng.choice(["Feminino", "Masculino"])
+            nome = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.choice(LAST_NAMES)}"
+            nasc = date(1950, 1, 1) + timedelta(days=rng.randrange(0, 365 * 55))
+            yield (uid, nome, f"(11) 9{rng.randrange(10**7, 10**8)}", "", nasc.isoformat(), sexo, "")
+
+def _assessments(rng, patients, today, years, per_year):
+    step = max(1, 365 // max(1, per_year))
+    for p in patients:
+        n = rng.randint(max(1, years * per_year // 2), years * per_year)
+        day = today - timedelta(days=step * n)
+        peso = rng.uniform(55, 120)
+        altura = rng.uniform(150, 195)
+        cintura = peso * rng.uniform(0.8, 1.0)
+        for _ in range(n):
+            peso = max(40.0, peso + rng.uniform(-1.0, 0.8))
+            cintura = max(55.0, cintura + rng.uniform(-0.8, 0.6))
+            quadril = cintura * rng.uniform(1.05, 1.25)
+            pescoco = rng.uniform(30, 42)
+            yield (
+                p["user_id"], p["id"], day.isoformat(), round(peso, 1), round(altura, 1), round(cintura, 1),
+                round(quadril, 1), round(pescoco, 1), round(rng.uniform(12, 40), 1),
+                rng.choice(OBJETIVOS), rng.choice(ATIVIDADES), round(rng.uniform(5, 9), 1), "",
+            )
+            day += timedelta(days=step)
+
+def _diets(rng, patients, today, years, per_patient):
+    for p in patients:
+        for _ in range(per_patient):
+            day = today - timedelta(days=rng.randrange(0, 365 * years))
+            bmr = rng.uniform(1200, 2200)
+            tdee = bmr * rng.uniform(1.2, 1.9)
+            alvo = tdee * rng.uniform(0.8, 1.15)
+            yield (
+                p["user_id"], p["id"], day.isoformat(), round(bmr, 1), round(tdee, 1), round(alvo, 1),
+                rng.choice(DIET_METAS), round(rng.uniform(1.2, 2.2), 1), round(rng.uniform(0.2, 0.35), 2),
+                round(alvo * 0.25 / 4, 1), round(alvo * 0.5 / 4, 1), round(alvo * 0.25 / 9, 1),
+            )
+
+def _diet_items(rng, diets, food_ids, per_diet, now_iso):
+    for d in diets:
+        for _ in range(per_diet):
+            yield (
+                d["user_id"], d["patient_id"], d["id"], rng.choice(MEALS), rng.choice(food_ids),
+                float(rng.choice([30, 50, 80, 100, 120, 150, 200])), now_iso,
+            )
+
+def _appointments(rng, patients, today, per_patient):
+    for p in patients:
+        for _ in range(per_patient):
+            day = today + timedelta(days=rng.randrange(-365, 60))
+            dt = datetime.combine(day, datetime.min.time()).replace(hour=rng.randrange(8, 19), minute=rng.choice([0, 30]))
+            yield (p["user_id"], p["id"], dt.isoformat(), rng.choice(APPOINTMENT_TYPES), "")
+
+def _events(rng, user_ids, n, days, now):
+    for _ in range(n):
+        name = rng.choice(EVENT_NAMES)
+        meta = {"page": rng.choice(FEEDBACK_PAGES), "action": "save"} if name == "error" else {"patient_id": rng.randrange(1, 10_000)}
+        at = now - timedelta(seconds=rng.randrange(0, days * 86400))
+        yield (rng.choice(user_ids), name, json.dumps(meta), at.isoformat())
+
+
+# --------------------------------------------------
+# Geração
+# --------------------------------------------------
+
+def generate(db, seed: int = 42, log=print, **volumes) -> dict:
+    """Gera o conjunto inteiro num banco vazio e devolve as contagens por tabela."""
+    from utils import event_store
+
+    rng = random.Random(seed)
+    today = date.today()
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
+
+    db.init_db()
+
+    log("alimentos…")
+    db.upsert_foods(_foods(rng, volumes["foods"]))
+    food_ids = [r["id"] for r in _select(db, "SELECT id FROM foods ORDER BY id")]
+
+    log("usuários…")
+    import bcrypt
+    password_hash = bcrypt.hashpw(BENCH_PASSWORD.encode("utf-8"), bcrypt.gensalt()).decode("utf-8")
+    emails = [bench_email(i) for i in range(volumes["users"])]
+    _bulk(db, "users", ("email", "password_hash", "created_at"), [(e, password_hash, now_iso) for e in emails])
+    _bulk(db, "beta_allowlist", ("email", "created_at"), [(e, now_iso) for e in emails])
+    user_ids = [r["id"] for r in _select(db, "SELECT id FROM users ORDER BY id")]
+
+    log("pacientes…")
+    _bulk_chunks(db, "patients", ("user_id", "nome", "telefone", "email", "nascimento", "sexo", "obs"),
+                 _patients(rng, user_ids, volumes["patients_per_user"]))
+    patients = _select(db, "SELECT id, user_id FROM patients ORDER BY id")
+
+    log("avaliações…")
+    _bulk_chunks(db, "assessments", ("user_id", "patient_id") + db.ASSESSMENT_FIELDS,
+                 _assessments(rng, patients, today, volumes["years"], volumes["assessments_per_year"]))
+
+    log("dietas…")
+    _bulk_chunks(db, "diets", ("user_id", "patient_id") + db.DIET_FIELDS,
+                 _diets(rng, patients, today, volumes["years"], volumes["diets_per_patient"]))
+    diets = _select(db, "SELECT id, user_id, patient_id FROM diets ORDER BY id")
+
+    log("itens de dieta…")
+    _bulk_chunks(db, "diet_items", ("user_id", "patient_id", "diet_id", "meal", "food_id", "grams", "created_at"),
+                 _diet_items(rng, diets, food_ids, volumes["items_per_diet"], now_iso))
+    db.rebuild_diet_totals()
+
+    log("agenda…")
+    _bulk_chunks(db, "appointments", ("user_id", "patient_id", "dt_iso", "tipo", "notas"),
+                 _appointments(rng, patients, today, volumes["appointments_per_patient"]))
+
+    log("feedback…")
+    _bulk(db, "feedback", ("user_id", "page", "message", "rating", "created_at"), [
+        (uid, rng.choice(FEEDBACK_PAGES), "mensagem de teste", rng.randint(0, 10),
+         (now - timedelta(days=rng.randrange(0, volumes["event_days"]))).isoformat())
+        for uid in user_ids for _ in range(20)
+    ])
+
+    log("eventos…")
+    if db.USE_POSTGRES:
+        # partição de cada mês antes do INSERT (senão tudo cai na partição default)
+        months = {date(d.year, d.month, 1) for d in
+                  (today - timedelta(days=i) for i in range(0, volumes["event_days"] + 31, 28))}
+        with db.get_conn(primary=True) as conn:
+            event_store.ensure_partitions(conn.cursor(), today, months=months)
+    buf = []
+    for row in _events(rng, user_ids, volumes["events"], volumes["event_days"], now):
+        buf.append(row)
+        if len(buf) >= CHUNK:
+            db.insert_events(buf)
+            buf = []
+    db.insert_events(buf)
+    event_store.maintain()
+
+    log("ANALYZE…")
+    with db.get_conn(primary=True) as conn:
+        cur = conn.cursor()
+        cur.execute("ANALYZE")
+        ph = "%s" if db.USE_POSTGRES else "?"
+        cur.execute(
+            f"INSERT INTO app_meta (key, value) VALUES ({ph}, {ph}) "
+            f"ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+            (DATASET_META_KEY, json.dumps(dataset_key(volumes, seed), sort_keys=True)),
+        )
+
+    return table_counts(db)
+
+
+def ensure_dataset(db, volumes: dict, seed: int, regenerate: bool) -> dict:
+    """Confere se o banco foi gerado com esses volumes; gera de novo se `regenerate`."""
+    wanted = dataset_key(volumes, seed)
+    if dataset_info(db) != wanted:
+        if not regenerate:
+            raise SystemExit("Banco do benchmark ausente ou de outro perfil: rode com --generate (ou python -m bench.generate).")
+        print("Gerando dados…")
+        reset_database(db)
+        generate(db, seed=seed, log=lambda msg: None, **volumes)
+    return wanted
+
+def volumes_from_args(args) -> dict:
+    volumes = dict(PROFILES[args.profile])
+    for key in volumes:
+        value = getattr(args, key, None)
+        if value is not None:
+            volumes[key] = value
+    return volumes
+
+def add_dataset_args(parser: argparse.ArgumentParser):
+    """Opções compartilhadas com o bench.run."""
+    parser.add_argument("--backend", choices=["sqlite", "postgres"], default="sqlite")
+    parser.add_argument("--sqlite-path", default=str(DEFAULT_SQLITE_PATH))
+    parser.add_argument("--database-url", default=DEFAULT_PG_URL)
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="medium")
+    parser.add_argument("--seed", type=int, default=42)
+    for key in PROFILES["medium"]:
+        parser.add_argument(f"--{key.replace('_', '-')}", dest=key, type=int, default=None)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.generate", description="Gera o banco do benchmark.")
+    add_dataset_args(parser)
+    parser.add_argument("--force", action="store_true", help="Postgres: apaga mesmo que o banco não termine em _bench")
+    args = parser.parse_args(argv)
+
+    db = setup_backend(args.backend, args.sqlite_path, args.database_url)
+    volumes = volumes_from_args(args)
+    reset_database(db, force=args.force)
+    started = datetime.now()
+    counts = generate(db, seed=args.seed, **volumes)
+    print(f"OK em {(datetime.now() - started).total_seconds():.1f}s")
+    for table, n in counts.items():
+        print(f"   {table:<13} {n:>10,}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,365 @@
+"""
+Carga nas páginas do Streamlit: várias sessões simultâneas, cada uma um AppTest
+rodando o roteiro de uma nutricionista (login → paciente → páginas 1–7 → busca de
+alimento → item na refeição → PDF).
+
+    python -m bench.load --profile small --generate                 # 4 sessões, 1 processo
+    python -m bench.load --threads 8 --processes 4 --iterations 3   # 32 sessões simultâneas
+    python -m bench.load --max-p95-ms 800                           # gate: sai com 1 se passar disso
+
+Cada passo do roteiro é um rerun; para cada um sai a latência (percentis), quantas consultas
+foram ao banco (rastro do utils/profiler.py) e se deu exceção. No fim: reruns/s e sessões/min
+— o número de capacidade de um processo. O JSON tem o mesmo formato do bench.run, então
+`python -m bench.compare` compara duas rodadas de carga também.
+
+Threads dividem o GIL como no servidor de verdade (um processo Streamlit, várias sessões);
+--processes simula mais de um processo atrás do balanceador.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+import multiprocessing
+from datetime import datetime
+
+from bench import BENCH_DIR, RESULTS_DIR, WORK_DIR, setup_backend
+from bench.generate import BENCH_PASSWORD, FIRST_NAMES, FOOD_BASES, add_dataset_args, bench_email, ensure_dataset, volumes_from_args
+from bench.run import git_commit, server_version, summarize
+
+APP_DIR = BENCH_DIR.parent
+
+
+# --------------------------------------------------
+# Roteiro
+# --------------------------------------------------
+
+def _page(path):
+    return lambda at, rng: at.switch_page(path).run()
+
+def _login(email):
+    def step(at, rng):
+        at.text_input[0].set_value(email)
+        at.text_input[1].set_value(BENCH_PASSWORD)
+        at.button[0].click().run()
+    return step
+
+def _pick_patient(at, rng):
+    # busca por um paciente que o seletor já mostra — um nome qualquer pode não ser desse usuário
+    shown = [o for box in at.sidebar.selectbox for o in box.options if not o.startswith("🕘")]
+    name = rng.choice(shown) if shown else rng.choice(FIRST_NAMES)
+    at.sidebar.text_input(key="patient_search").set_value(name[:3].lower()).run()
+
+def _search_foods(at, rng):
+    box = next((t for t in at.text_input if t.label.startswith("Buscar alimento")), None)
+    if box is None:
+        raise LookupError("campo 'Buscar alimento' não apareceu")
+    box.set_value(rng.choice(FOOD_BASES).split()[0].lower()).run()
+
+def _click(label):
+    def step(at, rng):
+        button = next((b for b in at.button if b.label == label), None)
+        if button is None:
+            raise LookupError(f"botão '{label}' não apareceu")
+        button.click().run()
+    return step
+
+def scenario(email: str) -> list[tuple]:
+    """(nome do passo, função(at, rng)) — cada passo é um rerun."""
+    return [
+        ("login.open", _page("pages/0_login.py")),
+        ("login.submit", _login(email)),
+        ("refeicoes.open", _page("pages/7_montar_refeicoes.py")),
+        ("paciente.buscar", _pick_patient),
+        ("cadastro.open", _page("pages/1_cadastro_pacientes.py")),
+        ("agenda.open", _page("pages/2_agenda.py")),
+        ("avaliacao.open", _page("pages/3_avaliacao_nutricional.py")),
+        ("dieta.open", _page("pages/4_calculo_dieta.py")),
+        ("taco.open", _page("pages/6_TACO.py")),
+        ("refeicoes.open", _page("pages/7_montar_refeicoes.py")),
+        ("refeicoes.buscar_alimento", _search_foods),
+        ("refeicoes.adicionar", _click("➕ Adicionar à refeição")),
+        ("relatorio.open", _page("pages/5_relatorio.py")),
+        ("relatorio.pdf", _click("Gerar PDF agora")),
+        ("home", _page("app.py")),
+    ]
+
+
+# --------------------------------------------------
+# Execução
+# --------------------------------------------------
+
+def _session(session_no: int, users: int, iterations: int, think_ms: float, seed: int, out: list):
+    from streamlit.testing.v1 import AppTest
+
+    rng = random.Random(seed + session_no)
+    at = AppTest.from_file(str(APP_DIR / "app.py"), default_timeout=60)
+    # o app.py deslogado faz switch_page antes de o AppTest conhecer as páginas; começa no login
+    at.switch_page("pages/0_login.py").run()
+    steps = scenario(bench_email(session_no % users))
+    for it in range(iterations):
+        # login só na primeira volta; nas outras a sessão já está logada
+        for name, step in (steps if it == 0 else steps[2:]):
+            t0 = time.perf_counter()
+            error = None
+            try:
+                step(at, rng)
+                if at.exception:
+                    error = at.exception[0].value
+            except Exception as e:      # elemento não apareceu, timeout do AppTest...
+                error = f"{type(e).__name__}: {e}"
+            ms = (time.perf_counter() - t0) * 1000.0
+            trace = at.session_state["db_trace"] if "db_trace" in at.session_state else None
+            out.append({
+                "step": name,
+                "ms": ms,
+                "queries": len(trace.queries) if trace is not None else None,
+                "error": error,
+            })
+            if think_ms:
+                time.sleep(think_ms / 1000.0)
+
+def _share_script_cache():
+    """
+    O AppTest cria um ScriptCache novo a cada run, então recompila a página toda vez — e,
+    com várias threads, o ast.parse do Python 3.11 não é thread-safe. O servidor de verdade
+    tem um cache por processo (compila cada página uma vez, com lock); aqui fica igual.
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = ScriptCache()
+    for module in (app_test, local_script_runner):
+        if hasattr(module, "ScriptCache"):
+            module.ScriptCache = lambda: shared
+
+def _isolate_sessions():
+    """
+    O AppTest não foi feito para rodar em paralelo: a cada run ele troca e depois desfaz três
+    globais do streamlit, e uma sessão desfaz a da outra no meio do rerun. No servidor de
+    verdade isso não existe (um Runtime, um config, um PagesManager por processo).
+
+    Runtime._instance: cada AppTest põe um Runtime falso e zera no fim ("Runtime hasn't been
+    created!"). Aqui cada thread (e a thread do script que ela dispara) enxerga o seu.
+    """
+    from streamlit.runtime import runtime
+    from streamlit.testing.v1 import app_test
+
+    local = threading.local()
+
+    class _Meta(type):
+        @property
+        def _instance(cls):
+            return getattr(local, "runtime", None)
+
+        @_instance.setter
+        def _instance(cls, value):
+            local.runtime = value
+
+    class ThreadLocalRuntime(runtime.Runtime, metaclass=_Meta):
+        pass
+
+    def instance(cls):
+        if ThreadLocalRuntime._instance is None:
+            raise RuntimeError("Runtime hasn't been created!")
+        return ThreadLocalRuntime._instance
+
+    runtime.Runtime.instance = classmethod(instance)
+    runtime.Runtime.exists = classmethod(lambda cls: ThreadLocalRuntime._instance is not None)
+    app_test.Runtime = ThreadLocalRuntime
+
+    # o script roda numa thread própria do runner: ela herda o Runtime da sessão que a criou
+    class Runner(app_test.LocalScriptRunner):
+        def __init__(self, *a, **kw):
+            self._runtime = ThreadLocalRuntime._instance
+            super().__init__(*a, **kw)
+
+        def _run_script_thread(self):
+            ThreadLocalRuntime._instance = self._runtime
+            super()._run_script_thread()
+
+    app_test.LocalScriptRunner = Runner
+
+    # idem para o config: cada run faz patch/unpatch de config.get_option e uma thread desfaz
+    # o da outra (os widgets param de guardar o format_func → KeyError '$$ID-...')
+    from contextlib import nullcontext
+    from streamlit import config
+    from streamlit.testing.v1.util import build_mock_config_get_option
+
+    config.get_option = build_mock_config_get_option({"global.appTest": True})
+    app_test.patch_config_options = lambda overrides: nullcontext()
+
+    # e o PagesManager.uses_pages_directory, zerado a cada run: com ele None no meio do rerun
+    # de outra sessão, o switch_page não acha as páginas de pages/
+    from streamlit.runtime.pages_manager import PagesManager
+
+    class _PagesMeta(type):
+        uses_pages_directory = property(lambda cls: PagesManager.uses_pages_directory, lambda cls, value: None)
+
+    class SharedPagesManager(PagesManager, metaclass=_PagesMeta):
+        pass
+
+    PagesManager.uses_pages_directory = (APP_DIR / "pages").exists()
+    app_test.PagesManager = SharedPagesManager
+
+def _worker(args: dict) -> dict:
+    """Um processo: `threads` sessões ao mesmo tempo. Devolve as amostras e o tempo de parede."""
+    setup_backend(args["backend"], args["sqlite_path"], args["database_url"], cache=not args["no_cache"])
+    WORK_DIR.mkdir(parents=True, exist_ok=True)
+    os.chdir(WORK_DIR)          # o PDF vai para ./data — fora do repositório
+    _share_script_cache()
+    _isolate_sessions()
+
+    if args["warmup"]:
+        # uma sessão fora da medição: imports (numpy, reportlab...) e compilação das páginas
+        _session(args["first_session"], args["users"], 1, 0.0, args["seed"], [])
+
+    samples = []
+    threads = []
+    started = time.perf_counter()
+    for t in range(args["threads"]):
+        session_no = args["first_session"] + t
+        th = threading.Thread(
+            target=_session, name=f"sessao-{session_no}",
+            args=(session_no, args["users"], args["iterations"], args["think_ms"], args["seed"], samples),
+        )
+        th.start()
+        threads.append(th)
+    for th in threads:
+        th.join()
+    return {"samples": samples, "wall_s": time.perf_counter() - started}
+
+
+def report(samples: list[dict], wall_s: float, sessions: int) -> dict:
+    by_step = {}
+    for s in samples:
+        by_step.setdefault(s["step"], []).append(s)
+
+    results = {}
+    for step, rows in by_step.items():
+        ok = [r["ms"] for r in rows if r["error"] is None]
+        if not ok:
+            results[step] = {"n": 0, "errors": len(rows)}
+            continue
+        queries = [r["queries"] for r in rows if r["queries"] is not None]
+        results[step] = dict(
+            summarize(ok),
+            p99_ms=round(sorted(ok)[min(len(ok) - 1, int(0.99 * len(ok)))], 4),
+            db_queries_avg=round(sum(queries) / len(queries), 2) if queries else None,
+            errors=len(rows) - len(ok),
+        )
+
+    ok = [s["ms"] for s in samples if s["error"] is None]
+    overall = dict(summarize(ok), p99_ms=round(sorted(ok)[min(len(ok) - 1, int(0.99 * len(ok)))], 4)) if ok else {}
+    queries = [s["queries"] for s in samples if s["queries"] is not None]
+    return {
+        "results": results,
+        "overall": dict(
+            overall,
+            reruns=len(samples),
+            errors=len(samples) - len(ok),
+            db_queries_per_rerun=round(sum(queries) / len(queries), 2) if queries else None,
+            reruns_per_s=round(len(samples) / wall_s, 2) if wall_s else None,
+            sessions_per_min=round(sessions * 60 / wall_s, 2) if wall_s else None,
+            wall_s=round(wall_s, 2),
+        ),
+        "errors": sorted({s["error"] for s in samples if s["error"]})[:20],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description="Carga nas páginas do Streamlit.")
+    add_dataset_args(parser)
+    parser.add_argument("--generate", action="store_true", help="(re)gera o banco se não bater com o perfil")
+    parser.add_argument("--threads", type=int, default=4, help="sessões simultâneas por processo")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--iterations", type=int, default=1, help="voltas do roteiro por sessão")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pausa entre passos (usuário lendo a tela)")
+    parser.add_argument("--no-cache", action="store_true", help="desliga o cache de leitura do utils/db.py")
+    parser.add_argument("--no-warmup", action="store_true", help="mede também a primeira sessão (processo frio)")
+    parser.add_argument("--max-p95-ms", type=float, default=None, help="gate: sai com 1 se o p95 geral passar disso")
+    parser.add_argument("--out", default=None, help="arquivo JSON (padrão: bench/results/load-<data>-<banco>-<perfil>.json)")
+    args = parser.parse_args(argv)
+
+    db = setup_backend(args.backend, args.sqlite_path, args.database_url)
+    volumes = volumes_from_args(args)
+    wanted = ensure_dataset(db, volumes, args.seed, regenerate=args.generate)
+    server = server_version(db)
+    db.close_pool()
+
+    jobs = [
+        dict(
+            backend=args.backend, sqlite_path=args.sqlite_path, database_url=args.database_url,
+            no_cache=args.no_cache, warmup=not args.no_warmup, threads=args.threads, first_session=p * args.threads,
+            users=volumes["users"], iterations=args.iterations, think_ms=args.think_ms, seed=args.seed,
+        )
+        for p in range(args.processes)
+    ]
+    sessions = args.threads * args.processes
+    print(f"{sessions} sessão(ões) simultânea(s) ({args.processes} processo(s) × {args.threads} thread(s)), "
+          f"{args.iterations} volta(s) do roteiro…")
+
+    started = datetime.now()
+    t0 = time.perf_counter()
+    if args.processes == 1:
+        parts = [_worker(jobs[0])]
+    else:
+        # spawn: cada processo importa o Streamlit/utils.db do zero, como um servidor separado
+        with multiprocessing.get_context("spawn").Pool(args.processes) as pool:
+            parts = pool.map(_worker, jobs)
+    wall_s = time.perf_counter() - t0
+
+    samples = [s for p in parts for s in p["samples"]]
+    rep = report(samples, wall_s, sessions * args.iterations)
+
+    o = rep["overall"]
+    print(f"\n{'passo':<28} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'consultas':>10} {'erros':>6}")
+    for step, r in rep["results"].items():
+        if not r["n"]:
+            print(f"{step:<28} {0:>5} {'—':>9} {'—':>9} {'—':>9} {'—':>10} {r['errors']:>6}")
+            continue
+        q = "—" if r["db_queries_avg"] is None else f"{r['db_queries_avg']:.1f}"
+        print(f"{step:<28} {r['n']:>5} {r['median_ms']:>9.1f} {r['p95_ms']:>9.1f} {r['p99_ms']:>9.1f} {q:>10} {r['errors']:>6}")
+    if o.get("n"):
+        print(f"\nGeral: p50 {o['median_ms']:.1f} ms · p95 {o['p95_ms']:.1f} ms · p99 {o['p99_ms']:.1f} ms · "
+              f"{o['db_queries_per_rerun']} consultas/rerun")
+    print(f"Vazão: {o['reruns_per_s']} reruns/s · {o['sessions_per_min']} sessões/min · "
+          f"{o['errors']} erro(s) em {o['reruns']} reruns ({o['wall_s']} s)")
+    for e in rep["errors"]:
+        print(f"   erro: {e}")
+
+    out = args.out
+    if out is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        out = RESULTS_DIR / f"load-{started:%Y%m%d-%H%M%S}-{args.backend}-{args.profile}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({
+            "meta": {
+                "started_at": started.isoformat(timespec="seconds"),
+                "kind": "load",
+                "backend": args.backend,
+                "server": server,
+                "profile": args.profile,
+                "volumes": wanted,
+                "cache": not args.no_cache,
+                "threads": args.threads,
+                "processes": args.processes,
+                "iterations": args.iterations,
+                "think_ms": args.think_ms,
+                "warmup": not args.no_warmup,
+                "git": git_commit(),
+            },
+            **rep,
+        }, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado: {out}")
+
+    if args.max_p95_ms is not None and (not o.get("n") or o["p95_ms"] > args.max_p95_ms or o["errors"]):
+        print(f"❌ p95 acima de {args.max_p95_ms:g} ms (ou houve erro)")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
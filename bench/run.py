@@ -0,0 +1,284 @@
+"""
+Mede cada função pública do utils/db.py no banco do benchmark e grava o resultado em JSON.
+
+    python -m bench.run                                   # SQLite, perfil medium (já gerado)
+    python -m bench.run --generate --profile large        # (re)gera se o banco não bater com o perfil
+    python -m bench.run --backend postgres --generate
+    python -m bench.run -k foods --repeat 100             # só os casos com "foods" no nome
+
+Cada caso roda `--warmup` vezes sem medir e `--repeat` vezes medindo (perf_counter_ns).
+O cache de leitura fica desligado (mede o banco); --cache liga. Escritas que precisam de
+uma linha pronta (delete_*, update_*) criam essa linha fora do tempo medido.
+Função pública nova sem caso aqui aparece como aviso no fim — o conjunto tem que cobrir tudo.
+"""
+import sys
+import json
+import time
+import random
+import uuid
+import inspect
+import platform
+import argparse
+import statistics
+import subprocess
+from datetime import date, datetime, timedelta
+
+from bench import RESULTS_DIR, setup_backend
+from bench.generate import add_dataset_args, ensure_dataset, table_counts, volumes_from_args
+
+# infraestrutura/utilitários puros — não são acesso a dados
+NOT_BENCHMARKED = {
+    "normalize_db_url", "get_pool", "get_read_pool", "get_sqlite_writer", "close_pool", "pool_stats",
+    "set_session_key", "get_conn", "transaction", "in_transaction", "get_sqlite_conn", "get_postgres_conn",
+    "init_db", "cache_stats", "clear_cache", "query_stats", "food_key", "fold_text",
+    "clear_foods",  # apaga a tabela de alimentos
+}
+
+
+class Case:
+    def __init__(self, name: str, fn, setup=None, repeat: int | None = None):
+        self.name = name
+        self.fn = fn                # fn(*args) é o que entra no tempo
+        self.setup = setup          # setup() -> args, fora do tempo
+        self.repeat = repeat        # teto de repetições (casos pesados)
+
+    @property
+    def function(self) -> str:
+        return self.name.split("[")[0]
+
+
+def _sample(db, seed: int) -> dict:
+    """Ids reais do banco para os casos (mesma semente → mesmos ids)."""
+    rng = random.Random(seed)
+    with db.get_conn(readonly=True, primary=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT user_id, COUNT(*) AS n FROM patients GROUP BY user_id ORDER BY n DESC, user_id LIMIT 1")
+        row = dict(cur.fetchone())
+        uid = row["user_id"]
+        ph = "%s" if db.USE_POSTGRES else "?"
+        cur.execute(f"SELECT id FROM patients WHERE user_id = {ph} ORDER BY id", (uid,))
+        pids = [r["id"] for r in cur.fetchall()]
+        # o paciente com mais avaliações: pior caso das séries
+        cur.execute(f"""
+            SELECT patient_id FROM assessments WHERE user_id = {ph}
+            GROUP BY patient_id ORDER BY COUNT(*) DESC, patient_id LIMIT 1
+        """, (uid,))
+        heavy_pid = db._scalar(cur.fetchone())
+        cur.execute(f"SELECT id, patient_id FROM diets WHERE user_id = {ph} ORDER BY id", (uid,))
+        diets = db._dicts(cur.fetchall())
+        cur.execute(f"SELECT email FROM users WHERE id = {ph}", (uid,))
+        email = db._scalar(cur.fetchone())
+        cur.execute("SELECT id FROM foods ORDER BY id")
+        food_ids = [r["id"] for r in cur.fetchall()]
+
+    diet = rng.choice(diets)
+    return {
+        "uid": uid,
+        "email": email,
+        "pid": rng.choice(pids),
+        "pids": pids,
+        "heavy_pid": heavy_pid,
+        "diet_pid": diet["patient_id"],
+        "diet_id": diet["id"],
+        "food_ids": food_ids,
+        "rng": rng,
+    }
+
+def build_cases(db, s: dict) -> list[Case]:
+    uid, pid, rng = s["uid"], s["pid"], s["rng"]
+    today = date.today()
+    week_start = datetime.combine(today - timedelta(days=today.weekday()), datetime.min.time())
+    # e-mails únicos entre rodadas (o banco do benchmark guarda as escritas das rodadas anteriores)
+    tag = uuid.uuid4().hex[:8]
+    unique = (f"{tag}{i}" for i in range(10**9))
+
+    def new_appointment():
+        # create_appointment não devolve o id
+        db.create_appointment(pid, (week_start + timedelta(hours=9)).isoformat(), "Consulta", "bench", user_id=uid)
+        with db.get_conn(readonly=True, primary=True) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT MAX(id) FROM appointments")
+            return (db._scalar(cur.fetchone()),)
+
+    def new_item():
+        return (db.add_diet_item(uid, s["diet_pid"], s["diet_id"], "Almoço", rng.choice(s["food_ids"]), 100.0),)
+
+    events = [(uid, "bench", None, datetime.utcnow().isoformat())] * 200
+    foods = db.list_all_foods()
+
+    return [
+        # ---------- acesso / usuários ----------
+        Case("is_email_allowed", lambda: db.is_email_allowed(s["email"])),
+        Case("add_allowed_email", lambda: db.add_allowed_email(f"bench{next(unique)}@allow.local")),
+        Case("get_user_by_email", lambda: db.get_user_by_email(s["email"])),
+        Case("create_user", lambda: db.create_user(f"bench{next(unique)}@user.local", "x")),
+
+        # ---------- pacientes ----------
+        Case("create_patient", lambda: db.create_patient("Paciente Bench", sexo="Feminino", user_id=uid)),
+        Case("update_patient", lambda: db.update_patient(pid, uid, "Paciente Bench", sexo="Feminino")),
+        Case("list_patients", lambda: db.list_patients(user_id=uid)),
+        Case("get_patient", lambda: db.get_patient(rng.choice(s["pids"]), user_id=uid)),
+        Case("search_patients[vazio]", lambda: db.search_patients(uid, "", limit=20)),
+        Case("search_patients[texto]", lambda: db.search_patients(uid, "ana sil", limit=20)),
+        Case("get_patient_labels", lambda: db.get_patient_labels(uid, tuple(s["pids"][:8]))),
+        Case("list_patients_page[primeira]", lambda: db.list_patients_page(uid, None, limit=50)),
+        Case("count_patients", lambda: db.count_patients(uid)),
+        Case("get_patient_bundle", lambda: db.get_patient_bundle(uid, s["diet_pid"])),
+
+        # ---------- avaliações / dietas ----------
+        Case("create_assessment", lambda: db.create_assessment(
+            pid, {"data_iso": today.isoformat(), "peso": 70.0, "altura_cm": 170.0}, user_id=uid)),
+        Case("get_last_assessment", lambda: db.get_last_assessment(rng.choice(s["pids"]), user_id=uid)),
+        Case("list_assessments_series[lttb]", lambda: db.list_assessments_series(
+            s["heavy_pid"], max_points=50, method="lttb", user_id=uid)),
+        Case("list_assessments_series[avg]", lambda: db.list_assessments_series(
+            s["heavy_pid"], max_points=50, method="avg", user_id=uid)),
+        Case("create_diet", lambda: db.create_diet(pid, {"data_iso": today.isoformat(), "calorias_alvo": 2000.0}, user_id=uid)),
+        Case("get_last_diet", lambda: db.get_last_diet(rng.choice(s["pids"]), user_id=uid)),
+
+        # ---------- agenda ----------
+        Case("create_appointment", lambda: db.create_appointment(
+            pid, (week_start + timedelta(hours=10)).isoformat(), "Retorno", "", user_id=uid)),
+        Case("update_appointment", lambda aid: db.update_appointment(aid, uid, notas="bench"), setup=new_appointment),
+        Case("delete_appointment", lambda aid: db.delete_appointment(aid, uid), setup=new_appointment),
+        Case("list_appointments", lambda: db.list_appointments(user_id=uid)),
+        Case("list_appointments_range[semana]", lambda: db.list_appointments_range(
+            uid, week_start.isoformat(), (week_start + timedelta(days=7)).isoformat())),
+        Case("list_upcoming_appointments", lambda: db.list_upcoming_appointments(uid, limit=10)),
+
+        # ---------- alimentos ----------
+        Case("upsert_foods[sem mudança]", lambda: db.upsert_foods(foods), repeat=5),
+        Case("get_foods_version", db.get_foods_version),
+        Case("list_all_foods", db.list_all_foods),
+        Case("count_foods", db.count_foods),
+        Case("search_foods[uma palavra]", lambda: db.search_foods("arroz")),
+        Case("search_foods[duas palavras]", lambda: db.search_foods("frango grel")),
+        Case("get_food", lambda: db.get_food(rng.choice(s["food_ids"]))),
+
+        # ---------- itens de dieta ----------
+        Case("add_diet_item", lambda: db.add_diet_item(
+            uid, s["diet_pid"], s["diet_id"], "Jantar", rng.choice(s["food_ids"]), 80.0)),
+        Case("delete_diet_item", lambda item_id: db.delete_diet_item(uid, item_id), setup=new_item),
+        Case("list_diet_items", lambda: db.list_diet_items(uid, s["diet_pid"], s["diet_id"])),
+        Case("get_diet_totals", lambda: db.get_diet_totals(uid, s["diet_pid"], s["diet_id"])),
+        Case("rebuild_diet_totals", db.rebuild_diet_totals, repeat=3),
+
+        # ---------- feedback / eventos ----------
+        Case("create_feedback", lambda: db.create_feedback(uid, "Bench", "mensagem", 8)),
+        Case("list_feedback", lambda: db.list_feedback(limit=200)),
+        Case("log_event", lambda: db.log_event(uid, "bench", {"patient_id": pid})),
+        Case("insert_events[200]", lambda: db.insert_events(events)),
+    ]
+
+
+def summarize(samples: list[float]) -> dict:
+    """Estatísticas de uma lista de tempos (ms) — o formato que o bench.compare lê."""
+    samples = sorted(samples)
+    return {
+        "n": len(samples),
+        "min_ms": round(samples[0], 4),
+        "median_ms": round(statistics.median(samples), 4),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 4),
+        "mean_ms": round(statistics.fmean(samples), 4),
+        "max_ms": round(samples[-1], 4),
+        "stdev_ms": round(statistics.stdev(samples), 4) if len(samples) > 1 else 0.0,
+    }
+
+def _measure(case: Case, warmup: int, repeat: int) -> dict:
+    repeat = min(repeat, case.repeat) if case.repeat else repeat
+    samples = []
+    for i in range(warmup + repeat):
+        args = case.setup() if case.setup else ()
+        t0 = time.perf_counter_ns()
+        case.fn(*args)
+        elapsed = (time.perf_counter_ns() - t0) / 1e6
+        if i >= warmup:
+            samples.append(elapsed)
+    return summarize(samples)
+
+def uncovered(db, cases: list[Case]) -> list[str]:
+    """Funções públicas do utils/db.py sem caso no benchmark."""
+    covered = {c.function for c in cases}
+    public = {
+        name for name, obj in inspect.getmembers(db, inspect.isfunction)
+        if obj.__module__ == db.__name__ and not name.startswith("_")
+    }
+    return sorted(public - covered - NOT_BENCHMARKED)
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"],
+                               capture_output=True, text=True, timeout=5)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "") if out.returncode == 0 else None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def server_version(db) -> str:
+    with db.get_conn(readonly=True, primary=True) as conn:
+        cur = conn.cursor()
+        if db.USE_POSTGRES:
+            cur.execute("SHOW server_version")
+            return "postgres " + db._scalar(cur.fetchone())
+    import sqlite3
+    return "sqlite " + sqlite3.sqlite_version
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m bench.run", description="Benchmark do utils/db.py.")
+    add_dataset_args(parser)
+    parser.add_argument("--generate", action="store_true", help="(re)gera o banco se não bater com o perfil")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--cache", action="store_true", help="mede com o cache de leitura ligado")
+    parser.add_argument("-k", dest="filter", default=None, help="só casos com esse texto no nome")
+    parser.add_argument("--out", default=None, help="arquivo JSON (padrão: bench/results/<data>-<banco>-<perfil>.json)")
+    args = parser.parse_args(argv)
+
+    db = setup_backend(args.backend, args.sqlite_path, args.database_url, cache=args.cache)
+    wanted = ensure_dataset(db, volumes_from_args(args), args.seed, regenerate=args.generate)
+
+    counts = table_counts(db)
+    sample = _sample(db, args.seed)
+    all_cases = build_cases(db, sample)
+    cases = [c for c in all_cases if not args.filter or args.filter in c.name]
+
+    started = datetime.now()
+    results = {}
+    for case in cases:
+        results[case.name] = r = _measure(case, args.warmup, args.repeat)
+        print(f"{case.name:<36} mediana {r['median_ms']:>9.3f} ms   p95 {r['p95_ms']:>9.3f} ms   (n={r['n']})")
+
+    missing = uncovered(db, all_cases)
+    if missing:
+        print(f"\n⚠️  Funções públicas sem benchmark: {', '.join(missing)}")
+
+    report = {
+        "meta": {
+            "started_at": started.isoformat(timespec="seconds"),
+            "backend": args.backend,
+            "server": server_version(db),
+            "profile": args.profile,
+            "volumes": wanted,
+            "counts": counts,
+            "repeat": args.repeat,
+            "warmup": args.warmup,
+            "cache": args.cache,
+            "git": git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+        },
+        "results": results,
+    }
+    out = args.out
+    if out is None:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        out = RESULTS_DIR / f"{started:%Y%m%d-%H%M%S}-{args.backend}-{args.profile}.json"
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultado: {out}")
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,145 +1,197 @@
 import streamlit as st
-from utils.bootstrap import bootstrap
+from utils.bootstrap import page_run
 from utils.db import (
     get_patient,
     create_appointment,
-    list_appointments,
+    list_appointments_range,
+    list_upcoming_appointments,
     update_appointment,
     delete_appointment,
     log_event,
 )
 from utils.feedback_widget import feedback_widget
-from datetime import date, time, datetime
+from datetime import date, time, datetime, timedelta
 
 st.set_page_config(page_title="Agenda", page_icon="📅", layout="wide")
-bootstrap(show_patient_picker=True, require_login=True)
-
-feedback_widget("Agenda")
-st.title("📅 Agenda do Consultório")
-
-user_id = st.session_state["user"]["id"]
-
-pid = st.session_state.patient_id
-if not pid:
-    st.warning("Selecione um paciente na barra lateral.")
-    st.stop()
-
-p = get_patient(pid, user_id=user_id)
-st.subheader(f"Agendar para: {p['nome']} (ID {p['id']})")
-
-# -----------------------------
-# Criar agendamento
-# -----------------------------
-with st.form("agendar"):
-    d = st.date_input("Data", value=date.today())
-    h = st.time_input("Hora", value=time(8, 0))
-    tipo = st.selectbox("Tipo", ["Consulta", "Retorno", "Reavaliação"])
-    notas = st.text_area("Notas")
-    ok = st.form_submit_button("Criar agendamento")
-
-if ok:
-    dt_iso = datetime.combine(d, h).isoformat()
-    create_appointment(
-        patient_id=pid,
-        dt_iso=dt_iso,
-        tipo=tipo,
-        notas=(notas or "").strip(),
-        user_id=user_id,
-    )
-
-    log_event(
-        user_id=user_id,
-        event_name="appointment_created",
-        meta={"patient_id": pid, "dt_iso": dt_iso, "tipo": tipo},
-    )
-
-    st.success("Agendamento criado.")
-    st.rerun()
-
-st.divider()
-
-# -----------------------------
-# Listar / editar / apagar
-# -----------------------------
-st.subheader("Agenda (meus pacientes)")
-appts = list_appointments(user_id=user_id)
-
-if not appts:
-    st.info("Nenhum agendamento ainda.")
-    st.stop()
-
-st.dataframe(appts, use_container_width=True)
-
-# Seletor de agendamento
-# (appts é lista de dict; cada item deve ter pelo menos 'id' e 'dt_iso')
-options = {}
-for a in appts:
-    # tenta usar patient_nome se existir
-    patient_nome = a.get("patient_nome") or f"Paciente {a.get('patient_id','?')}"
-    label = f'#{a["id"]} — {a["dt_iso"]} — {patient_nome} — {a.get("tipo","")}'
-    options[label] = a["id"]
-
-st.subheader("Editar ou apagar agendamento")
-chosen_label = st.selectbox("Selecione um agendamento", list(options.keys()))
-chosen_id = options[chosen_label]
-
-# pega o agendamento escolhido (pra preencher o form)
-selected = next(a for a in appts if a["id"] == chosen_id)
-
-# parse dt_iso
-try:
-    dt = datetime.fromisoformat(selected["dt_iso"])
-    default_d = dt.date()
-    default_h = dt.time().replace(second=0, microsecond=0)
-except Exception:
-    default_d = date.today()
-    default_h = time(8, 0)
-
-with st.form("editar_agendamento"):
-    new_d = st.date_input("Nova data", value=default_d)
-    new_h = st.time_input("Nova hora", value=default_h)
-    new_tipo = st.selectbox(
-        "Novo tipo",
-        ["Consulta", "Retorno", "Reavaliação"],
-        index=["Consulta", "Retorno", "Reavaliação"].index(selected.get("tipo", "Consulta"))
-        if selected.get("tipo") in ["Consulta", "Retorno", "Reavaliação"]
-        else 0,
-    )
-    new_notas = st.text_area("Novas notas", value=(selected.get("notas") or ""))
-
-    c1, c2 = st.columns(2)
-    with c1:
-        salvar = st.form_submit_button("Salvar alterações")
-    with c2:
-        apagar = st.form_submit_button("Apagar agendamento")
-
-if salvar:
-    new_dt_iso = datetime.combine(new_d, new_h).isoformat()
-    update_appointment(
-        appointment_id=chosen_id,
-        user_id=user_id,
-        dt_iso=new_dt_iso,
-        tipo=new_tipo,
-        notas=(new_notas or "").strip(),
-    )
-
-    log_event(
-        user_id=user_id,
-        event_name="appointment_updated",
-        meta={"appointment_id": chosen_id, "dt_iso": new_dt_iso, "tipo": new_tipo},
-    )
-
-    st.success("Agendamento atualizado.")
-    st.rerun()
-
-if apagar:
-    delete_appointment(chosen_id, user_id)
-
-    log_event(
-        user_id=user_id,
-        event_name="appointment_deleted",
-        meta={"appointment_id": chosen_id},
-    )
-
-    st.success("Agendamento apagado.")
-    st.rerun()
\ No newline at end of file
+with page_run("2_agenda", show_patient_picker=True, require_login=True):
+    feedback_widget("Agenda")
+    st.title("📅 Agenda do Consultório")
+
+    user_id = st.session_state["user"]["id"]
+
+    pid = st.session_state.patient_id
+    if not pid:
+        st.warning("Selecione um paciente na barra lateral.")
+        st.stop()
+
+    p = get_patient(pid, user_id=user_id)
+    st.subheader(f"Agendar para: {p['nome']} (ID {p['id']})")
+
+    # -----------------------------
+    # Criar agendamento
+    # -----------------------------
+    with st.form("agendar"):
+        d = st.date_input("Data", value=date.today())
+        h = st.time_input("Hora", value=time(8, 0))
+        tipo = st.selectbox("Tipo", ["Consulta", "Retorno", "Reavaliação"])
+        notas = st.text_area("Notas")
+        ok = st.form_submit_button("Criar agendamento")
+
+    if ok:
+        dt_iso = datetime.combine(d, h).isoformat()
+        create_appointment(
+            patient_id=pid,
+            dt_iso=dt_iso,
+            tipo=tipo,
+            notas=(notas or "").strip(),
+            user_id=user_id,
+        )
+
+        log_event(
+            user_id=user_id,
+            event_name="appointment_created",
+            meta={"patient_id": pid, "dt_iso": dt_iso, "tipo": tipo},
+        )
+
+        st.success("Agendamento criado.")
+        st.rerun()
+
+    st.divider()
+
+    # -----------------------------
+    # Calendário (só carrega a janela visível)
+    # -----------------------------
+    DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
+
+    def janela(visao: str, ref: date) -> tuple[date, date]:
+        """[início, fim) da janela de visualização."""
+        if visao == "Dia":
+            return ref, ref + timedelta(days=1)
+        if visao == "Semana":
+            inicio = ref - timedelta(days=ref.weekday())
+            return inicio, inicio + timedelta(days=7)
+        inicio = ref.replace(day=1)
+        fim = (inicio + timedelta(days=32)).replace(day=1)
+        return inicio, fim
+
+    def hora(a) -> str:
+        try:
+            return datetime.fromisoformat(a["dt_iso"]).strftime("%H:%M")
+        except Exception:
+            return str(a.get("dt_iso", ""))
+
+    with st.sidebar.expander("⏰ Próximos agendamentos", expanded=False):
+        proximos = list_upcoming_appointments(user_id, limit=5)
+        if not proximos:
+            st.caption("Nada agendado.")
+        for a in proximos:
+            st.caption(f'{a["dt_iso"][:16].replace("T", " ")} — {a["patient_nome"]} ({a.get("tipo", "")})')
+
+    st.subheader("Agenda (meus pacientes)")
+
+    cv1, cv2 = st.columns([2, 1])
+    with cv1:
+        visao = st.radio("Visualização", ["Dia", "Semana", "Mês"], index=1, horizontal=True)
+    with cv2:
+        ref = st.date_input("Data de referência", value=date.today(), key="agenda_ref")
+
+    inicio, fim = janela(visao, ref)
+    appts = list_appointments_range(user_id, inicio.isoformat(), fim.isoformat())
+
+    st.caption(f"{inicio.strftime('%d/%m/%Y')} a {(fim - timedelta(days=1)).strftime('%d/%m/%Y')} — {len(appts)} agendamento(s)")
+
+    if visao == "Dia":
+        if not appts:
+            st.info("Nenhum agendamento neste dia.")
+        for a in appts:
+            st.markdown(f'**{hora(a)}** — {a["patient_nome"]} · {a.get("tipo", "")}' + (f' · _{a["notas"]}_' if a.get("notas") else ""))
+    elif visao == "Semana":
+        por_dia = {}
+        for a in appts:
+            por_dia.setdefault(a["dt_iso"][:10], []).append(a)
+        cols = st.columns(7)
+        for i, col in enumerate(cols):
+            dia = inicio + timedelta(days=i)
+            with col:
+                st.markdown(f"**{DIAS_SEMANA[i]} {dia.strftime('%d/%m')}**")
+                for a in por_dia.get(dia.isoformat(), []):
+                    st.caption(f'{hora(a)} {a["patient_nome"]}')
+    else:
+        if appts:
+            st.dataframe(appts, use_container_width=True)
+
+    if not appts:
+        st.stop()
+
+    # Seletor de agendamento (só os da janela visível)
+    options = {}
+    for a in appts:
+        # tenta usar patient_nome se existir
+        patient_nome = a.get("patient_nome") or f"Paciente {a.get('patient_id','?')}"
+        label = f'#{a["id"]} — {a["dt_iso"]} — {patient_nome} — {a.get("tipo","")}'
+        options[label] = a["id"]
+
+    st.subheader("Editar ou apagar agendamento")
+    chosen_label = st.selectbox("Selecione um agendamento", list(options.keys()))
+    chosen_id = options[chosen_label]
+
+    # pega o agendamento escolhido (pra preencher o form)
+    selected = next(a for a in appts if a["id"] == chosen_id)
+
+    # parse dt_iso
+    try:
+        dt = datetime.fromisoformat(selected["dt_iso"])
+        default_d = dt.date()
+        default_h = dt.time().replace(second=0, microsecond=0)
+    except Exception:
+        default_d = date.today()
+        default_h = time(8, 0)
+
+    with st.form("editar_agendamento"):
+        new_d = st.date_input("Nova data", value=default_d)
+        new_h = st.time_input("Nova hora", value=default_h)
+        new_tipo = st.selectbox(
+            "Novo tipo",
+            ["Consulta", "Retorno", "Reavaliação"],
+            index=["Consulta", "Retorno", "Reavaliação"].index(selected.get("tipo", "Consulta"))
+            if selected.get("tipo") in ["Consulta", "Retorno", "Reavaliação"]
+            else 0,
+        )
+        new_notas = st.text_area("Novas notas", value=(selected.get("notas") or ""))
+
+        c1, c2 = st.columns(2)
+        with c1:
+            salvar = st.form_submit_button("Salvar alterações")
+        with c2:
+            apagar = st.form_submit_button("Apagar agendamento")
+
+    if salvar:
+        new_dt_iso = datetime.combine(new_d, new_h).isoformat()
+        update_appointment(
+            appointment_id=chosen_id,
+            user_id=user_id,
+            dt_iso=new_dt_iso,
+            tipo=new_tipo,
+            notas=(new_notas or "").strip(),
+        )
+
+        log_event(
+            user_id=user_id,
+            event_name="appointment_updated",
+            meta={"appointment_id": chosen_id, "dt_iso": new_dt_iso, "tipo": new_tipo},
+        )
+
+        st.success("Agendamento atualizado.")
+        st.rerun()
+
+    if apagar:
+        delete_appointment(chosen_id, user_id)
+
+        log_event(
+            user_id=user_id,
+            event_name="appointment_deleted",
+            meta={"appointment_id": chosen_id},
+        )
+
+        st.success("Agendamento apagado.")
+        st.rerun()
\ No newline at end of file
@@ -0,0 +1,84 @@
+import streamlit as st
+from datetime import datetime
+
+from utils.bootstrap import page_run
+from utils.db import log_event
+from utils.export import (
+    EXPORTS, EXPORT_MAX_MB, EXPORT_TTL_HOURS, ExportTooLarge, cleanup_exports, export_to_file, latest_export,
+)
+
+
+st.set_page_config(page_title="Exportar dados", page_icon="📦", layout="wide")
+with page_run("8_exportar_dados", show_patient_picker=False, require_login=True):
+    from utils.feedback_widget import feedback_widget
+    feedback_widget("Exportar dados")
+
+    st.title("📦 Exportar meus dados")
+    st.write(
+        "Todos os seus pacientes, avaliações, dietas, itens das refeições e consultas, "
+        "um arquivo por tabela dentro de um .zip."
+    )
+
+    uid = st.session_state["user"]["id"]
+
+    # a página não faz streaming: o .zip é gravado no servidor e o botão de download lê o
+    # arquivo inteiro para a memória. Daí o limite de tamanho e o prazo para apagar.
+    cleanup_exports()
+    st.caption(
+        f"Limite de {EXPORT_MAX_MB:.0f} MB por exportação; o arquivo fica disponível por "
+        f"{EXPORT_TTL_HOURS:.0f} h. Acima do limite, peça a exportação pelo suporte."
+    )
+
+    FORMATS = {
+        "csv": "CSV (abre no Excel / Google Planilhas)",
+        "xlsx": "Excel (.xlsx)",
+        "parquet": "Parquet (pandas, BI)",
+    }
+    fmt = st.radio("Formato", list(FORMATS), format_func=FORMATS.get, horizontal=True)
+    if fmt == "xlsx":
+        st.caption("O Excel é o formato mais lento de gerar; com muitos pacientes prefira CSV.")
+
+
+    def download(path):
+        # o Streamlit guarda o arquivo inteiro na memória do servidor enquanto o botão existe,
+        # então o botão só aparece logo depois de gerar (ou pedir) o download, não a cada rerun
+        created = datetime.fromtimestamp(path.stat().st_mtime).strftime("%d/%m/%Y %H:%M")
+        with open(path, "rb") as f:
+            st.download_button(
+                f"⬇️ Baixar {path.name} ({path.stat().st_size / 1024:.0f} KB)",
+                data=f,
+                file_name=path.name,
+                mime="application/zip",
+            )
+        st.caption(f"Gerado em {created}. Só a última exportação fica guardada.")
+
+
+    if st.button("Gerar exportação"):
+        bar = st.progress(0.0, text="Começando…")
+        tables = [e.table for e in EXPORTS]
+
+        def progress(table, rows):
+            done = tables.index(table) / len(tables)
+            bar.progress(done, text=f"{table}: {rows} linha(s)")
+
+        try:
+            path = export_to_file(uid, fmt, progress=progress)
+            bar.progress(1.0, text="Pronto!")
+            log_event(user_id=uid, event_name="data_exported", meta={"format": fmt, "bytes": path.stat().st_size})
+        except ExportTooLarge:
+            bar.empty()
+            st.warning(f"Seus dados passam de {EXPORT_MAX_MB:.0f} MB neste formato. Tente CSV ou peça pelo suporte.")
+        except Exception as e:
+            log_event(
+                user_id=uid,
+                event_name="error",
+                meta={"page": "Exportar dados", "action": "export", "error": str(e)}
+            )
+            st.error("Ocorreu um erro ao exportar. Já registrei para correção.")
+        else:
+            download(path)
+
+    else:
+        path = latest_export(uid)
+        if path and st.button(f"Baixar a última exportação ({path.name})"):
+            download(path)
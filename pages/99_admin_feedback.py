@@ -1,14 +1,93 @@
 import streamlit as st
-from utils.bootstrap import bootstrap
+from utils.bootstrap import page_run
+from utils.auth import is_admin
 from utils.db import list_feedback
+from utils import analytics
 
 st.set_page_config(page_title="Admin - Feedback", page_icon="🛠️", layout="wide")
-bootstrap(show_patient_picker=False, require_login=True)
+with page_run("99_admin_feedback", show_patient_picker=False, require_login=True):
+    # e-mail e atividade de todo mundo: só para quem está em ADMIN_EMAILS
+    if not is_admin():
+        st.error("Acesso restrito.")
+        st.stop()
 
-st.title("🛠️ Feedback (beta)")
+    st.title("🛠️ Uso e feedback (beta)")
 
-items = list_feedback(limit=300)
-if not items:
-    st.info("Ainda não há feedback.")
-else:
-    st.dataframe(items, use_container_width=True)
+    days = st.selectbox("Período", [7, 30, 90, 365], index=1, format_func=lambda d: f"Últimos {d} dias")
+
+    # a página só lê os agregados; quem atualiza é a thread do event_logger (maybe_maintain)
+    # ou `python -m utils.event_store maintain`
+    fresh = analytics.freshness()
+    st.caption(f"Agregados até {min((v or '—') for v in fresh.values())} (UTC). Hoje é contado ao vivo.")
+    if analytics.is_stale(fresh):
+        st.caption("Agregados atrasados: rode `python -m utils.event_store maintain`.")
+
+    tab_uso, tab_erros, tab_feedback = st.tabs(["Uso", "Erros", "Feedback"])
+
+    # ---------- Uso ----------
+    with tab_uso:
+        active = analytics.active_users()
+        today = analytics.today_live()
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Ativos ontem", active["dau"])
+        c2.metric("Ativos 7 dias", active["wau"])
+        c3.metric("Ativos 30 dias", active["mau"])
+        c4.metric("Eventos hoje", today["events"], help=f'{today["users"]} usuário(s) hoje')
+
+        per_day = analytics.events_per_day(days)
+        if per_day:
+            st.subheader("Eventos por dia")
+            st.bar_chart(per_day, x="day", y="events")
+            st.subheader("Usuários por dia")
+            st.line_chart(per_day, x="day", y="users")
+        else:
+            st.info("Ainda não há eventos consolidados.")
+
+        col_u, col_e = st.columns(2)
+        with col_u:
+            st.subheader("Por usuário")
+            st.dataframe(analytics.events_by_user(days), use_container_width=True, hide_index=True)
+        with col_e:
+            st.subheader("Por evento")
+            st.dataframe(analytics.events_by_name(days), use_container_width=True, hide_index=True)
+
+    # ---------- Erros ----------
+    with tab_erros:
+        rates = analytics.error_rate_by_page(days)
+        if not rates:
+            st.info("Sem ações registradas no período.")
+        else:
+            st.dataframe(
+                [
+                    {
+                        "Página": r["page"],
+                        "Ações ok": r["ok"],
+                        "Erros": r["errors"],
+                        "Taxa de erro": f'{r["error_rate"]:.1%}',
+                        "Erros por ação": ", ".join(f"{a}: {n}" for a, n in r["actions"].items()),
+                    }
+                    for r in rates
+                ],
+                use_container_width=True,
+                hide_index=True,
+            )
+
+    # ---------- Feedback ----------
+    with tab_feedback:
+        ratings = analytics.feedback_ratings(days)
+        if ratings["distribution"]:
+            st.subheader("Notas")
+            dist = [
+                {"nota": "sem nota" if r["rating"] < 0 else str(r["rating"]), "n": r["n"]}
+                for r in ratings["distribution"]
+            ]
+            st.bar_chart(dist, x="nota", y="n")
+            st.subheader("Por página")
+            st.dataframe(ratings["by_page"], use_container_width=True, hide_index=True)
+
+        st.subheader("Mensagens recentes")
+        items = list_feedback(limit=300)
+        if not items:
+            st.info("Ainda não há feedback.")
+        else:
+            st.dataframe(items, use_container_width=True)
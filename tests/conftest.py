@@ -0,0 +1,59 @@
+"""
+Testes do utils/db.py num SQLite temporário (um banco novo por teste).
+
+    python -m pytest -q
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+# o utils/db.py lê o ambiente na importação: nunca o banco de verdade
+for var in ("DATABASE_URL", "DATABASE_READ_URL", "SQLITE_READ_PATH"):
+    os.environ.pop(var, None)
+os.environ["DB_CACHE"] = "1"
+os.environ["DB_SLOW_LOG"] = ""
+os.environ["EVENT_MAINTENANCE_INTERVAL"] = "0"
+
+from utils import db  # noqa: E402
+
+
+@pytest.fixture
+def fresh_db(tmp_path, monkeypatch):
+    db.close_pool()
+    monkeypatch.setattr(db, "SQLITE_PATH", tmp_path / "nutriapp.db")
+    db.init_db()
+    db.clear_cache()
+    yield db
+    db.close_pool()
+
+
+@pytest.fixture
+def user_id(fresh_db):
+    return fresh_db.create_user("nutri@teste.local", "hash")
+
+
+@pytest.fixture
+def seeded(fresh_db, user_id):
+    """Um paciente com avaliações, dieta, itens de refeição e consulta."""
+    db = fresh_db
+    db.upsert_foods([
+        {"nome": "Arroz branco cozido", "kcal": 128, "proteina_g": 2.5, "carbo_g": 28.1, "gordura_g": 0.2},
+        {"nome": "Frango grelhado", "kcal": 159, "proteina_g": 32.0, "carbo_g": 0.0, "gordura_g": 2.5},
+    ])
+    foods = {f["nome"]: f["id"] for f in db.list_all_foods()}
+    pid = db.create_patient("Ana", telefone="1199", sexo="F", user_id=user_id)
+    for day, peso in (("2024-01-10", 70.0), ("2024-02-10", 68.5)):
+        db.create_assessment(pid, {"data_iso": day, "peso": peso, "altura_cm": 165.0}, user_id=user_id)
+    diet_id = db.create_diet(pid, {"data_iso": "2024-02-10", "calorias_alvo": 1800, "proteina_g": 120}, user_id=user_id)
+    items = [
+        db.add_diet_item(user_id, pid, diet_id, "Almoço", foods["Arroz branco cozido"], 150),
+        db.add_diet_item(user_id, pid, diet_id, "Almoço", foods["Frango grelhado"], 120),
+        db.add_diet_item(user_id, pid, diet_id, "Jantar", foods["Frango grelhado"], 100),
+    ]
+    db.create_appointment(pid, "2024-03-01T09:00:00", "Retorno", user_id=user_id)
+    return {"user_id": user_id, "patient_id": pid, "diet_id": diet_id, "items": items, "foods": foods}
@@ -0,0 +1,42 @@
+"""
+Agenda: list_appointments_range com início inclusivo e fim exclusivo, como a página
+monta as janelas (datas ISO sem hora).
+"""
+from utils import db
+
+
+def _dts(rows):
+    return [a["dt_iso"] for a in rows]
+
+
+def test_range_bounds(seeded):
+    uid, pid = seeded["user_id"], seeded["patient_id"]
+    for dt in ("2024-02-29T23:59", "2024-03-01T00:00", "2024-03-07T23:59", "2024-03-08T00:00"):
+        db.create_appointment(pid, dt, "Consulta", user_id=uid)
+    outro = db.create_user("outro@teste.local", "hash")
+    db.create_appointment(db.create_patient("Bia", user_id=outro), "2024-03-01T10:00", user_id=outro)
+
+    # semana de 01/03 a 07/03: fica de fora o que é antes da meia-noite do dia 1 e a partir do dia 8
+    week = db.list_appointments_range(uid, "2024-03-01", "2024-03-08")
+    assert _dts(week) == ["2024-03-01T00:00", "2024-03-01T09:00:00", "2024-03-07T23:59"]
+    assert {a["patient_nome"] for a in week} == {"Ana"}
+
+    assert _dts(db.list_appointments_range(uid, "2024-03-01", "2024-03-02")) == ["2024-03-01T00:00", "2024-03-01T09:00:00"]
+    assert _dts(db.list_appointments_range(uid, "2024-02-29", "2024-03-01")) == ["2024-02-29T23:59"]
+    assert db.list_appointments_range(uid, "2024-03-02", "2024-03-07") == []
+    assert _dts(db.list_appointments_range(outro, "2024-03-01", "2024-03-02")) == ["2024-03-01T10:00"]
+
+
+def test_range_sees_new_and_moved_appointments(seeded):
+    uid, pid = seeded["user_id"], seeded["patient_id"]
+    assert len(db.list_appointments_range(uid, "2024-03-01", "2024-03-02")) == 1  # fica no cache
+
+    db.create_appointment(pid, "2024-03-01T15:00", "Retorno", user_id=uid)
+    day = db.list_appointments_range(uid, "2024-03-01", "2024-03-02")
+    assert _dts(day) == ["2024-03-01T09:00:00", "2024-03-01T15:00"]
+
+    db.update_appointment(day[1]["id"], uid, dt_iso="2024-03-02T15:00")
+    assert _dts(db.list_appointments_range(uid, "2024-03-01", "2024-03-02")) == ["2024-03-01T09:00:00"]
+
+    db.delete_appointment(day[0]["id"], uid)
+    assert db.list_appointments_range(uid, "2024-03-01", "2024-03-02") == []
@@ -0,0 +1,50 @@
+import json
+from datetime import datetime, timedelta
+
+from utils import analytics, db, event_store
+
+
+def _yesterday(hour: int) -> str:
+    d = datetime.utcnow().date() - timedelta(days=1)
+    return f"{d.isoformat()}T{hour:02d}:00:00"
+
+def _error(page, action):
+    return (1, "error", json.dumps({k: v for k, v in (("page", page), ("action", action)) if v}), _yesterday(10))
+
+
+def test_error_rate_by_page(fresh_db):
+    db.insert_events(
+        [(1, "patient_created", "{}", _yesterday(9))] * 3
+        + [_error("Cadastro de pacientes", "create_patient")]
+        + [_error("Agenda", "save")] * 2
+        + [_error(None, None)]
+    )
+    assert analytics.is_stale()
+    event_store.maintain()
+    assert not analytics.is_stale()
+
+    rates = analytics.error_rate_by_page(7)
+    assert [(r["page"], r["ok"], r["errors"], r["error_rate"]) for r in rates] == [
+        ("(sem página)", 0, 1, 1.0),
+        ("Agenda", 0, 2, 1.0),
+        ("Cadastro de pacientes", 3, 1, 0.25),
+    ]
+    assert rates[1]["actions"] == {"save": 2}
+    assert rates[0]["actions"] == {"(sem ação)": 1}
+
+
+def test_feedback_ratings(fresh_db):
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        for page, rating in (("Agenda", 8), ("Agenda", 10), ("Agenda", None), ("Relatório", 4)):
+            db.Q.run(cur, "feedback.insert", (1, page, "msg", rating, _yesterday(12)))
+        # hoje ainda não entra no agregado
+        db.Q.run(cur, "feedback.insert", (1, "Agenda", "msg", 0, datetime.utcnow().isoformat()))
+    event_store.maintain()
+
+    out = analytics.feedback_ratings(30)
+    assert [(r["rating"], r["n"]) for r in out["distribution"]] == [(-1, 1), (4, 1), (8, 1), (10, 1)]
+    assert [(p["page"], p["n"], p["avg_rating"]) for p in out["by_page"]] == [
+        ("Agenda", 3, 9.0),
+        ("Relatório", 1, 4.0),
+    ]
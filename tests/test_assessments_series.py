@@ -0,0 +1,15 @@
+from utils import db
+
+
+def test_series_with_metrics_list(fresh_db, user_id):
+    pid = db.create_patient("Bia", user_id=user_id)
+    for day, peso in (("2024-01-01", 80.0), ("2024-02-01", 78.5), ("2024-03-01", 77.0)):
+        db.create_assessment(pid, {"data_iso": day, "peso": peso}, user_id=user_id)
+
+    out = db.list_assessments_series(pid, metrics=["peso"], user_id=user_id)
+    again = db.list_assessments_series(pid, metrics=["peso"], user_id=user_id)
+
+    assert out == again
+    assert out["n"] == 3
+    assert list(out["series"]) == ["peso"]
+    assert [p["value"] for p in out["series"]["peso"]] == [80.0, 78.5, 77.0]
@@ -0,0 +1,19 @@
+from utils import backup
+
+
+def test_prune_keeps_newest_snapshots_from_the_same_second(tmp_path, monkeypatch):
+    monkeypatch.setattr(backup, "BACKUP_DIR", tmp_path)
+    names = [
+        "nutriapp-20240101-063729.db.gz",
+        "nutriapp-20240101-063730.db.gz",
+        "nutriapp-20240101-063730-2.db.gz",
+        "nutriapp-20240101-063730-10.db.gz",
+    ]
+    for name in names:
+        (tmp_path / name).write_bytes(b"")
+
+    assert [p.name for p in backup.list_backups()] == names
+
+    removed = backup.prune(keep=2)
+    assert [p.name for p in removed] == names[:2]
+    assert [p.name for p in backup.list_backups()] == names[2:]
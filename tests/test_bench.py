@@ -0,0 +1,125 @@
+"""
+Smoke test do benchmark (bench/) com volumes mínimos num SQLite temporário.
+"""
+import os
+import json
+
+import pytest
+
+from utils import db, event_logger
+from bench import generate as gen, run
+
+TINY = dict(
+    users=2, patients_per_user=3, years=1, assessments_per_year=2, diets_per_patient=1,
+    items_per_diet=2, appointments_per_patient=1, events=50, event_days=10, foods=20,
+)
+
+
+@pytest.fixture
+def bench_db(tmp_path, monkeypatch):
+    def use(name):
+        db.close_pool()
+        monkeypatch.setattr(db, "SQLITE_PATH", tmp_path / name)
+        db.clear_cache()
+        return db
+
+    yield use
+    db.close_pool()
+
+
+def _patients():
+    with db.get_conn(readonly=True) as conn:
+        rows = conn.execute("SELECT user_id, nome, nascimento, sexo FROM patients ORDER BY id").fetchall()
+    return [tuple(r) for r in rows]
+
+
+def test_generate_counts_and_dataset_key(bench_db):
+    bench_db("a.db")
+    counts = gen.generate(db, seed=7, log=lambda msg: None, **TINY)
+
+    patients = TINY["users"] * TINY["patients_per_user"]
+    # avaliações por paciente variam entre metade e o total do período
+    per_patient = TINY["years"] * TINY["assessments_per_year"]
+    assert patients * per_patient // 2 <= counts.pop("assessments") <= patients * per_patient
+    assert counts == {
+        "users": 2,
+        "patients": patients,
+        "diets": patients * TINY["diets_per_patient"],
+        "diet_items": patients * TINY["diets_per_patient"] * TINY["items_per_diet"],
+        "appointments": patients * TINY["appointments_per_patient"],
+        "foods": 20,
+        "feedback": 2 * 20,
+        "event_logs": 50,
+    }
+    assert gen.dataset_info(db) == gen.dataset_key(TINY, 7)
+    assert db.get_user_by_email(gen.bench_email(1)) is not None
+
+    # ensure_dataset reaproveita o banco do mesmo perfil e recusa outro sem --generate
+    assert gen.ensure_dataset(db, TINY, 7, regenerate=False) == gen.dataset_key(TINY, 7)
+    with pytest.raises(SystemExit):
+        gen.ensure_dataset(db, dict(TINY, events=60), 7, regenerate=False)
+
+
+def test_generate_is_reproducible(bench_db):
+    bench_db("a.db")
+    gen.generate(db, seed=7, log=lambda msg: None, **TINY)
+    first = _patients()
+
+    bench_db("b.db")
+    gen.generate(db, seed=7, log=lambda msg: None, **TINY)
+    assert _patients() == first
+
+    bench_db("c.db")
+    gen.generate(db, seed=8, log=lambda msg: None, **TINY)
+    assert _patients() != first
+
+
+@pytest.fixture
+def bench_env(monkeypatch):
+    # o setup_backend mexe no ambiente e no db.SQLITE_PATH: registra tudo para desfazer no fim
+    for var in ("DATABASE_URL", "DATABASE_READ_URL", "SQLITE_READ_PATH"):
+        monkeypatch.delenv(var, raising=False)
+    for var in ("DB_CACHE", "EVENT_MAINTENANCE_INTERVAL", "DB_SLOW_LOG"):
+        monkeypatch.setenv(var, os.environ.get(var, ""))
+    monkeypatch.setattr(db, "SQLITE_PATH", db.SQLITE_PATH)
+    # log_event síncrono: nada fica na thread do logger depois que o banco some
+    monkeypatch.setattr(event_logger, "ASYNC", False)
+    yield
+    db.close_pool()
+
+
+def test_run_measures_every_case(bench_env, tmp_path, capsys):
+    db.close_pool()
+    sizes = [arg for key, value in TINY.items() for arg in (f"--{key.replace('_', '-')}", str(value))]
+    out = tmp_path / "result.json"
+    run.main([
+        "--sqlite-path", str(tmp_path / "bench.db"), "--profile", "small", *sizes, "--generate",
+        "--repeat", "2", "--warmup", "0", "--out", str(out),
+    ])
+
+    report = json.loads(out.read_text(encoding="utf-8"))
+    meta = report["meta"]
+    assert meta["backend"] == "sqlite" and meta["volumes"] == gen.dataset_key(TINY, 42)
+    assert meta["counts"]["patients"] == TINY["users"] * TINY["patients_per_user"]
+
+    results = report["results"]
+    assert "get_patient_bundle" in results and "search_foods[uma palavra]" in results
+    for name, r in results.items():
+        assert r["n"] >= 1, name
+        assert 0 <= r["min_ms"] <= r["median_ms"] <= r["max_ms"], name
+    # toda função pública do utils/db.py tem caso
+    assert "sem benchmark" not in capsys.readouterr().out
+
+    # -k filtra os casos; o banco já gerado é reaproveitado (sem --generate)
+    run.main([
+        "--sqlite-path", str(tmp_path / "bench.db"), "--profile", "small", *sizes,
+        "--repeat", "1", "--warmup", "0", "-k", "foods", "--out", str(out),
+    ])
+    names = json.loads(out.read_text(encoding="utf-8"))["results"]
+    assert names and all("foods" in n for n in names)
+
+
+def test_summarize():
+    assert run.summarize([3.0, 1.0, 2.0]) == {
+        "n": 3, "min_ms": 1.0, "median_ms": 2.0, "p95_ms": 3.0, "mean_ms": 2.0, "max_ms": 3.0, "stdev_ms": 1.0,
+    }
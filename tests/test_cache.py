@@ -0,0 +1,17 @@
+from utils import db
+
+
+def test_key_accepts_unhashable_values():
+    key = db._hashable({"ids": [3, 1], "tags": {"b", "a"}, "opts": {"x": [1]}})
+    assert hash(key) == hash(db._hashable({"opts": {"x": [1]}, "tags": {"a", "b"}, "ids": [3, 1]}))
+
+
+def test_cached_function_with_list_argument(fresh_db, user_id):
+    pid = db.create_patient("Ana", user_id=user_id)
+    before = db.cache_stats()["hits"]
+
+    first = db.get_patient_labels(user_id, [pid])
+    second = db.get_patient_labels(user_id, [pid])
+
+    assert first == second == {pid: "Ana"}
+    assert db.cache_stats()["hits"] == before + 1
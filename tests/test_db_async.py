@@ -0,0 +1,82 @@
+"""
+AsyncDB (aiosqlite) contra a API síncrona do utils/db.py: mesmas consultas do registro Q,
+mesmos resultados.
+"""
+import asyncio
+
+import pytest
+
+pytest.importorskip("aiosqlite")
+
+from utils.db_async import AsyncDB  # noqa: E402
+
+
+def _run(db, fn):
+    async def go():
+        async with AsyncDB(database_url="", sqlite_path=db.SQLITE_PATH) as adb:
+            return await fn(adb)
+    return asyncio.run(go())
+
+
+def test_reads_match_sync_api(fresh_db, seeded):
+    db = fresh_db
+    uid, pid, diet_id = seeded["user_id"], seeded["patient_id"], seeded["diet_id"]
+    db.create_patient("Bruno", user_id=uid)
+
+    async def reads(adb):
+        return {
+            "patients": await adb.list_patients(uid),
+            "patient": await adb.get_patient(pid, uid),
+            "search": await adb.search_patients(uid, "an"),
+            "labels": await adb.get_patient_labels(uid, (pid,)),
+            "page": await adb.list_patients_page(uid, limit=1),
+            "count": await adb.count_patients(uid),
+            "assessment": await adb.get_last_assessment(pid, uid),
+            "diet": await adb.get_last_diet(pid, uid),
+            "items": await adb.list_diet_items(uid, pid, diet_id),
+            "totals": await adb.get_diet_totals(uid, pid, diet_id),
+            "bundle": await adb.get_patient_bundle(uid, pid),
+            "foods": await adb.search_foods("frango"),
+            "agenda": await adb.list_appointments_range(uid, "2024-03-01", "2024-03-02"),
+        }
+
+    got = _run(db, reads)
+    db.clear_cache()
+
+    assert got == {
+        "patients": [dict(r) for r in db.list_patients(uid)],
+        "patient": dict(db.get_patient(pid, uid)),
+        "search": [dict(r) for r in db.search_patients(uid, "an")],
+        "labels": db.get_patient_labels(uid, (pid,)),
+        "page": [dict(r) for r in db.list_patients_page(uid, limit=1)],
+        "count": db.count_patients(uid),
+        "assessment": dict(db.get_last_assessment(pid, uid)),
+        "diet": dict(db.get_last_diet(pid, uid)),
+        "items": [dict(r) for r in db.list_diet_items(uid, pid, diet_id)],
+        "totals": db.get_diet_totals(uid, pid, diet_id),
+        "bundle": db.get_patient_bundle(uid, pid),
+        "foods": db.search_foods("frango"),
+        "agenda": [dict(r) for r in db.list_appointments_range(uid, "2024-03-01", "2024-03-02")],
+    }
+    assert [p["nome"] for p in got["patients"]] == ["Ana", "Bruno"]
+    assert got["bundle"]["totals"]["day"]["items"] == 3
+
+
+def test_async_writes_invalidate_sync_cache(fresh_db, seeded):
+    db = fresh_db
+    uid, pid, diet_id = seeded["user_id"], seeded["patient_id"], seeded["diet_id"]
+    arroz = seeded["foods"]["Arroz branco cozido"]
+    before = db.get_diet_totals(uid, pid, diet_id)  # fica no cache
+
+    async def writes(adb):
+        new_id = await adb.add_diet_item(uid, pid, diet_id, "Jantar", arroz, 100)
+        await adb.delete_diet_item(uid, seeded["items"][0])
+        return new_id
+
+    new_id = _run(db, writes)
+
+    after = db.get_diet_totals(uid, pid, diet_id)
+    assert after != before
+    assert after["day"]["items"] == 3
+    ids = {r["id"] for r in db.list_diet_items(uid, pid, diet_id)}
+    assert new_id in ids and seeded["items"][0] not in ids
@@ -0,0 +1,51 @@
+import pytest
+
+from utils import db
+
+
+def _round(value):
+    # soma incremental e soma do zero diferem só no arredondamento do float
+    if isinstance(value, dict):
+        return {k: _round(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_round(v) for v in value]
+    return round(value, 6) if isinstance(value, float) else value
+
+
+def _table():
+    with db.get_conn(readonly=True) as conn:
+        rows = conn.execute("SELECT * FROM diet_totals WHERE items > 0 ORDER BY user_id, patient_id, diet_key, meal")
+        return _round([dict(r) for r in rows.fetchall()])
+
+
+def _totals(user_id, patient_id, diet_id):
+    return _round({
+        "by_diet": db.get_diet_totals(user_id, patient_id, diet_id),
+        "by_patient": db.get_diet_totals(user_id, patient_id),
+    })
+
+
+@pytest.mark.parametrize("owner", ["user", None])
+def test_incremental_totals_match_rebuild(seeded, owner):
+    uid = seeded["user_id"] if owner else None     # None: item antigo, de antes do user_id
+    pid, diet_id = seeded["patient_id"], seeded["diet_id"]
+    arroz, frango = seeded["foods"]["Arroz branco cozido"], seeded["foods"]["Frango grelhado"]
+
+    added = [
+        db.add_diet_item(uid, pid, diet_id, "Café", arroz, 80),
+        db.add_diet_item(uid, pid, diet_id, "Café", frango, 50),
+        db.add_diet_item(uid, pid, diet_id, "Ceia", arroz, 30),
+    ]
+    db.delete_diet_item(uid, added[1])
+    db.delete_diet_item(uid, added[2])
+    db.delete_diet_item(seeded["user_id"], seeded["items"][0])
+
+    incremental = _table(), _totals(uid, pid, diet_id)
+    db.rebuild_diet_totals()
+    db.clear_cache()
+    assert (_table(), _totals(uid, pid, diet_id)) == incremental
+
+    meals = incremental[1]["by_diet"]["meals"]
+    assert meals["Café"]["items"] == 1
+    assert "Ceia" not in meals
+    assert meals["Café"]["kcal"] == pytest.approx(128 * 0.8)
@@ -0,0 +1,144 @@
+"""
+EventLogger (utils/event_logger.py): lotes, spool quando o banco cai e reenvio depois.
+O writer é uma lista em memória; o último teste grava de verdade no event_logs.
+"""
+import time
+
+import pytest
+
+from utils import db
+from utils.event_logger import EventLogger
+
+
+class Writer:
+    def __init__(self):
+        self.batches = []
+        self.down = False
+
+    def __call__(self, batch):
+        if self.down:
+            raise ConnectionError("banco fora do ar")
+        self.batches.append(list(batch))
+
+    @property
+    def rows(self):
+        return [row for b in self.batches for row in b]
+
+
+def _event(i, name="page_view"):
+    return (1, name, f'{{"i": {i}}}', f"2024-03-05T10:00:{i:02d}")
+
+
+@pytest.fixture
+def make_logger(tmp_path):
+    made = []
+
+    def make(**kw):
+        kw.setdefault("flush_interval", 60)
+        kw.setdefault("spool_path", tmp_path / "event_spool.jsonl")
+        writer = Writer()
+        logger = EventLogger(writer=writer, **kw)
+        made.append(logger)
+        return logger, writer
+
+    yield make
+    for logger in made:
+        logger.close(timeout=1)
+
+
+def test_background_thread_writes_full_batches(make_logger):
+    logger, writer = make_logger(batch_size=3)
+    for i in range(7):
+        logger.log(*_event(i))
+
+    # 6 eventos já fecham dois lotes: a thread grava sem esperar o flush_interval
+    deadline = time.monotonic() + 5
+    while len(writer.rows) < 6 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(writer.rows) >= 6
+
+    logger.close(timeout=1)
+    assert writer.rows == [_event(i) for i in range(7)]
+    assert all(len(b) <= 3 for b in writer.batches)
+    assert logger.stats() == dict(logger.stats(), logged=7, written=7, buffered=0)
+
+
+def test_flush_interval_writes_partial_batch(make_logger):
+    logger, writer = make_logger(batch_size=100, flush_interval=0.05)
+    logger.log(*_event(1))
+    deadline = time.monotonic() + 5
+    while not writer.rows and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert writer.batches == [[_event(1)]]
+
+
+def test_spool_when_db_down_and_replay_after(make_logger):
+    logger, writer = make_logger(batch_size=2)
+    writer.down = True
+    logger._ensure_thread = lambda: None   # só flush manual, sem corrida com a thread
+    for i in range(3):
+        logger.log(*_event(i))
+    logger.flush()
+
+    assert writer.rows == []
+    assert len(logger.spool_path.read_text(encoding="utf-8").splitlines()) == 3
+    assert logger.stats()["spooled"] == 3
+
+    # banco volta: o próximo flush grava o lote novo e reenvia o spool
+    writer.down = False
+    logger.log(*_event(3))
+    logger.flush()
+    assert writer.rows == [_event(3), _event(0), _event(1), _event(2)]
+    assert not logger.spool_path.exists()
+    assert not logger.spool_path.with_suffix(".replaying").exists()
+    assert logger.stats()["replayed"] == 3
+
+
+def test_replay_failing_midway_keeps_the_rest(make_logger):
+    logger, writer = make_logger(batch_size=2)
+    logger._ensure_thread = lambda: None
+    logger._spool([_event(i) for i in range(5)])
+
+    calls = []
+
+    def flaky(batch):
+        calls.append(batch)
+        if len(calls) > 1:
+            raise ConnectionError("caiu de novo")
+        writer(batch)
+
+    logger._writer = flaky
+    logger.flush()
+    assert writer.rows == [_event(0), _event(1)]
+
+    logger._writer = writer
+    logger.flush()
+    assert writer.rows == [_event(i) for i in range(5)]
+
+
+def test_sampling_and_critical_events(make_logger):
+    logger, writer = make_logger(batch_size=100, max_buffer=5, sample_rate=0.0)
+    logger._ensure_thread = lambda: None
+    for i in range(6):
+        logger.log(*_event(i))
+    # acima de 80% da fila os comuns são amostrados (taxa 0 → todos fora)
+    assert logger.stats()["buffered"] == 4
+    assert logger.stats()["sampled_out"] == 2
+
+    for i in range(3):
+        logger.log(*_event(10 + i, "error"))
+    # "error" nunca é amostrado; com a fila cheia entra no lugar do mais antigo
+    logger.flush()
+    assert [r[1] for r in writer.rows] == ["page_view", "page_view", "error", "error", "error"]
+    assert logger.stats()["dropped"] == 2
+
+
+def test_replay_into_event_logs(fresh_db, user_id, tmp_path):
+    logger = EventLogger(batch_size=10, flush_interval=60, spool_path=tmp_path / "spool.jsonl")
+    logger._ensure_thread = lambda: None
+    logger._spool([(user_id, "login", "{}", "2024-03-05T10:00:00"), (None, "error", '{"x": 1}', "2024-03-05T10:00:01")])
+    logger.flush()
+
+    with db.get_conn(readonly=True) as conn:
+        rows = conn.execute("SELECT user_id, event_name, meta FROM event_logs ORDER BY id").fetchall()
+    assert [tuple(r) for r in rows] == [(user_id, "login", "{}"), (None, "error", '{"x": 1}')]
@@ -0,0 +1,103 @@
+import json
+from datetime import date
+
+from utils import db, event_store
+
+TODAY = date(2024, 3, 5)
+
+
+def _events(*rows):
+    db.insert_events([(uid, name, json.dumps(meta or {}), at) for uid, name, meta, at in rows])
+
+def _feedback(page, rating, at):
+    with db.get_conn() as conn:
+        db.Q.run(conn.cursor(), "feedback.insert", (1, page, "msg", rating, at))
+
+def _all(sql, params=()):
+    with db.get_conn(readonly=True) as conn:
+        return [tuple(r) for r in conn.execute(sql, params).fetchall()]
+
+
+def test_rollups_close_days_up_to_yesterday_and_set_watermarks(fresh_db):
+    _events(
+        (1, "page_view", None, "2024-03-02T10:00:00"),
+        (1, "page_view", None, "2024-03-04T09:00:00"),
+        (2, "page_view", None, "2024-03-04T11:00:00"),
+        (2, "error", {"page": "Agenda", "action": "save"}, "2024-03-04T12:00:00"),
+        (1, "page_view", None, "2024-03-05T08:00:00"),      # hoje: ainda não fecha
+    )
+    _feedback("Agenda", 4, "2024-03-03T10:00:00")
+    _feedback("Agenda", None, "2024-03-03T11:00:00")
+
+    event_store.maintain(TODAY)
+
+    assert _all("SELECT day, user_id, event_name, n FROM event_daily ORDER BY 1, 2, 3") == [
+        ("2024-03-02", 1, "page_view", 1),
+        ("2024-03-04", 1, "page_view", 1),
+        ("2024-03-04", 2, "error", 1),
+        ("2024-03-04", 2, "page_view", 1),
+    ]
+    assert _all("SELECT day, page, action, n FROM error_daily") == [("2024-03-04", "Agenda", "save", 1)]
+    assert _all("SELECT day, page, rating, n FROM feedback_daily ORDER BY rating") == [
+        ("2024-03-03", "Agenda", -1, 1), ("2024-03-03", "Agenda", 4, 1),
+    ]
+    with db.get_conn(readonly=True) as conn:
+        marks = {r.table: event_store.rolled_until(conn.cursor(), r) for r in event_store.ROLLUPS}
+    assert set(marks.values()) == {date(2024, 3, 4)}
+
+
+def test_rollup_is_idempotent_and_picks_up_late_events(fresh_db):
+    _events((1, "page_view", None, "2024-03-04T09:00:00"))
+    event_store.maintain(TODAY)
+    event_store.maintain(TODAY)
+    assert _all("SELECT day, n FROM event_daily") == [("2024-03-04", 1)]
+
+    # chegou atrasado (spool do event_logger), dentro de EVENT_ROLLUP_LOOKBACK_DAYS
+    _events((1, "page_view", None, "2024-03-04T23:00:00"))
+    event_store.maintain(date(2024, 3, 6))
+    assert _all("SELECT day, n FROM event_daily") == [("2024-03-04", 2)]
+
+
+def test_rotate_sqlite_moves_previous_months(fresh_db):
+    _events(
+        (1, "a", None, "2024-01-15T10:00:00"),
+        (1, "b", None, "2024-02-20T10:00:00"),
+        (1, "c", None, "2024-02-21T10:00:00"),
+        (1, "d", None, "2024-03-01T10:00:00"),
+    )
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        assert event_store.rotate_sqlite(cur, TODAY) == 3
+        assert set(event_store.month_tables(cur).values()) == {"event_logs_2024_01", "event_logs_2024_02"}
+    assert _all("SELECT event_name FROM event_logs") == [("d",)]
+    assert _all("SELECT event_name FROM event_logs_2024_02 ORDER BY 1") == [("b",), ("c",)]
+
+
+def test_retention_drops_only_rolled_up_months(fresh_db, monkeypatch):
+    monkeypatch.setattr(event_store, "RETENTION_MONTHS", 1)
+    _events(
+        (1, "a", None, "2023-12-10T10:00:00"),
+        (1, "b", None, "2024-01-10T10:00:00"),
+        (1, "c", None, "2024-02-10T10:00:00"),
+    )
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        event_store.rotate_sqlite(cur, TODAY)
+        # rollup nunca rodou: nada some antes de ser consolidado
+        assert event_store.apply_retention(cur, TODAY) == []
+
+    result = event_store.maintain(TODAY)
+    assert result["dropped"] == ["event_logs_2023_12", "event_logs_2024_01"]
+    with db.get_conn(readonly=True) as conn:
+        assert list(event_store.month_tables(conn.cursor()).values()) == ["event_logs_2024_02"]
+    # o agregado continua com os dias apagados
+    assert ("2023-12-10", 1) in _all("SELECT day, n FROM event_daily")
+
+
+def test_maybe_maintain_reports_failures_on_stderr(monkeypatch, capsys):
+    monkeypatch.setattr(event_store, "MAINTENANCE_INTERVAL", 1)
+    monkeypatch.setattr(event_store, "_last_auto_run", None)
+    monkeypatch.setattr(event_store, "maintain", lambda: 1 / 0)
+    event_store.maybe_maintain()
+    err = capsys.readouterr()
+    assert "manutenção falhou" in err.err and err.out == ""
@@ -0,0 +1,72 @@
+import csv
+import io
+import os
+import time
+import zipfile
+
+import pytest
+
+from utils import db, export
+
+
+ROWS = {"patients": 1, "assessments": 2, "diets": 1, "diet_items": 3, "appointments": 1}
+
+
+def _rows(fmt, data: bytes) -> list[dict]:
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(data.decode("utf-8-sig"))))
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(io.BytesIO(data)).to_pylist()
+    from openpyxl import load_workbook
+    rows = []
+    for ws in load_workbook(io.BytesIO(data), read_only=True).worksheets:
+        header, *body = ws.iter_rows(values_only=True)
+        rows += [dict(zip(header, r)) for r in body]
+    return rows
+
+
+@pytest.mark.parametrize("fmt", export.EXPORT_FORMATS)
+def test_export_contents_per_format(seeded, fmt):
+    # outro usuário não pode aparecer na exportação
+    stranger = db.create_user("outro@teste.local", "hash")
+    db.create_patient("Beto", user_id=stranger)
+
+    buf = io.BytesIO()
+    total = export.write_export(seeded["user_id"], buf, fmt, batch=2)
+    assert total == len(buf.getvalue())
+
+    with zipfile.ZipFile(buf) as zf:
+        assert zf.namelist() == [f"{e.table}.{fmt}" for e in export.EXPORTS]
+        tables = {name.rsplit(".", 1)[0]: _rows(fmt, zf.read(name)) for name in zf.namelist()}
+
+    assert {t: len(rows) for t, rows in tables.items()} == ROWS
+    assert [p["nome"] for p in tables["patients"]] == ["Ana"]
+    assert sorted(i["alimento"] for i in tables["diet_items"]) == [
+        "Arroz branco cozido", "Frango grelhado", "Frango grelhado",
+    ]
+    pesos = sorted(float(a["peso"]) for a in tables["assessments"])
+    assert pesos == [68.5, 70.0]
+
+
+def test_export_to_file_respects_size_limit(seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    with pytest.raises(export.ExportTooLarge):
+        export.export_to_file(seeded["user_id"], "csv", max_mb=100 / 1024 / 1024)
+    # nada de .part ou .zip pela metade
+    assert not list((tmp_path / "exports").rglob("*.*"))
+
+    path = export.export_to_file(seeded["user_id"], "csv")
+    assert export.latest_export(seeded["user_id"]) == path
+
+
+def test_cleanup_removes_expired_exports(seeded, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "exports")
+    path = export.export_to_file(seeded["user_id"], "csv")
+    assert export.cleanup_exports(ttl_hours=1) == []
+
+    old = time.time() - 2 * 3600
+    os.utime(path, (old, old))
+    assert export.cleanup_exports(ttl_hours=1) == [path]
+    assert export.latest_export(seeded["user_id"]) is None
+    assert not path.parent.exists()
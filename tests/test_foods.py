@@ -0,0 +1,45 @@
+import pytest
+
+from utils import db, food_catalog
+
+
+@pytest.fixture
+def catalog(fresh_db, monkeypatch):
+    # o catálogo é um por processo: um novo para o banco deste teste
+    monkeypatch.setattr(food_catalog, "_catalog", None)
+    return food_catalog.get_catalog
+
+
+def test_get_food_comes_from_catalog(catalog):
+    db.upsert_foods([{"nome": "Arroz integral cozido", "kcal": 124}])
+    food_id = catalog().search("arroz")[0]["id"]
+
+    food = db.get_food(food_id)
+    assert food["nome"] == "Arroz integral cozido"
+    assert food == catalog().get_food(food_id)
+    assert db.get_food(-1) is None
+
+
+def test_upsert_failure_keeps_committed_chunks_visible(catalog, monkeypatch):
+    db.upsert_foods([{"nome": "Feijão carioca", "kcal": 76}])
+    assert [f["nome"] for f in catalog().search("feijao")] == ["Feijão carioca"]
+    version = db.get_foods_version()
+
+    monkeypatch.setattr(db, "UPSERT_CHUNK", 1)
+    run_many = db.Q.run_many
+    calls = []
+
+    def fail_second_chunk(cur, name, rows):
+        calls.append(name)
+        if len(calls) == 2:
+            raise RuntimeError("falhou no meio")
+        return run_many(cur, name, rows)
+
+    monkeypatch.setattr(db.Q, "run_many", fail_second_chunk)
+    with pytest.raises(RuntimeError):
+        db.upsert_foods([{"nome": "Feijão preto", "kcal": 77}, {"nome": "Feijão fradinho", "kcal": 78}])
+
+    # o primeiro bloco foi confirmado: o carimbo mudou e o catálogo enxerga o alimento novo
+    assert db.get_foods_version() != version
+    catalog().invalidate()
+    assert {f["nome"] for f in catalog().search("feijao")} == {"Feijão carioca", "Feijão preto"}
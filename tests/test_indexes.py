@@ -0,0 +1,33 @@
+"""
+utils/indexes.py: relatório de índices no SQLite.
+"""
+from utils import db, indexes
+
+
+def test_index_report_after_migrations(fresh_db):
+    r = indexes.index_report()
+    assert r["missing"] == [] and r["invalid"] == [] and r["unused"] == []
+    assert r["full_scans"] == []
+    assert set(r["plans"]) == {ix.name for ix in indexes.INDEXES}
+    # cada consulta quente usa o índice feito para ela
+    for ix in indexes.INDEXES:
+        assert any(ix.name in line for line in r["plans"][ix.name]), (ix.name, r["plans"][ix.name])
+
+
+def test_index_report_flags_missing_index_and_create_restores_it(fresh_db):
+    with db.get_conn() as conn:
+        conn.execute("DROP INDEX idx_appointments_user_dt")
+
+    r = indexes.index_report()
+    assert r["missing"] == ["idx_appointments_user_dt"]
+    assert "idx_appointments_user_dt" in r["full_scans"]
+
+    assert indexes.main(["create"]) == 0
+    assert indexes.index_report()["missing"] == []
+
+
+def test_report_cli(fresh_db, capsys):
+    assert indexes.main(["report"]) == 0
+    out = capsys.readouterr().out
+    assert "Faltando:      —" in out
+    assert "idx_patients_user_nome:" in out
@@ -0,0 +1,85 @@
+"""
+Migrations (utils/migrations.py): versões registradas, idempotência e falha no meio.
+"""
+import pytest
+
+from utils import db, migrations
+from utils.migrations import Migration
+
+
+@pytest.fixture
+def empty_db(tmp_path, monkeypatch):
+    db.close_pool()
+    monkeypatch.setattr(db, "SQLITE_PATH", tmp_path / "nutriapp.db")
+    monkeypatch.setattr(migrations, "_schema_ready", False)
+    yield db
+    db.close_pool()
+
+
+def _recorded():
+    with db.get_conn(readonly=True) as conn:
+        rows = conn.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version")
+        return [dict(r) for r in rows.fetchall()]
+
+
+def test_migrate_records_every_version(empty_db):
+    assert migrations.current_version() == 0
+    all_versions = [m.version for m in migrations.MIGRATIONS]
+
+    assert migrations.migrate() == all_versions
+    rows = _recorded()
+    assert [(r["version"], r["name"]) for r in rows] == [(m.version, m.name) for m in migrations.MIGRATIONS]
+    assert all(r["applied_at"] for r in rows)
+    assert migrations.current_version() == migrations.latest_version()
+    assert migrations.applied_versions() == set(all_versions)
+
+
+def test_migrate_is_idempotent(empty_db):
+    migrations.migrate()
+    before = _recorded()
+    assert migrations.migrate() == []
+    assert _recorded() == before
+
+    # versão "perdida" (ex.: banco restaurado no meio): reaplica só ela, sem quebrar
+    last = migrations.latest_version()
+    with db.get_conn() as conn:
+        conn.execute("DELETE FROM schema_migrations WHERE version = ?", (last,))
+    assert migrations.migrate() == [last]
+    assert migrations.applied_versions() == {m.version for m in migrations.MIGRATIONS}
+
+
+def test_failed_migration_rolls_back_and_is_not_recorded(empty_db, monkeypatch):
+    migrations.migrate()
+    version = migrations.latest_version() + 1
+
+    def broken(cur):
+        cur.execute("CREATE TABLE meia_migration (id INTEGER)")
+        raise RuntimeError("falhou no meio")
+
+    monkeypatch.setattr(migrations, "MIGRATIONS", [*migrations.MIGRATIONS, Migration(version, "quebrada", broken)])
+    with pytest.raises(RuntimeError):
+        migrations.migrate()
+
+    assert version not in migrations.applied_versions()
+    with db.get_conn(readonly=True) as conn:
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'meia_migration'").fetchone() is None
+
+
+def test_ensure_schema_without_auto_migrate(empty_db, monkeypatch):
+    monkeypatch.setattr(migrations, "AUTO_MIGRATE", False)
+    with pytest.raises(RuntimeError, match="utils.migrations upgrade"):
+        migrations.ensure_schema()
+
+    assert migrations.main(["upgrade"]) == 0
+    migrations.ensure_schema()
+    assert migrations._schema_ready
+
+
+def test_status_cli(empty_db, capsys):
+    migrations.migrate()
+    assert migrations.main(["status"]) == 0
+    out = capsys.readouterr().out
+    latest = migrations.latest_version()
+    assert f"Banco: versão {latest} | App: versão {latest}" in out
+    assert out.count("[x]") == len(migrations.MIGRATIONS)
+    assert migrations.main(["nada"]) == 2
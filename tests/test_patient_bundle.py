@@ -0,0 +1,95 @@
+"""
+get_patient_bundle igual aos getters individuais: com dieta, sem dieta (itens soltos)
+e no formato que o caminho do Postgres monta a partir do row_to_json/json_agg.
+"""
+import json
+
+import pytest
+
+from utils import db
+
+
+def _individual(user_id, patient_id):
+    diet = db.get_last_diet(patient_id, user_id)
+    diet_id = diet["id"] if diet else None
+    return {
+        "patient": db.get_patient(patient_id, user_id),
+        "assessment": db.get_last_assessment(patient_id, user_id),
+        "diet": diet,
+        "items": [dict(r) for r in db.list_diet_items(user_id, patient_id, diet_id)],
+        "totals": db.get_diet_totals(user_id, patient_id, diet_id),
+    }
+
+
+@pytest.mark.parametrize("cache", [True, False])
+def test_bundle_with_diet(seeded, monkeypatch, cache):
+    monkeypatch.setattr(db, "CACHE_ENABLED", cache)
+    uid, pid = seeded["user_id"], seeded["patient_id"]
+    # segunda dieta mais nova: o bundle passa a trazer só os itens dela
+    new_diet = db.create_diet(pid, {"data_iso": "2024-03-01", "calorias_alvo": 1600}, user_id=uid)
+    db.add_diet_item(uid, pid, new_diet, "Café", seeded["foods"]["Arroz branco cozido"], 80)
+
+    bundle = db.get_patient_bundle(uid, pid)
+    assert bundle == _individual(uid, pid)
+    assert bundle["diet"]["id"] == new_diet
+    assert bundle["assessment"]["data_iso"] == "2024-02-10"
+    assert [i["meal"] for i in bundle["items"]] == ["Café"]
+    assert bundle["totals"]["day"]["items"] == 1
+
+
+def test_bundle_without_diet(fresh_db, user_id):
+    db.upsert_foods([{"nome": "Banana prata", "kcal": 98, "proteina_g": 1.3, "carbo_g": 26.0, "gordura_g": 0.1}])
+    food_id = db.list_all_foods()[0]["id"]
+    pid = db.create_patient("Caio", user_id=user_id)
+    assert db.get_patient_bundle(user_id, pid) == {
+        "patient": db.get_patient(pid, user_id), "assessment": None, "diet": None,
+        "items": [], "totals": db._totals_from_rows([]),
+    }
+
+    db.add_diet_item(user_id, pid, None, "Lanche", food_id, 100)
+    db.add_diet_item(user_id, pid, None, "Café", food_id, 50)
+    bundle = db.get_patient_bundle(user_id, pid)
+    assert bundle == _individual(user_id, pid)
+    assert [i["meal"] for i in bundle["items"]] == ["Café", "Lanche"]
+    assert bundle["totals"]["day"]["items"] == 2
+
+
+def test_bundle_other_user(seeded):
+    outro = db.create_user("outro@teste.local", "hash")
+    assert db.get_patient_bundle(outro, seeded["patient_id"]) is None
+
+
+class _FakePgCursor:
+    def __init__(self, row):
+        self.row = row
+
+    def fetchone(self):
+        return self.row
+
+
+def test_bundle_postgres_path_shape(seeded, monkeypatch):
+    # Sem Postgres aqui: monta a linha como o patients.bundle devolve (json já decodificado
+    # pelo psycopg2, totals do json_agg) e confere que o resultado bate com os getters
+    uid, pid = seeded["user_id"], seeded["patient_id"]
+    expected = _individual(uid, pid)
+    with db.get_conn(readonly=True) as conn:
+        totals = [dict(r) for r in db.Q.run(conn.cursor(), "diet_totals.by_diet", (uid, pid, expected["diet"]["id"]))]
+    row = json.loads(json.dumps({
+        "patient": expected["patient"],
+        "assessment": expected["assessment"],
+        "diet": expected["diet"],
+        "items": expected["items"],
+        "totals": totals,
+    }))
+
+    calls = []
+
+    def fake_run(cur, name, params=()):
+        calls.append((name, params))
+        return _FakePgCursor(row)
+
+    monkeypatch.setattr(db, "USE_POSTGRES", True)
+    monkeypatch.setattr(db.Q, "run", fake_run)
+    db.clear_cache()
+    assert db.get_patient_bundle(uid, pid) == expected
+    assert calls == [("patients.bundle", (pid, uid))]
@@ -0,0 +1,48 @@
+"""
+list_patients_page: paginação por (nome, id) sem buracos nem repetição,
+inclusive com nomes iguais e paciente novo entrando no meio da listagem.
+"""
+from utils import db
+
+
+def _walk(user_id, limit, on_page=None):
+    seen, after = [], None
+    while True:
+        page = db.list_patients_page(user_id, after=after, limit=limit)
+        if not page:
+            return seen
+        assert len(page) <= limit
+        seen.extend(page)
+        after = (page[-1]["nome"], page[-1]["id"])
+        if on_page:
+            on_page(len(seen))
+
+
+def test_keyset_pages_cover_everything_once(fresh_db, user_id):
+    nomes = ["Carla", "Ana", "Bruno", "Ana", "Ana", "Débora", "Bruno"]
+    ids = [db.create_patient(n, user_id=user_id) for n in nomes]
+    outro = db.create_user("outro@teste.local", "hash")
+    db.create_patient("Ana", user_id=outro)
+
+    expected = sorted(zip(nomes, ids))
+    for limit in (1, 2, 3, 7, 50):
+        got = [(p["nome"], p["id"]) for p in _walk(user_id, limit)]
+        assert got == expected, limit
+    assert db.count_patients(user_id) == len(expected)
+
+
+def test_new_patient_mid_walk(fresh_db, user_id):
+    for n in ("Ana", "Bruno", "Carla", "Débora"):
+        db.create_patient(n, user_id=user_id)
+
+    added = []
+
+    def add_patients(n_seen):
+        # depois da 1ª página: um antes do cursor (não aparece) e um depois (aparece uma vez)
+        if n_seen == 2:
+            added.append(db.create_patient("Aline", user_id=user_id))
+            added.append(db.create_patient("Cecília", user_id=user_id))
+
+    got = [p["nome"] for p in _walk(user_id, 2, on_page=add_patients)]
+    assert got == ["Ana", "Bruno", "Carla", "Cecília", "Débora"]
+    assert len(added) == 2
@@ -0,0 +1,122 @@
+"""
+Pools do utils/pool.py: reaproveitamento da conexão e devolução quando o bloco dá erro.
+O PostgresPool roda com conexões falsas (não precisa de Postgres).
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from utils import db
+from utils.pool import PoolTimeout, PostgresPool, SQLiteThreadPool
+
+
+class FakePgConn:
+    def __init__(self, fail_rollback=False):
+        self.closed = 0
+        self.commits = 0
+        self.rollbacks = 0
+        self.fail_rollback = fail_rollback
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+        if self.fail_rollback:
+            raise RuntimeError("conexão caiu")
+
+    def close(self):
+        self.closed = 1
+
+
+def _pg_pool(maxconn=2, **kw):
+    opened = []
+
+    def connect():
+        opened.append(FakePgConn())
+        return opened[-1]
+
+    return PostgresPool(connect, minconn=0, maxconn=maxconn, timeout=0.05, **kw), opened
+
+
+def test_postgres_pool_reuses_connection():
+    pool, opened = _pg_pool()
+    for _ in range(3):
+        with db._lent(pool, pool.getconn()):
+            pass
+    assert len(opened) == 1
+    assert opened[0].commits == 3
+    assert pool.stats() == {"backend": "postgres", "in_use": 0, "idle": 1, "max": 2}
+
+
+def test_postgres_pool_releases_on_exception():
+    pool, opened = _pg_pool(maxconn=1)
+    with pytest.raises(ValueError):
+        with db._lent(pool, pool.getconn()):
+            raise ValueError("erro no meio do bloco")
+    # rollback feito e a vaga devolvida: a próxima pega a mesma conexão sem esperar
+    assert opened[0].rollbacks == 1 and not opened[0].closed
+    assert pool.getconn() is opened[0]
+
+
+def test_postgres_pool_discards_broken_connection():
+    pool, opened = _pg_pool(maxconn=1)
+    conn = pool.getconn()
+    conn.fail_rollback = True
+    with pytest.raises(ValueError):
+        with db._lent(pool, conn):
+            raise ValueError("erro no meio do bloco")
+    assert conn.closed
+    assert pool.getconn() is not conn
+    assert len(opened) == 2
+
+
+def test_postgres_pool_limit_and_timeout():
+    pool, _ = _pg_pool(maxconn=1)
+    conn = pool.getconn()
+    with pytest.raises(PoolTimeout):
+        pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+
+def test_postgres_pool_recycles_old_connection():
+    pool, opened = _pg_pool(max_lifetime=1e-9)
+    first = pool.getconn()
+    pool.putconn(first)
+    assert first.closed
+    assert pool.getconn() is not first
+    assert len(opened) == 2
+
+
+def test_sqlite_pool_one_connection_per_thread(tmp_path):
+    pool = SQLiteThreadPool(lambda: sqlite3.connect(tmp_path / "x.db", check_same_thread=False))
+    conn = pool.getconn()
+    pool.putconn(conn)
+    assert pool.getconn() is conn
+
+    other = []
+    t = threading.Thread(target=lambda: other.append(pool.getconn()))
+    t.start()
+    t.join()
+    assert other[0] is not conn
+    assert pool.stats()["threads"] == 2
+    pool.closeall()
+
+
+@pytest.mark.skipif(db.SQLITE_PRODUCTION, reason="escritas vão pelo SQLiteWriter (test_sqlite_writer.py)")
+def test_get_conn_rolls_back_and_keeps_connection(fresh_db, user_id):
+    pool = db.get_pool()
+    with db.get_conn() as conn:
+        first = conn
+    with pytest.raises(ValueError):
+        with db.get_conn() as conn:
+            conn.execute("UPDATE users SET email = 'outro@teste.local' WHERE id = ?", (user_id,))
+            raise ValueError("erro no meio do bloco")
+    assert conn is first
+    with db.get_conn(readonly=True) as conn:
+        assert conn is first
+        email = conn.execute("SELECT email FROM users WHERE id = ?", (user_id,)).fetchone()[0]
+    assert email == "nutri@teste.local"
+    assert pool.stats()["threads"] == 1
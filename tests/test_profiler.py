@@ -0,0 +1,82 @@
+import json
+import textwrap
+
+import pytest
+
+from utils import profiler
+
+
+@pytest.fixture(autouse=True)
+def clean_stats():
+    profiler.reset()
+    yield
+    profiler.reset()
+
+
+def test_histogram_quantiles_and_buckets():
+    h = profiler.Histogram()
+    for ms in (0.5, 3, 3, 4, 40, 3000):
+        h.add(ms)
+    d = h.as_dict()
+    assert d["n"] == 6
+    assert d["p50_ms"] == 5          # faixa ≤5
+    assert d["max_ms"] == 3000
+    assert d["buckets"]["≤5"] == 3 and d["buckets"][">2500"] == 1
+
+
+def test_slow_log_keeps_shape_not_values(tmp_path, monkeypatch):
+    log = tmp_path / "slow.log"
+    monkeypatch.setattr(profiler, "SLOW_LOG", str(log))
+    monkeypatch.setattr(profiler, "SLOW_MS", 10)
+
+    profiler.record("patients.search", (7, "segredo"), 0.001)
+    profiler.record("patients.search", (7, "segredo"), 0.050)
+
+    entries = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [(e["name"], e["params"]) for e in entries] == [("patients.search", "(int, str[7])")]
+    assert "segredo" not in log.read_text()
+    assert profiler.slow_queries()[0]["ms"] == 50.0
+    assert profiler.statement_stats()["patients.search"]["n"] == 2
+
+
+def test_trace_warnings_and_page_stats():
+    trace = profiler.start_rerun("2_agenda")
+    for pid in range(profiler.N_PLUS_ONE_MIN):
+        profiler.record("patients.get", (pid,), 0.001)
+    profiler.record("patients.get", (0,), 0.001)
+    profiler.note_call("get_patient", (1,), {})
+    profiler.note_call("get_patient", (1,), {})
+    profiler.finish_rerun(trace)
+
+    assert profiler.current_trace() is None
+    assert trace.finished and trace.elapsed_ms is not None
+    assert trace.warnings() == sorted([
+        "get_patient(): chamada 2× com os mesmos argumentos",
+        "patients.get: 2× com os mesmos parâmetros",
+        f"patients.get: {profiler.N_PLUS_ONE_MIN} execuções com parâmetros diferentes (N+1?)",
+    ])
+    # fechar de novo não conta outro rerun
+    profiler.finish_rerun(trace)
+    stats = profiler.page_stats()["2_agenda"]
+    assert stats["reruns"] == 1 and stats["max_queries"] == profiler.N_PLUS_ONE_MIN + 1
+
+
+def test_page_run_closes_trace_when_script_stops(fresh_db, tmp_path):
+    from streamlit.testing.v1 import AppTest
+
+    script = tmp_path / "pagina.py"
+    script.write_text(textwrap.dedent("""
+        import streamlit as st
+        from utils.bootstrap import page_run
+        from utils.db import count_patients
+
+        with page_run("pagina", show_patient_picker=False, require_login=False):
+            count_patients(1)
+            st.stop()
+    """))
+    at = AppTest.from_file(str(script), default_timeout=30).run()
+
+    trace = at.session_state["db_trace"]
+    assert trace.finished and trace.page == "pagina"
+    assert [q[0] for q in trace.queries] == ["patients.count"]
+    assert profiler.page_stats()["pagina"]["reruns"] == 1
@@ -0,0 +1,72 @@
+"""
+Registro de consultas (utils/queries.py): tradução do ? para o Postgres e execução no SQLite.
+"""
+import sqlite3
+
+import pytest
+
+from utils.queries import QueryRegistry, Statement, _translate
+
+
+@pytest.mark.parametrize("sql, fmt, numbered, n", [
+    ("SELECT * FROM t WHERE a = ? AND b = ?",
+     "SELECT * FROM t WHERE a = %s AND b = %s",
+     "SELECT * FROM t WHERE a = $1 AND b = $2", 2),
+    # ? entre aspas é texto, não parâmetro
+    ("SELECT '?' AS q, x FROM t WHERE a = ?",
+     "SELECT '?' AS q, x FROM t WHERE a = %s",
+     "SELECT '?' AS q, x FROM t WHERE a = $1", 1),
+    # aspas escapadas ('') abrem e fecham de novo: o ? depois continua fora
+    ("SELECT 'it''s ?' FROM t WHERE a = ?",
+     "SELECT 'it''s ?' FROM t WHERE a = %s",
+     "SELECT 'it''s ?' FROM t WHERE a = $1", 1),
+    # % vira %% só na versão do psycopg2 (dentro e fora de aspas)
+    ("SELECT * FROM t WHERE nome LIKE '%a%' AND b LIKE ? AND c % 2 = 0",
+     "SELECT * FROM t WHERE nome LIKE '%%a%%' AND b LIKE %s AND c %% 2 = 0",
+     "SELECT * FROM t WHERE nome LIKE '%a%' AND b LIKE $1 AND c % 2 = 0", 1),
+    ("SELECT 1", "SELECT 1", "SELECT 1", 0),
+])
+def test_translate(sql, fmt, numbered, n):
+    assert _translate(sql) == (fmt, numbered, n)
+
+
+def test_statement_pg_texts():
+    stmt = Statement("t.insert", """
+        INSERT INTO t (a, b)
+        VALUES (?, '%?')
+    """, returning="id")
+    assert stmt.sqlite == "INSERT INTO t (a, b) VALUES (?, '%?')"
+    assert stmt.pg == "INSERT INTO t (a, b) VALUES (%s, '%%?') RETURNING id"
+    assert stmt.nparams == 1
+    assert stmt.pg_prepare == "PREPARE q_t_insert AS INSERT INTO t (a, b) VALUES ($1, '%?') RETURNING id"
+    assert stmt.pg_execute == "EXECUTE q_t_insert (%s)"
+
+    # texto próprio do Postgres (ILIKE) também passa pela tradução
+    stmt = Statement("t.search", "SELECT * FROM t WHERE a LIKE ?", pg="SELECT * FROM t WHERE a ILIKE ? || '%'")
+    assert stmt.sqlite == "SELECT * FROM t WHERE a LIKE ?"
+    assert stmt.pg == "SELECT * FROM t WHERE a ILIKE %s || '%%'"
+    assert Statement("t.count", "SELECT COUNT(*) FROM t").pg_execute == "EXECUTE q_t_count"
+
+
+def test_sqlite_runs_quoted_question_mark_and_percent():
+    Q = QueryRegistry(postgres=False)
+    Q.define("t.insert", "INSERT INTO t (nome) VALUES (?)")
+    Q.define("t.find", "SELECT nome, '?' AS q, '100%' AS p FROM t WHERE nome LIKE ? ORDER BY nome")
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (nome TEXT)")
+    Q.run_many(conn.cursor(), "t.insert", [("Arroz?",), ("Feijão 50%",), ("Pão",)])
+
+    rows = Q.run(conn.cursor(), "t.find", ("%?%",)).fetchall()
+    assert rows == [("Arroz?", "?", "100%")]
+    rows = Q.run(conn.cursor(), "t.find", ("%50%",)).fetchall()
+    assert rows == [("Feijão 50%", "?", "100%")]
+    assert Q.stats()["t.find"] == {"calls": 2, "prepares": 0}
+
+
+def test_duplicate_name_rejected():
+    Q = QueryRegistry(postgres=False)
+    Q.define("t.a", "SELECT 1")
+    with pytest.raises(ValueError):
+        Q.define("t.a", "SELECT 2")
+
@@ -0,0 +1,61 @@
+import shutil
+import uuid
+
+import pytest
+
+from utils import db
+
+
+def _db_file(conn) -> str:
+    # arquivo por trás da conexão (vale também para a somente leitura)
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+@pytest.fixture
+def replica(fresh_db, user_id, tmp_path, monkeypatch):
+    """Primário + cópia como réplica (SQLITE_READ_PATH), numa sessão só deste teste."""
+    db.close_pool()
+    path = tmp_path / "replica.db"
+    shutil.copy(db.SQLITE_PATH, path)
+    monkeypatch.setattr(db, "SQLITE_READ_PATH", path)
+    monkeypatch.setattr(db, "USE_READ_REPLICA", True)
+    monkeypatch.setattr(db, "READ_STICKY_SECONDS", 60)
+    db.set_session_key(f"test:{uuid.uuid4().hex}")
+    yield path
+    db.set_session_key(None)
+    db.close_pool()
+
+
+def test_readonly_reads_go_to_replica(replica):
+    before = db._routing_stats["replica_reads"]
+    with db.get_conn(readonly=True) as conn:
+        assert _db_file(conn) == str(replica)
+    assert db._routing_stats["replica_reads"] == before + 1
+
+
+def test_primary_and_writes_go_to_primary(replica, user_id):
+    with db.get_conn(readonly=True, primary=True) as conn:
+        assert _db_file(conn) == str(db.SQLITE_PATH)
+
+    pid = db.create_patient("Caio", user_id=user_id)
+    with db.get_conn(readonly=True, primary=True) as conn:
+        assert conn.execute("SELECT COUNT(*) FROM patients WHERE id = ?", (pid,)).fetchone()[0] == 1
+    # a cópia não é atualizada por ninguém no teste: o INSERT não pode ter ido para ela
+    db.set_session_key(f"test:{uuid.uuid4().hex}")
+    with db.get_conn(readonly=True) as conn:
+        assert _db_file(conn) == str(replica)
+        assert conn.execute("SELECT COUNT(*) FROM patients WHERE id = ?", (pid,)).fetchone()[0] == 0
+
+
+def test_reads_stick_to_primary_after_write(replica, user_id, monkeypatch):
+    db.create_patient("Duda", user_id=user_id)
+
+    before = db._routing_stats["sticky_reads"]
+    with db.get_conn(readonly=True) as conn:
+        assert _db_file(conn) == str(db.SQLITE_PATH)
+    assert db._routing_stats["sticky_reads"] == before + 1
+
+    # passou a janela: volta para a réplica
+    monkeypatch.setattr(db, "READ_STICKY_SECONDS", 0)
+    with db.get_conn(readonly=True) as conn:
+        assert _db_file(conn) == str(replica)
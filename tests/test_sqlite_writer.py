@@ -0,0 +1,161 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from utils.pool import PoolTimeout, SQLiteWriter
+
+
+@pytest.fixture
+def writer(tmp_path):
+    path = tmp_path / "w.db"
+    setup = sqlite3.connect(path)
+    setup.executescript("""
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE parent (id INTEGER PRIMARY KEY);
+        CREATE TABLE t (id INTEGER PRIMARY KEY, v TEXT,
+                        parent_id INTEGER REFERENCES parent(id) DEFERRABLE INITIALLY DEFERRED);
+    """)
+    setup.close()
+
+    def connect():
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    w = SQLiteWriter(connect, max_batch=64, timeout=5, hold_timeout=0.3)
+    w.path = path
+    yield w
+    w.closeall()
+
+
+def _values(w):
+    conn = sqlite3.connect(w.path)
+    try:
+        return sorted(r[0] for r in conn.execute("SELECT v FROM t"))
+    finally:
+        conn.close()
+
+
+def _write(w, v):
+    with w.connection() as conn:
+        conn.execute("INSERT INTO t (v) VALUES (?)", (v,))
+
+
+def test_concurrent_writes_share_commits(writer):
+    gate = threading.Event()
+
+    def hold_first():
+        # segura a conexão até as outras entrarem na fila: viram um lote só
+        with writer.connection() as conn:
+            conn.execute("INSERT INTO t (v) VALUES ('a00')")
+            gate.wait(5)
+
+    first = threading.Thread(target=hold_first)
+    first.start()
+    time.sleep(0.05)
+    others = [threading.Thread(target=_write, args=(writer, f"b{i:02d}")) for i in range(10)]
+    for t in others:
+        t.start()
+    time.sleep(0.1)
+    gate.set()
+    for t in [first, *others]:
+        t.join(5)
+
+    assert len(_values(writer)) == 11
+    stats = writer.stats()
+    assert stats["writes"] == 11 and stats["batches"] < 11 and stats["largest_batch"] > 1
+
+
+def test_write_is_visible_when_block_exits(writer):
+    _write(writer, "x")
+    assert _values(writer) == ["x"]
+
+
+def test_failed_block_only_undoes_itself(writer):
+    gate = threading.Event()
+    errors = []
+
+    def failing():
+        try:
+            with writer.connection() as conn:
+                conn.execute("INSERT INTO t (v) VALUES ('ruim')")
+                gate.wait(5)
+                raise ValueError("falhou")
+        except ValueError as e:
+            errors.append(e)
+
+    t_fail = threading.Thread(target=failing)
+    t_fail.start()
+    time.sleep(0.05)
+    t_ok = threading.Thread(target=_write, args=(writer, "bom"))
+    t_ok.start()
+    time.sleep(0.05)
+    gate.set()
+    t_fail.join(5)
+    t_ok.join(5)
+
+    assert len(errors) == 1
+    assert _values(writer) == ["bom"]
+    assert writer.stats()["failed"] == 1
+
+
+def test_commit_failure_reaches_every_block_of_the_batch(writer):
+    gate = threading.Event()
+    errors = []
+
+    def run(fn):
+        try:
+            fn()
+        except sqlite3.Error as e:
+            errors.append(e)
+
+    def orphan():
+        # FK adiada: só estoura no COMMIT
+        with writer.connection() as conn:
+            conn.execute("INSERT INTO t (v, parent_id) VALUES ('orfão', 999)")
+            gate.wait(5)
+
+    threads = [threading.Thread(target=run, args=(orphan,))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=run, args=(lambda: _write(writer, "junto"),)))
+    threads[1].start()
+    time.sleep(0.05)
+    gate.set()
+    for t in threads:
+        t.join(5)
+
+    assert len(errors) == 2
+    assert _values(writer) == []
+    # o escritor continua funcionando depois
+    _write(writer, "depois")
+    assert _values(writer) == ["depois"]
+
+
+def test_stuck_block_is_revoked_and_rolled_back(writer):
+    errors = []
+    release = threading.Event()
+
+    def stuck():
+        try:
+            with writer.connection() as conn:
+                conn.execute("INSERT INTO t (v) VALUES ('preso')")
+                release.wait(5)
+                conn.execute("INSERT INTO t (v) VALUES ('tarde')")
+        except PoolTimeout as e:
+            errors.append(e)
+
+    t = threading.Thread(target=stuck)
+    t.start()
+    time.sleep(0.05)
+    started = time.monotonic()
+    _write(writer, "fila")           # não espera o bloco preso além do hold_timeout
+    assert time.monotonic() - started < 2
+    release.set()
+    t.join(5)
+
+    assert len(errors) == 1
+    assert _values(writer) == ["fila"]
+    assert writer.stats()["revoked"] == 1
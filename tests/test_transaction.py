@@ -0,0 +1,112 @@
+import sqlite3
+
+import pytest
+
+from utils import db, event_logger
+
+
+def _committed(sql, params=()):
+    # conexão à parte: só enxerga o que já foi confirmado
+    conn = sqlite3.connect(db.SQLITE_PATH)
+    try:
+        return conn.execute(sql, params).fetchone()[0]
+    finally:
+        conn.close()
+
+def _patients(user_id):
+    return _committed("SELECT COUNT(*) FROM patients WHERE user_id = ?", (user_id,))
+
+
+def test_commit_once_and_hooks_after_commit(fresh_db, user_id):
+    seen = []
+    with db.transaction() as tx:
+        db.create_patient("Ana", user_id=user_id)
+        db.create_patient("Bia", user_id=user_id)
+        # leitura dentro do bloco enxerga o que ele gravou; fora dele ainda não existe
+        assert db.count_patients(user_id) == 2
+        assert _patients(user_id) == 0
+        tx.on_commit(lambda: seen.append(_patients(user_id)))
+        assert seen == []
+    assert seen == [2]
+    assert db.count_patients(user_id) == 2
+
+
+def test_exception_rolls_back_everything(fresh_db, user_id):
+    seen, after = [], []
+    with pytest.raises(RuntimeError):
+        with db.transaction() as tx:
+            db.create_patient("Ana", user_id=user_id)
+            tx.on_commit(lambda: seen.append("commit"))
+            tx._finally.append(lambda: after.append("fim"))
+            raise RuntimeError("falhou")
+    assert _patients(user_id) == 0
+    assert seen == [] and after == ["fim"]
+    assert not db.in_transaction()
+
+
+def test_nested_transaction_is_a_savepoint(fresh_db, user_id):
+    with db.transaction():
+        db.create_patient("Ana", user_id=user_id)
+        with pytest.raises(ValueError):
+            with db.transaction():
+                db.create_patient("Bia", user_id=user_id)
+                raise ValueError("só o bloco de dentro")
+        with db.transaction():
+            db.create_patient("Caio", user_id=user_id)
+    names = {p["nome"] for p in db.list_patients(user_id)}
+    assert names == {"Ana", "Caio"}
+
+
+def test_failed_write_inside_block_undoes_only_itself(fresh_db, user_id):
+    with db.transaction():
+        db.create_patient("Ana", user_id=user_id)
+        with pytest.raises(sqlite3.Error):
+            with db.get_conn() as conn:
+                conn.execute("INSERT INTO patients (user_id, nome) VALUES (?, ?)", (user_id, "Bia"))
+                conn.execute("INSERT INTO tabela_que_nao_existe VALUES (1)")
+    assert [p["nome"] for p in db.list_patients(user_id)] == ["Ana"]
+
+
+def test_cache_invalidation_waits_for_commit(fresh_db, user_id):
+    def version():
+        return db._cache.key("search_patients", user_id, ())[3]
+
+    assert db.search_patients(user_id) == []       # fica no cache
+    before = version()
+    with db.transaction():
+        db.create_patient("Ana", user_id=user_id)
+        # outra sessão lendo agora ainda guardaria o dado antigo: a versão só muda no COMMIT
+        assert version() == before
+    assert version() == before + 1
+    assert [p["nome"] for p in db.search_patients(user_id)] == ["Ana"]
+
+
+def test_failed_hook_does_not_undo_commit(fresh_db, user_id, capsys):
+    with db.transaction() as tx:
+        db.create_patient("Ana", user_id=user_id)
+        tx.on_commit(lambda: 1 / 0)
+    assert _patients(user_id) == 1
+    assert "hook da transação falhou" in capsys.readouterr().err
+
+
+@pytest.mark.parametrize("asynchronous", [False, True])
+def test_log_event_only_after_commit(fresh_db, user_id, monkeypatch, asynchronous):
+    logged = []
+    monkeypatch.setattr(event_logger, "ASYNC", asynchronous)
+    monkeypatch.setattr(event_logger, "get_event_logger", lambda: type("L", (), {"log": lambda self, *row: logged.append(row)})())
+
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.create_patient("Ana", user_id=user_id)
+            db.log_event(user_id, "patient_created", {})
+            raise RuntimeError("desfaz")
+    assert _committed("SELECT COUNT(*) FROM event_logs") == 0 and logged == []
+
+    with db.transaction():
+        db.create_patient("Ana", user_id=user_id)
+        db.log_event(user_id, "patient_created", {})
+    if asynchronous:
+        assert [r[1] for r in logged] == ["patient_created"]
+    else:
+        # síncrono: a linha entrou no mesmo COMMIT do cadastro
+        assert _committed("SELECT COUNT(*) FROM event_logs WHERE event_name = 'patient_created'") == 1
@@ -0,0 +1,206 @@
+"""
+Números de uso para o painel de admin (pages/99_admin_feedback.py).
+
+Tudo sai dos agregados diários mantidos pelo utils/event_store.py (event_daily,
+error_daily, feedback_daily), nunca de event_logs/feedback inteiros: o custo depende
+de dias × usuários, não do número de eventos. Os agregados vão até ontem (dias
+fechados); o "hoje" é contado ao vivo, só no intervalo do dia (índice em created_at).
+"""
+from datetime import datetime, timedelta
+
+from utils import event_store
+from utils.db import Q, get_conn, _dicts, _scalar
+
+# página de cada evento de sucesso — o mesmo nome que os eventos "error" mandam no meta
+EVENT_PAGES = {
+    "patient_created": "Cadastro de pacientes",
+    "patient_updated": "Cadastro de pacientes",
+    "appointment_created": "Agenda",
+    "appointment_updated": "Agenda",
+    "appointment_deleted": "Agenda",
+    "assessment_created": "Avaliação Nutricional",
+    "pdf_generated": "Relatório",
+    "diet_item_added": "Montar refeições",
+    "diet_item_deleted": "Montar refeições",
+    "data_exported": "Exportar dados",
+}
+
+
+def _since(days: int) -> str:
+    return (datetime.utcnow().date() - timedelta(days=days)).isoformat()
+
+
+# --------------------------------------------------
+# Frescor dos agregados
+# --------------------------------------------------
+
+def freshness() -> dict:
+    """Último dia fechado de cada agregado."""
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        out = {}
+        for r in event_store.ROLLUPS:
+            last = event_store.rolled_until(cur, r)
+            out[r.table] = last.isoformat() if last else None
+    return out
+
+def is_stale(fresh: dict | None = None) -> bool:
+    """
+    Algum agregado parou antes de ontem. Quem atualiza é o event_store (thread do
+    event_logger ou `python -m utils.event_store maintain`), nunca a página.
+    """
+    yesterday = (datetime.utcnow().date() - timedelta(days=1)).isoformat()
+    fresh = freshness() if fresh is None else fresh
+    return any(v is None or v < yesterday for v in fresh.values())
+
+
+# --------------------------------------------------
+# Eventos
+# --------------------------------------------------
+
+Q.define("analytics.events_per_day", """
+    SELECT day, SUM(n) AS events, COUNT(DISTINCT CASE WHEN user_id <> 0 THEN user_id END) AS users
+    FROM event_daily
+    WHERE day >= ?
+    GROUP BY day
+    ORDER BY day
+""")
+Q.define("analytics.events_by_user", """
+    SELECT d.user_id, u.email, SUM(d.n) AS events, COUNT(DISTINCT d.day) AS days
+    FROM event_daily d
+    LEFT JOIN users u ON u.id = d.user_id
+    WHERE d.day >= ? AND d.user_id <> 0
+    GROUP BY d.user_id, u.email
+    ORDER BY events DESC
+    LIMIT ?
+""")
+Q.define("analytics.events_by_name", """
+    SELECT event_name, SUM(n) AS n
+    FROM event_daily
+    WHERE day >= ?
+    GROUP BY event_name
+    ORDER BY n DESC
+""")
+Q.define("analytics.active_users", """
+    SELECT COUNT(DISTINCT user_id) FROM event_daily
+    WHERE day >= ? AND day <= ? AND user_id <> 0
+""")
+Q.define("analytics.today", """
+    SELECT COUNT(*) AS events, COUNT(DISTINCT user_id) AS users
+    FROM event_logs
+    WHERE created_at >= ?
+""")
+
+def events_per_day(days: int = 30):
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "analytics.events_per_day", (_since(days),)).fetchall()
+    return _dicts(rows)
+
+def events_by_user(days: int = 30, limit: int = 50):
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "analytics.events_by_user", (_since(days), limit)).fetchall()
+    return _dicts(rows)
+
+def events_by_name(days: int = 30):
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "analytics.events_by_name", (_since(days),)).fetchall()
+    return _dicts(rows)
+
+def active_users() -> dict:
+    """Usuários ativos no último dia fechado, 7 e 30 dias (até ontem)."""
+    yesterday = datetime.utcnow().date() - timedelta(days=1)
+    out = {}
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        for label, days in (("dau", 1), ("wau", 7), ("mau", 30)):
+            start = yesterday - timedelta(days=days - 1)
+            row = Q.run(cur, "analytics.active_users", (start.isoformat(), yesterday.isoformat())).fetchone()
+            out[label] = int(_scalar(row) or 0)
+    return out
+
+def today_live() -> dict:
+    """Eventos de hoje direto do event_logs (só o intervalo do dia)."""
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "analytics.today", (datetime.utcnow().date().isoformat(),)).fetchone()
+    row = dict(row)
+    return {"events": int(row["events"] or 0), "users": int(row["users"] or 0)}
+
+
+# --------------------------------------------------
+# Erros
+# --------------------------------------------------
+
+Q.define("analytics.errors_by_page", """
+    SELECT page, action, SUM(n) AS n
+    FROM error_daily
+    WHERE day >= ?
+    GROUP BY page, action
+""")
+
+def error_rate_by_page(days: int = 30):
+    """
+    Erros ÷ tentativas por página. Tentativa = evento de sucesso da página
+    (EVENT_PAGES) + evento "error" com a mesma página no meta.
+    """
+    since = _since(days)
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        errors = _dicts(Q.run(cur, "analytics.errors_by_page", (since,)).fetchall())
+        by_name = _dicts(Q.run(cur, "analytics.events_by_name", (since,)).fetchall())
+
+    pages = {}
+    for r in by_name:
+        page = EVENT_PAGES.get(r["event_name"])
+        if page:
+            pages.setdefault(page, {"page": page, "ok": 0, "errors": 0, "actions": {}})
+            pages[page]["ok"] += int(r["n"])
+    for r in errors:
+        page = r["page"] or "(sem página)"
+        p = pages.setdefault(page, {"page": page, "ok": 0, "errors": 0, "actions": {}})
+        p["errors"] += int(r["n"])
+        action = r["action"] or "(sem ação)"
+        p["actions"][action] = p["actions"].get(action, 0) + int(r["n"])
+
+    out = []
+    for p in pages.values():
+        total = p["ok"] + p["errors"]
+        p["error_rate"] = p["errors"] / total if total else 0.0
+        out.append(p)
+    return sorted(out, key=lambda p: (-p["error_rate"], p["page"]))
+
+
+# --------------------------------------------------
+# Feedback
+# --------------------------------------------------
+
+Q.define("analytics.ratings", """
+    SELECT rating, SUM(n) AS n
+    FROM feedback_daily
+    WHERE day >= ?
+    GROUP BY rating
+    ORDER BY rating
+""")
+Q.define("analytics.ratings_by_page", """
+    SELECT page,
+           SUM(n) AS n,
+           SUM(CASE WHEN rating >= 0 THEN rating * n ELSE 0 END) AS rating_sum,
+           SUM(CASE WHEN rating >= 0 THEN n ELSE 0 END) AS rated
+    FROM feedback_daily
+    WHERE day >= ?
+    GROUP BY page
+    ORDER BY n DESC
+""")
+
+def feedback_ratings(days: int = 90) -> dict:
+    """Distribuição das notas (0–10; -1 = sem nota) e média por página."""
+    since = _since(days)
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        dist = _dicts(Q.run(cur, "analytics.ratings", (since,)).fetchall())
+        pages = _dicts(Q.run(cur, "analytics.ratings_by_page", (since,)).fetchall())
+
+    for p in pages:
+        rated = int(p.pop("rated") or 0)
+        rating_sum = p.pop("rating_sum") or 0
+        p["avg_rating"] = round(rating_sum / rated, 2) if rated else None
+    return {"distribution": dist, "by_page": pages}
@@ -1,3 +1,5 @@
+import os
+
 import bcrypt
 import streamlit as st
 
@@ -26,9 +28,16 @@ def verify_password(password: str, password_hash: str) -> bool:
 
 USER_KEY = "user"  # chave padrão da sessão
 
+# quem vê as páginas de admin (e-mails separados por vírgula); vazio = ninguém
+ADMIN_EMAILS = {e.strip().lower() for e in os.getenv("ADMIN_EMAILS", "").split(",") if e.strip()}
+
 def is_logged_in() -> bool:
     return bool(st.session_state.get(USER_KEY))
 
+def is_admin() -> bool:
+    user = st.session_state.get(USER_KEY) or {}
+    return (user.get("email") or "").strip().lower() in ADMIN_EMAILS
+
 def login_user(user: dict):
     """
     user deve conter APENAS dados seguros:
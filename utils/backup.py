@@ -0,0 +1,339 @@
+"""
+Backups do banco com o app no ar.
+
+    python -m utils.backup create            # snapshot novo (e apaga os mais antigos)
+    python -m utils.backup list
+    python -m utils.backup verify [ARQUIVO]  # checksum + integridade (padrão: todos)
+    python -m utils.backup restore ARQUIVO --yes
+
+- SQLite: API de backup online do sqlite3, BACKUP_STEP_PAGES páginas por passo com uma
+  pausa entre eles — o lock de leitura é solto a cada passo, então quem grava não fica
+  esperando a cópia inteira. Se o app gravar no meio, o SQLite recomeça a cópia; depois de
+  BACKUP_MAX_RESTARTS recomeços faz tudo num passo só (segura o lock de leitura só o tempo
+  da cópia). O snapshot é conferido (PRAGMA integrity_check) e comprimido (.db.gz).
+- Postgres: pg_dump -Fc (snapshot MVCC: não bloqueia leitura nem escrita, só DDL).
+  O formato custom não gera em paralelo (o -j do pg_dump é só para o formato diretório);
+  o paralelismo fica na volta, com pg_restore -j BACKUP_JOBS.
+- Cada snapshot tem um .sha256 ao lado (formato do sha256sum, dá para conferir fora do app)
+  e ficam só os BACKUP_KEEP mais novos.
+
+Roda fora do processo do Streamlit (cron / systemd timer), então compressão e checksum
+não disputam CPU com as sessões.
+"""
+import os
+import re
+import sys
+import gzip
+import time
+import shutil
+import sqlite3
+import hashlib
+import subprocess
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+from utils import db
+
+BACKUP_DIR = Path(os.getenv("BACKUP_DIR", str(Path("data") / "backups")))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "14"))
+BACKUP_STEP_PAGES = int(os.getenv("BACKUP_STEP_PAGES", "1024"))
+BACKUP_STEP_SLEEP = float(os.getenv("BACKUP_STEP_SLEEP", "0.01"))
+BACKUP_MAX_RESTARTS = int(os.getenv("BACKUP_MAX_RESTARTS", "3"))
+BACKUP_JOBS = int(os.getenv("BACKUP_JOBS", str(min(4, os.cpu_count() or 1))))
+
+PREFIX = "nutriapp-"
+SUFFIXES = (".db.gz", ".dump")
+CHUNK = 1024 * 1024
+
+
+# --------------------------------------------------
+# Checksum e rotação
+# --------------------------------------------------
+
+def sha256_file(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+def _checksum_path(path: Path) -> Path:
+    return path.with_name(path.name + ".sha256")
+
+def _write_checksum(path: Path, digest: str):
+    _checksum_path(path).write_text(f"{digest}  {path.name}\n", encoding="utf-8")
+
+def _expected_checksum(path: Path) -> str | None:
+    side = _checksum_path(path)
+    if not side.exists():
+        return None
+    return side.read_text(encoding="utf-8").split()[0]
+
+def _new_snapshot(dest_dir: Path, suffix: str) -> Path:
+    dest_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    path, n = dest_dir / f"{PREFIX}{stamp}{suffix}", 1
+    while path.exists():
+        n += 1
+        path = dest_dir / f"{PREFIX}{stamp}-{n}{suffix}"
+    return path
+
+_STAMP_RE = re.compile(r"(\d{8}-\d{6})(?:-(\d+))?\.")
+
+def _snapshot_order(path: Path):
+    # data do nome + contador de colisão: "-2" vem depois do sem número do mesmo segundo
+    # (pelo nome puro, "...-063730-2.db.gz" ficaria antes de "...-063730.db.gz")
+    m = _STAMP_RE.match(path.name, len(PREFIX))
+    if not m:
+        return ("", 0, path.name)
+    return (m.group(1), int(m.group(2) or 1), path.name)
+
+def list_backups() -> list[Path]:
+    """Snapshots do BACKUP_DIR, do mais antigo para o mais novo (o nome tem a data)."""
+    if not BACKUP_DIR.exists():
+        return []
+    return sorted(
+        (p for p in BACKUP_DIR.iterdir() if p.name.startswith(PREFIX) and p.name.endswith(SUFFIXES)),
+        key=_snapshot_order,
+    )
+
+def prune(keep: int = BACKUP_KEEP) -> list[Path]:
+    """Apaga os snapshots além dos `keep` mais novos. keep <= 0 não apaga nada."""
+    if keep <= 0:
+        return []
+    old = list_backups()[:-keep]
+    for path in old:
+        path.unlink(missing_ok=True)
+        _checksum_path(path).unlink(missing_ok=True)
+    return old
+
+
+# --------------------------------------------------
+# SQLite
+# --------------------------------------------------
+
+class _Restarted(Exception):
+    pass
+
+def _online_copy(src, dst, log=None) -> dict:
+    """Copia src → dst em passos; devolve páginas e quantas vezes a cópia recomeçou."""
+    state = {"restarts": 0, "remaining": None, "pages": 0}
+
+    def progress(status, remaining, total):
+        if state["remaining"] is not None and remaining > state["remaining"]:
+            # o banco mudou por outra conexão: o SQLite voltou para o começo
+            state["restarts"] += 1
+            if state["restarts"] > BACKUP_MAX_RESTARTS:
+                raise _Restarted
+        state["remaining"], state["pages"] = remaining, total
+
+    try:
+        src.backup(dst, pages=BACKUP_STEP_PAGES, progress=progress, sleep=BACKUP_STEP_SLEEP)
+    except _Restarted:
+        if log:
+            log(f"banco mudou {state['restarts']} vezes durante a cópia; copiando num passo só")
+        src.backup(dst, pages=-1)
+    return state
+
+def _sqlite_integrity(path: Path) -> str:
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        return conn.execute("PRAGMA integrity_check").fetchone()[0]
+    finally:
+        conn.close()
+
+def backup_sqlite(dest_dir: Path = BACKUP_DIR, log=None) -> Path:
+    out = _new_snapshot(dest_dir, ".db.gz")
+    raw = out.with_name(out.name[:-len(".db.gz")] + ".db.part")
+
+    started = time.perf_counter()
+    src = db.get_sqlite_conn(readonly=True)
+    dst = sqlite3.connect(raw)
+    try:
+        state = _online_copy(src, dst, log=log)
+    finally:
+        dst.close()
+        src.close()
+    try:
+        check = _sqlite_integrity(raw)
+        if check != "ok":
+            raise RuntimeError(f"cópia falhou no integrity_check: {check}")
+        with open(raw, "rb") as f_in, gzip.open(out, "wb", compresslevel=6) as f_out:
+            shutil.copyfileobj(f_in, f_out, CHUNK)
+        # checksum do .gz como ficou no disco (é ele que o verify confere)
+        _write_checksum(out, sha256_file(out))
+    except BaseException:
+        out.unlink(missing_ok=True)
+        raise
+    finally:
+        raw.unlink(missing_ok=True)
+
+    if log:
+        log(f"{out.name}: {state['pages']} páginas, {state['restarts']} recomeço(s), "
+            f"{out.stat().st_size / 1024:.0f} KB em {time.perf_counter() - started:.1f}s")
+    return out
+
+def _gunzip_to_temp(path: Path) -> Path:
+    fd, tmp = tempfile.mkstemp(suffix=".db", dir=path.parent)
+    with os.fdopen(fd, "wb") as f_out, gzip.open(path, "rb") as f_in:
+        shutil.copyfileobj(f_in, f_out, CHUNK)
+    return Path(tmp)
+
+def restore_sqlite(path: Path, log=None):
+    """
+    Volta o banco para o snapshot pela própria API de backup (snapshot → banco do app):
+    as conexões abertas do app continuam válidas e passam a ver os dados restaurados
+    (o cache de leitura do utils/db.py ainda pode mostrar o antigo por DB_CACHE_TTL segundos).
+    Antes disso tira um snapshot do estado atual, para poder desfazer.
+    """
+    tmp = _gunzip_to_temp(path)
+    try:
+        check = _sqlite_integrity(tmp)
+        if check != "ok":
+            raise RuntimeError(f"snapshot corrompido: {check}")
+        safety = backup_sqlite(log=log)
+        if log:
+            log(f"estado atual salvo em {safety.name}")
+        src = sqlite3.connect(tmp)
+        dst = db.get_sqlite_conn()
+        try:
+            # o banco do app fica travado para escrita até o fim da cópia de qualquer jeito;
+            # num passo só esse tempo é o menor possível
+            src.backup(dst, pages=-1)
+        finally:
+            dst.close()
+            src.close()
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+# --------------------------------------------------
+# Postgres
+# --------------------------------------------------
+
+def _pg_tool(name: str) -> str:
+    path = shutil.which(name)
+    if not path:
+        raise RuntimeError(f"{name} não encontrado no PATH (instale o cliente do Postgres na mesma versão do servidor)")
+    return path
+
+def backup_postgres(dest_dir: Path = BACKUP_DIR, log=None) -> Path:
+    out = _new_snapshot(dest_dir, ".dump")
+    part = out.with_suffix(".part")
+    started = time.perf_counter()
+    try:
+        subprocess.run([
+            _pg_tool("pg_dump"), "--format=custom", "--no-owner",
+            # não fica na fila atrás de um ALTER TABLE (e segurando as consultas que vêm depois)
+            "--lock-wait-timeout=30000",
+            f"--file={part}", f"--dbname={db.DATABASE_URL}",
+        ], check=True)
+        part.replace(out)
+    except BaseException:
+        part.unlink(missing_ok=True)
+        raise
+    _write_checksum(out, sha256_file(out))
+    if log:
+        log(f"{out.name}: {out.stat().st_size / 1024:.0f} KB em {time.perf_counter() - started:.1f}s")
+    return out
+
+def restore_postgres(path: Path, jobs: int = BACKUP_JOBS, log=None):
+    """pg_restore --clean em paralelo. Apaga e recria as tabelas do dump: pare o app antes."""
+    if log:
+        log(f"pg_restore com {jobs} job(s)…")
+    subprocess.run([
+        _pg_tool("pg_restore"), "--clean", "--if-exists", "--no-owner", "--exit-on-error",
+        f"--jobs={jobs}", f"--dbname={db.DATABASE_URL}", str(path),
+    ], check=True)
+
+
+# --------------------------------------------------
+# Snapshots
+# --------------------------------------------------
+
+def create_backup(log=None) -> Path:
+    """Snapshot novo do banco ativo + rotação."""
+    path = backup_postgres(log=log) if db.USE_POSTGRES else backup_sqlite(log=log)
+    for old in prune():
+        if log:
+            log(f"apagado: {old.name}")
+    return path
+
+def verify_backup(path: Path) -> tuple[bool, str]:
+    """Confere o sha256 e se o arquivo abre (integrity_check no SQLite, pg_restore --list no Postgres)."""
+    expected = _expected_checksum(path)
+    if expected is None:
+        return False, "sem .sha256"
+    if sha256_file(path) != expected:
+        return False, "checksum não confere"
+    if path.name.endswith(".db.gz"):
+        tmp = _gunzip_to_temp(path)
+        try:
+            check = _sqlite_integrity(tmp)
+        finally:
+            tmp.unlink(missing_ok=True)
+        return check == "ok", f"integrity_check: {check}"
+    result = subprocess.run([_pg_tool("pg_restore"), "--list", str(path)], capture_output=True, text=True)
+    if result.returncode != 0:
+        return False, f"pg_restore --list: {result.stderr.strip()}"
+    return True, "ok"
+
+def restore_backup(path: Path, log=None):
+    ok, detail = verify_backup(path)
+    if not ok:
+        raise RuntimeError(f"{path.name} não passou na verificação ({detail}); nada foi restaurado")
+    if path.name.endswith(".dump"):
+        if not db.USE_POSTGRES:
+            raise RuntimeError("snapshot do Postgres, mas o app está no SQLite (DATABASE_URL vazio)")
+        restore_postgres(path, log=log)
+    else:
+        if db.USE_POSTGRES:
+            raise RuntimeError("snapshot do SQLite, mas o app está no Postgres")
+        restore_sqlite(path, log=log)
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def _resolve(arg: str) -> Path:
+    path = Path(arg)
+    return path if path.exists() else BACKUP_DIR / arg
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "create"
+
+    if cmd == "create":
+        path = create_backup(log=print)
+        print(f"OK — {path}")
+    elif cmd == "list":
+        backups = list_backups()
+        for path in backups:
+            mark = "" if _checksum_path(path).exists() else "  (sem .sha256)"
+            print(f"{path.name}  {path.stat().st_size / 1024:>10.0f} KB{mark}")
+        print(f"{len(backups)} snapshot(s) em {BACKUP_DIR} (guardando {BACKUP_KEEP})")
+    elif cmd == "verify":
+        paths = [_resolve(a) for a in argv[1:]] or list_backups()
+        bad = 0
+        for path in paths:
+            ok, detail = verify_backup(path)
+            bad += not ok
+            print(f"{'OK  ' if ok else 'FALHOU'} {path.name}: {detail}")
+        return 1 if bad else 0
+    elif cmd == "restore" and len(argv) >= 2:
+        if "--yes" not in argv:
+            print("restore substitui os dados atuais; confirme com --yes")
+            return 2
+        path = _resolve(argv[1])
+        restore_backup(path, log=print)
+        print(f"OK — restaurado de {path.name}")
+    else:
+        print("uso: python -m utils.backup [create|list|verify [ARQUIVO...]|restore ARQUIVO --yes]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
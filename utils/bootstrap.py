@@ -1,13 +1,50 @@
+import uuid
+from contextlib import contextmanager
 import streamlit as st
-from utils.db import init_db, list_patients
+from utils import profiler
+from utils.db import search_patients, get_patient_labels, set_session_key
+from utils.debug_panel import debug_panel
+from utils.migrations import ensure_schema
 from utils.auth import is_logged_in, logout
 
-def bootstrap(show_patient_picker: bool = True, require_login: bool = True):
-    init_db()
+@contextmanager
+def page_run(page: str, show_patient_picker: bool = True, require_login: bool = True):
+    """
+    O corpo da página vai dentro do with:
+
+        with page_run("2_agenda", show_patient_picker=True):
+            ...
+
+    Roda o bootstrap e fecha o rastro do banco quando o script termina — também com
+    st.stop(), st.rerun(), switch_page ou exceção —, então o tempo do rerun não inclui
+    o tempo parado esperando o usuário.
+    """
+    try:
+        bootstrap(page, show_patient_picker, require_login)
+        yield
+    finally:
+        profiler.finish_rerun(profiler.current_trace())
+
+def bootstrap(page: str, show_patient_picker: bool = True, require_login: bool = True):
+    """Migrations, sessão, rastro do banco e sidebar. `page` identifica a página nas estatísticas."""
+    # só toca no banco na primeira chamada do processo (migrations)
+    ensure_schema()
 
     # Garantir chaves básicas (opcional, mas ok)
     if "patient_id" not in st.session_state:
         st.session_state.patient_id = None
+    if "db_session" not in st.session_state:
+        st.session_state.db_session = uuid.uuid4().hex
+
+    # com réplica de leitura: quem acabou de gravar lê do primário por alguns segundos.
+    # Logado, a chave é o usuário (vale para todas as abas dele)
+    user = st.session_state.get("user")
+    set_session_key(f'user:{user["id"]}' if user else st.session_state.db_session)
+
+    # rastro das consultas deste rerun (o page_run fecha no fim do script). Fica na sessão
+    # já aberto: depois de um st.stop() o que se grava no session_state se perde
+    last_trace = st.session_state.get("db_trace")
+    st.session_state.db_trace = profiler.start_rerun(page)
 
     st.sidebar.title("🥗 NutriApp")
 
@@ -21,6 +58,7 @@ def bootstrap(show_patient_picker: bool = True, require_login: bool = True):
     if is_logged_in():
         st.sidebar.caption(f'Logado como: {st.session_state["user"]["email"]}')
         st.sidebar.button("Sair", on_click=logout)
+        debug_panel(last_trace)
 
     # --------- Seletor de paciente ----------
     if not show_patient_picker:
@@ -32,23 +70,54 @@ def bootstrap(show_patient_picker: bool = True, require_login: bool = True):
         return
 
     user_id = st.session_state["user"]["id"]
-    patients = list_patients(user_id=user_id)
+    patient_picker(user_id)
+
 
-    if not patients:
-        st.sidebar.info("Nenhum paciente cadastrado ainda.")
+MRU_SIZE = 8
+
+def remember_patient(patient_id):
+    """Coloca o paciente no topo da lista de recentes da sessão."""
+    if not patient_id:
+        return
+    recent = [pid for pid in st.session_state.get("recent_patients", []) if pid != patient_id]
+    st.session_state.recent_patients = [patient_id] + recent[:MRU_SIZE - 1]
+
+def patient_picker(user_id):
+    """
+    Seletor da sidebar: busca no servidor (só os que batem com o texto) + recentes da sessão.
+    Nunca carrega a lista inteira de pacientes.
+    """
+    q = st.sidebar.text_input("Buscar paciente", key="patient_search", placeholder="Digite o nome...")
+    matches = search_patients(user_id, q, limit=20)
+
+    current = st.session_state.patient_id
+    recent_ids = list(st.session_state.get("recent_patients", []))
+    if current and current not in recent_ids:
+        recent_ids.insert(0, current)
+    recent = get_patient_labels(user_id, tuple(recent_ids))
+
+    if not matches and not recent:
+        if q:
+            st.sidebar.info("Nenhum paciente encontrado.")
+        else:
+            st.sidebar.info("Nenhum paciente cadastrado ainda.")
         st.session_state.patient_id = None
         return
 
-    options = {f'{p["nome"]} (ID {p["id"]})': p["id"] for p in patients}
+    # recentes primeiro (na ordem de uso), depois os resultados da busca
+    options = {}
+    for pid in recent_ids:
+        if pid in recent:
+            options[f"🕘 {recent[pid]} (ID {pid})"] = pid
+    for p in matches:
+        if p["id"] not in options.values():
+            options[f'{p["nome"]} (ID {p["id"]})'] = p["id"]
     labels = list(options.keys())
 
     default_idx = 0
-    if st.session_state.patient_id in options.values():
-        for i, lab in enumerate(labels):
-            if options[lab] == st.session_state.patient_id:
-                default_idx = i
-                break
+    if current in options.values():
+        default_idx = list(options.values()).index(current)
 
     chosen = st.sidebar.selectbox("Paciente selecionado", labels, index=default_idx)
     st.session_state.patient_id = options[chosen]
-
+    remember_patient(st.session_state.patient_id)
@@ -1,10 +1,25 @@
 import os
-import streamlit as st
+import sys
 import sqlite3
+import re
 import json
+import atexit
+import unicodedata
+import uuid
+import time
+import contextvars
+import inspect
+import functools
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
 from datetime import datetime
 
+from utils import profiler
+from utils.pool import PostgresPool, SQLiteThreadPool, SQLiteWriter
+from utils.queries import QueryRegistry, pg_connection_class
+
 SQLITE_PATH = Path("data") / "nutriapp.db"
 
 def normalize_db_url(url: str) -> str:
@@ -18,208 +33,359 @@ USE_POSTGRES = bool(RAW_DATABASE_URL)
 
 DATABASE_URL = normalize_db_url(RAW_DATABASE_URL) if RAW_DATABASE_URL else None
 
-def get_conn():
-    if USE_POSTGRES:
-        return get_postgres_conn()
-    else:
-        return get_sqlite_conn()
+# todas as consultas da aplicação (ver utils/queries.py)
+Q = QueryRegistry(postgres=USE_POSTGRES)
+if profiler.PROFILE_ENABLED:
+    # tempo por consulta/página, consultas lentas e repetidas (DB_PROFILE=0 desliga)
+    Q.observer = profiler.record
+
+# SQLITE_PROFILE=production: WAL + leitores somente leitura + um escritor único com lotes
+# (clínicas pequenas que rodam em SQLite com várias pessoas usando ao mesmo tempo)
+SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "default").strip().lower()
+SQLITE_PRODUCTION = not USE_POSTGRES and SQLITE_PROFILE == "production"
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "65536"))
+SQLITE_MMAP_MB = int(os.getenv("SQLITE_MMAP_MB", "256"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+
+# Réplica de leitura (opcional): get_conn(readonly=True) vai para ela, o resto para o primário.
+# DATABASE_READ_URL no Postgres; SQLITE_READ_PATH no SQLite (cópia do arquivo mantida por
+# fora — litestream, rsync, backup — ou só para simular a réplica em desenvolvimento).
+RAW_DATABASE_READ_URL = os.getenv("DATABASE_READ_URL")
+DATABASE_READ_URL = normalize_db_url(RAW_DATABASE_READ_URL) if USE_POSTGRES and RAW_DATABASE_READ_URL else None
+SQLITE_READ_PATH = Path(os.environ["SQLITE_READ_PATH"]) if not USE_POSTGRES and os.getenv("SQLITE_READ_PATH") else None
+USE_READ_REPLICA = bool(DATABASE_READ_URL or SQLITE_READ_PATH)
+# depois de gravar, a mesma sessão lê do primário por esse tempo (lê o que acabou de gravar
+# mesmo com a réplica atrasada)
+READ_STICKY_SECONDS = float(os.getenv("DB_READ_STICKY_SECONDS", "5"))
+
+# --------------------------------------------------
+# Conexões (pool)
+# --------------------------------------------------
+
+_pool = None
+_read_pool = None
+_writer = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Pool do processo (criado na primeira chamada). Tamanho/tempo de vida via DB_POOL_*."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                if USE_POSTGRES:
+                    _pool = PostgresPool(get_postgres_conn)
+                elif SQLITE_PRODUCTION:
+                    _pool = SQLiteThreadPool(lambda: get_sqlite_conn(readonly=True))
+                else:
+                    _pool = SQLiteThreadPool(get_sqlite_conn)
+    return _pool
+
+def get_read_pool():
+    """Pool da réplica de leitura (só com DATABASE_READ_URL / SQLITE_READ_PATH)."""
+    global _read_pool
+    if _read_pool is None:
+        with _pool_lock:
+            if _read_pool is None:
+                if USE_POSTGRES:
+                    _read_pool = PostgresPool(lambda: get_postgres_conn(DATABASE_READ_URL))
+                else:
+                    _read_pool = SQLiteThreadPool(lambda: get_sqlite_conn(readonly=True, path=SQLITE_READ_PATH))
+    return _read_pool
+
+def get_sqlite_writer() -> SQLiteWriter:
+    """Escritor único do perfil de produção do SQLite (ver utils/pool.py)."""
+    global _writer
+    if _writer is None:
+        with _pool_lock:
+            if _writer is None:
+                _writer = SQLiteWriter(get_sqlite_conn)
+    return _writer
+
+def close_pool():
+    global _pool, _read_pool, _writer
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+        if _read_pool is not None:
+            _read_pool.closeall()
+            _read_pool = None
+        if _writer is not None:
+            _writer.closeall()
+            _writer = None
+
+atexit.register(close_pool)
+
+def pool_stats() -> dict:
+    stats = get_pool().stats()
+    if _writer is not None:
+        stats["writer"] = _writer.stats()
+    if USE_READ_REPLICA:
+        stats["replica"] = dict(_read_pool.stats() if _read_pool is not None else {}, **_routing_stats)
+    return stats
+
+# ---------- roteamento leitura/escrita ----------
+
+_session_key = contextvars.ContextVar("db_session_key", default=None)
+_last_write = {}                 # chave da sessão -> monotonic() do último commit
+_last_write_lock = threading.Lock()
+_routing_stats = {"replica_reads": 0, "sticky_reads": 0, "replica_fallbacks": 0}
+
+def set_session_key(key):
+    """
+    Identifica quem está usando o banco neste contexto (o bootstrap passa o usuário ou a
+    sessão do Streamlit). Sem chave, vale a thread.
+    """
+    _session_key.set(key)
+
+def _current_session():
+    key = _session_key.get()
+    return key if key is not None else ("thread", threading.get_ident())
+
+def _mark_write():
+    if not USE_READ_REPLICA:
+        return
+    now = time.monotonic()
+    with _last_write_lock:
+        _last_write[_current_session()] = now
+        if len(_last_write) > 10_000:
+            for k, t in list(_last_write.items()):
+                if now - t > READ_STICKY_SECONDS:
+                    del _last_write[k]
+
+def _sticky_to_primary() -> bool:
+    with _last_write_lock:
+        t = _last_write.get(_current_session())
+    return t is not None and time.monotonic() - t < READ_STICKY_SECONDS
+
+@contextmanager
+def get_conn(readonly: bool = False, primary: bool = False):
+    """
+    Empresta uma conexão do pool:
+
+        with get_conn() as conn:
+            cur = conn.cursor()
+            ...
+
+    Commit automático no fim do bloco, rollback se der exceção.
+    Conexão que quebrou (rede caiu, etc.) é descartada em vez de voltar pro pool.
+
+    readonly=True marca blocos que só leem: no perfil de produção do SQLite eles usam
+    as conexões somente leitura e o resto passa pelo escritor único; com réplica
+    configurada vão para ela (a não ser que a sessão tenha gravado há pouco).
+    primary=True lê sempre do primário (migrations, diagnóstico).
+    Dentro de um `with transaction()` todo bloco usa a conexão da transação.
+    """
+    tx = _tx.get()
+    if tx is not None:
+        # dentro de db.transaction(): mesma conexão, sem commit próprio
+        if readonly:
+            yield tx.conn
+        else:
+            with tx.savepoint():
+                yield tx.conn
+        return
+
+    if readonly and USE_READ_REPLICA and not primary:
+        if _sticky_to_primary():
+            _routing_stats["sticky_reads"] += 1
+        else:
+            try:
+                pool = get_read_pool()
+                conn = pool.getconn()
+            except Exception:
+                # réplica fora do ar: lê do primário
+                _routing_stats["replica_fallbacks"] += 1
+            else:
+                _routing_stats["replica_reads"] += 1
+                with _lent(pool, conn) as conn:
+                    yield conn
+                return
+
+    if SQLITE_PRODUCTION and not readonly:
+        with get_sqlite_writer().connection() as conn:
+            yield conn
+        _mark_write()
+        return
+
+    pool = get_pool()
+    with _lent(pool, pool.getconn()) as conn:
+        yield conn
+    if not readonly:
+        _mark_write()
+
+@contextmanager
+def _lent(pool, conn):
+    # commit/rollback e devolve ao pool (descarta a conexão que quebrou)
+    discard = False
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except Exception:
+            discard = True
+        raise
+    finally:
+        pool.putconn(conn, discard=discard)
+
+# ---------- unidade de trabalho ----------
+
+_tx = contextvars.ContextVar("db_transaction", default=None)
+
+class Transaction:
+    """Transação aberta por db.transaction() (ver lá)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._savepoints = 0
+        self._hooks = []
+        self._finally = []        # depois do fim, confirmada ou não
+        self._invalidate = set()
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def on_commit(self, fn):
+        """Roda fn() depois do COMMIT (nada roda se a transação for desfeita)."""
+        self._hooks.append(fn)
+
+    @contextmanager
+    def savepoint(self):
+        """Bloco que pode falhar sozinho: exceção desfaz só o que ele gravou."""
+        self._savepoints += 1
+        name = f"tx_sp{self._savepoints}"
+        cur = self.conn.cursor()
+        cur.execute(f"SAVEPOINT {name}")
+        try:
+            yield self
+        except BaseException:
+            cur.execute(f"ROLLBACK TO SAVEPOINT {name}")
+            cur.execute(f"RELEASE SAVEPOINT {name}")
+            raise
+        cur.execute(f"RELEASE SAVEPOINT {name}")
+
+    def _run(self, hooks):
+        for fn in hooks:
+            try:
+                fn()
+            except Exception as e:
+                # a transação já terminou; hook com erro não desfaz nada
+                print(f"[db] hook da transação falhou: {e!r}", file=sys.stderr)
+
+    def _committed(self):
+        for user_id in self._invalidate:
+            _cache.bump(user_id)
+        self._run(self._hooks)
+
+@contextmanager
+def transaction():
+    """
+    Várias chamadas do db numa transação só — uma conexão, um COMMIT:
+
+        with transaction() as tx:
+            pid = create_patient(...)
+            log_event(uid, "patient_created", {"patient_id": pid})
+
+    - toda função do db chamada no bloco usa a mesma conexão; cada escrita roda num
+      SAVEPOINT, então uma que falhe (com a exceção tratada no bloco) desfaz só ela
+    - exceção saindo do bloco desfaz tudo
+    - leituras no bloco enxergam o que já foi gravado nele (e não passam pelo cache)
+    - invalidação do cache e log_event ficam para depois do COMMIT (tx.on_commit)
+    - o evento só entra no mesmo COMMIT com EVENT_LOG_ASYNC=0; no modo assíncrono
+      (padrão) o log_event só é enfileirado depois, e o COMMIT é só o da escrita
+    - transaction() dentro de outra vira um SAVEPOINT
+    - no perfil de produção do SQLite o bloco inteiro é um só empréstimo do escritor
+    """
+    outer = _tx.get()
+    if outer is not None:
+        with outer.savepoint():
+            yield outer
+        return
 
-def get_sqlite_conn():
-    SQLITE_PATH.parent.mkdir(exist_ok=True)
-    conn = sqlite3.connect(SQLITE_PATH, check_same_thread=False)
+    tx = None
+    try:
+        with get_conn() as conn:
+            if isinstance(conn, sqlite3.Connection) and not conn.in_transaction:
+                # sqlite3 só abre a transação no primeiro INSERT/UPDATE; sem isso o RELEASE
+                # do primeiro SAVEPOINT já faria COMMIT
+                conn.execute("BEGIN IMMEDIATE")
+            tx = Transaction(conn)
+            token = _tx.set(tx)
+            try:
+                yield tx
+            finally:
+                _tx.reset(token)
+        tx._committed()
+    finally:
+        if tx is not None:
+            tx._run(tx._finally)
+
+def in_transaction() -> bool:
+    return _tx.get() is not None
+
+def get_sqlite_conn(readonly: bool = False, path: Path | None = None):
+    """Conexão nova (sem pool). Use get_conn() no código da aplicação."""
+    path = path or SQLITE_PATH
+    path.parent.mkdir(exist_ok=True)
+    if readonly:
+        target, uri = f"{path.resolve().as_uri()}?mode=ro", True
+    else:
+        target, uri = path, False
+    conn = sqlite3.connect(
+        target,
+        uri=uri,
+        check_same_thread=False,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=Q.sqlite_cache_size(),
+    )
     conn.row_factory = sqlite3.Row
+    if SQLITE_PRODUCTION:
+        _tune_sqlite(conn, readonly)
     return conn
 
-def get_postgres_conn():
-    import psycopg2
-    from psycopg2.extras import RealDictCursor
+def _tune_sqlite(conn, readonly: bool):
+    if not readonly:
+        # WAL fica gravado no arquivo; leitores não bloqueiam o escritor nem o contrário
+        conn.execute("PRAGMA journal_mode = WAL")
+    # NORMAL no WAL: não corrompe, só pode perder os últimos commits se a máquina cair
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_MB * 1024 * 1024}")
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def get_postgres_conn(url: str | None = None):
+    """Conexão nova (sem pool). Use get_conn() no código da aplicação."""
+    psycopg2, RealDictCursor = _psycopg2()
     return psycopg2.connect(
-        DATABASE_URL,
+        url or DATABASE_URL,
         sslmode="require",
         cursor_factory=RealDictCursor,
+        connection_factory=pg_connection_class(),
     )
 
+_psycopg2_mod = None
+
+def _psycopg2():
+    # import uma vez só (psycopg2 nem precisa estar instalado no modo SQLite)
+    global _psycopg2_mod
+    if _psycopg2_mod is None:
+        import psycopg2
+        from psycopg2.extras import RealDictCursor
+        _psycopg2_mod = (psycopg2, RealDictCursor)
+    return _psycopg2_mod
+
 # --------------------------------------------------
 # Inicialização do banco
 # --------------------------------------------------
 
 def init_db():
-    conn = get_conn()
-    cur = conn.cursor()
-
-    # helper para migration simples
-    def _add_column_if_missing(table, column, coltype):
-        if USE_POSTGRES:
-            cur.execute("""
-                SELECT 1
-                FROM information_schema.columns
-                WHERE table_name = %s AND column_name = %s
-                LIMIT 1
-            """, (table, column))
-            exists = cur.fetchone() is not None
-            if not exists:
-                cur.execute(f'ALTER TABLE {table} ADD COLUMN {column} {coltype};')
-        else:
-            cur.execute(f"PRAGMA table_info({table})")
-            cols = [r[1] for r in cur.fetchall()]
-            if column not in cols:
-                cur.execute(f'ALTER TABLE {table} ADD COLUMN {column} {coltype};')
-
-    # tipos por banco
-    if USE_POSTGRES:
-        auto_id = "SERIAL PRIMARY KEY"
-        text = "TEXT"
-        real = "REAL"
-    else:
-        auto_id = "INTEGER PRIMARY KEY AUTOINCREMENT"
-        text = "TEXT"
-        real = "REAL"
-
-    # ---------- users (futuro login) ----------
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS users (
-        id {auto_id},
-        email {text} UNIQUE,
-        password_hash {text},
-        created_at {text}
-    );
-    """)
-
-    # ---------- patients ----------
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS patients (
-        id {auto_id},
-        user_id INTEGER,
-        nome {text} NOT NULL,
-        telefone {text},
-        email {text},
-        nascimento {text},
-        sexo {text},
-        obs {text}
-    );
-    """)
-
-    # ---------- appointments ----------
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS appointments (
-        id {auto_id},
-        user_id INTEGER,
-        patient_id INTEGER NOT NULL,
-        dt_iso {text} NOT NULL,
-        tipo {text},
-        notas {text}
-    );
-    """)
-
-    # ---------- assessments ----------
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS assessments (
-            id {auto_id},
-            user_id INTEGER,
-            patient_id INTEGER NOT NULL,
-            data_iso {text} NOT NULL,
-            peso {real},
-            altura_cm {real},
-            cintura_cm {real},
-            quadril_cm {real},
-            pescoco_cm {real},
-            bf_usnavy_pct {real},
-            objetivo {text},
-            atividade {text},
-            sono_h {real},
-            obs {text}
-        );
-        """)
-    
-    if USE_POSTGRES:
-        cur.execute("ALTER TABLE assessments ADD COLUMN IF NOT EXISTS pescoco_cm REAL;")
-        cur.execute("ALTER TABLE assessments ADD COLUMN IF NOT EXISTS bf_usnavy_pct REAL;")
-    else:
-        _add_column_if_missing("assessments", "pescoco_cm", "REAL")
-        _add_column_if_missing("assessments", "bf_usnavy_pct", "REAL")
-
-
-    # ---------- diets ----------
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS diets (
-        id {auto_id},
-        user_id INTEGER,
-        patient_id INTEGER NOT NULL,
-        data_iso {text} NOT NULL,
-        bmr {real},
-        tdee {real},
-        calorias_alvo {real},
-        meta {text},
-        p_gkg {real},
-        fat_pct {real},
-        proteina_g {real},
-        carbo_g {real},
-        gordura_g {real}
-    );
-    """)
-
-    # ---------- foods (TACO) ----------
-    cur.execute(f"""
-    CREATE TABLE IF NOT EXISTS foods (
-        id {auto_id},
-        nome {text} NOT NULL,
-        base_g {real} DEFAULT 100,
-        kcal {real},
-        proteina_g {real},
-        carbo_g {real},
-        gordura_g {real},
-        fibra_g {real},
-        sodio_mg {real}
-    );
-    """)
-
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS diet_items (
-            id {auto_id},
-            user_id INTEGER,
-            patient_id INTEGER NOT NULL,
-            diet_id INTEGER,
-            meal {text} NOT NULL,
-            food_id INTEGER NOT NULL,
-            grams {real} NOT NULL,
-            created_at {text}
-        );
-        """)
-    
-    # ---------- beta_allowlist (beta fechada) ----------
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS beta_allowlist (
-            id {auto_id},
-            email {text} UNIQUE NOT NULL,
-            created_at {text}
-        );
-        """)
-    
-    # ---------- feedback ----------
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS feedback (
-            id {auto_id},
-            user_id INTEGER,
-            page {text},
-            message {text} NOT NULL,
-            rating INTEGER,
-            created_at {text}
-        );
-        """)
-
-    # ---------- event_logs ----------
-    cur.execute(f"""
-        CREATE TABLE IF NOT EXISTS event_logs (
-            id {auto_id},
-            user_id INTEGER,
-            event_name {text} NOT NULL,
-            meta {text},
-            created_at {text}
-        );
-        """)
-
-    conn.commit()
-    conn.close()
+    """Aplica as migrations pendentes (ver utils/migrations.py)."""
+    from utils.migrations import migrate
+    migrate()
 
 # --------------------------------------------------
 # Helpers internos
@@ -243,23 +409,156 @@ def _scalar(row):
     # SQLite → tuple
     return row[0]
 
+# --------------------------------------------------
+# Cache de leitura (por usuário)
+# --------------------------------------------------
+# Cada rerun do Streamlit relê paciente/avaliação/dieta, mas esses dados só mudam
+# quando o próprio usuário grava. Então as leituras ficam em memória com chave
+# (função, user_id, versão do usuário, argumentos) e toda escrita sobe a versão
+# do usuário — as entradas antigas deixam de ser encontradas e saem pelo LRU.
+# O TTL cobre escrita feita por outro processo/réplica.
+
+CACHE_ENABLED = os.getenv("DB_CACHE", "1") != "0"
+CACHE_MAX_ENTRIES = int(os.getenv("DB_CACHE_MAX_ENTRIES", "2048"))
+CACHE_TTL = float(os.getenv("DB_CACHE_TTL", "60"))
+
+class _ReadCache:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()     # key -> (expira_em, valor)
+        self._versions = {}            # user_id -> int
+        self._generation = 0           # muda tudo (ex.: foods mudou → itens de dieta mudam)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0}
+
+    def key(self, name, user_id, args):
+        with self._lock:
+            return (name, user_id, self._generation, self._versions.get(user_id, 0), args)
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self._stats["misses"] += 1
+                return _MISS
+            if item[0] < time.monotonic():
+                del self._data[key]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return _MISS
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def bump(self, user_id=None):
+        with self._lock:
+            if user_id is None:
+                self._generation += 1
+            else:
+                self._versions[user_id] = self._versions.get(user_id, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self._stats["hits"] + self._stats["misses"]
+            return dict(
+                self._stats,
+                size=len(self._data),
+                hit_rate=(self._stats["hits"] / total) if total else 0.0,
+            )
+
+_MISS = object()
+_cache = _ReadCache(CACHE_MAX_ENTRIES, CACHE_TTL)
+
+def _copy(value):
+    # quem chama pode mexer no dict/lista devolvido sem estragar o cache
+    if isinstance(value, list):
+        return [_copy(v) for v in value]
+    if isinstance(value, dict):
+        return {k: _copy(v) for k, v in value.items()}
+    return value
+
+def _hashable(value):
+    # lista/set/dict nos argumentos (ex.: o que o st.multiselect devolve) viram chave de cache
+    if isinstance(value, (list, tuple)):
+        return tuple(_hashable(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted((_hashable(v) for v in value), key=repr))
+    if isinstance(value, dict):
+        return tuple(sorted(((k, _hashable(v)) for k, v in value.items()), key=repr))
+    return value
+
+def _cached(fn):
+    """Leitura por usuário com cache. Sem user_id a consulta vai direto ao banco."""
+    sig = inspect.signature(fn)
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        profiler.note_call(fn.__name__, args, kwargs)
+        if not CACHE_ENABLED or _tx.get() is not None:
+            # dentro de transação a leitura pode ver escrita ainda não confirmada
+            return fn(*args, **kwargs)
+        bound = sig.bind(*args, **kwargs)
+        bound.apply_defaults()
+        user_id = bound.arguments.get("user_id")
+        if user_id is None:
+            return fn(*args, **kwargs)
+
+        key = _cache.key(fn.__name__, user_id, _hashable(bound.arguments))
+        value = _cache.get(key)
+        if value is _MISS:
+            value = fn(*args, **kwargs)
+            _cache.put(key, value)
+        return _copy(value)
+
+    return wrapper
+
+def _invalidate_user(user_id):
+    """Chamar depois de toda escrita nos dados de um usuário (None = todos)."""
+    tx = _tx.get()
+    if tx is not None:
+        # antes do COMMIT outra sessão ainda lê (e guardaria no cache) o dado antigo
+        tx._invalidate.add(user_id)
+        return
+    _cache.bump(user_id)
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+def clear_cache():
+    _cache.clear()
+
+def query_stats() -> dict:
+    """{nome da consulta: {"calls": n, "prepares": n}} desde a subida do processo."""
+    return Q.stats()
+
+# --------------------------------------------------
+# Allowlist
+# --------------------------------------------------
+
+Q.define("allowlist.has", "SELECT 1 FROM beta_allowlist WHERE email = ? LIMIT 1")
+Q.define("allowlist.add", "INSERT INTO beta_allowlist (email, created_at) VALUES (?, ?) ON CONFLICT (email) DO NOTHING")
+
 def is_email_allowed(email: str) -> bool:
     email = (email or "").strip().lower()
     if not email:
         return False
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT 1 FROM beta_allowlist WHERE email = ? LIMIT 1"
-        if not USE_POSTGRES else
-        "SELECT 1 FROM beta_allowlist WHERE email = %s LIMIT 1",
-        (email,)
-    )
-
-    row = cur.fetchone()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "allowlist.has", (email,)).fetchone()
     return bool(row)
 
 def add_allowed_email(email: str):
@@ -267,432 +566,488 @@ def add_allowed_email(email: str):
     if not email:
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "INSERT OR IGNORE INTO beta_allowlist (email, created_at) VALUES (?, ?)"
-        if not USE_POSTGRES else
-        "INSERT INTO beta_allowlist (email, created_at) VALUES (%s, %s) ON CONFLICT (email) DO NOTHING",
-        (email, _now())
-    )
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "allowlist.add", (email, _now()))
 
 
 # --------------------------------------------------
 # Patients
 # --------------------------------------------------
 
+PATIENT_PAGE_COLS = "id, nome, telefone, email, nascimento, sexo"
+
+Q.define("patients.insert", """
+    INSERT INTO patients (user_id, nome, telefone, email, nascimento, sexo, obs)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""", returning="id")
+Q.define("patients.list", "SELECT * FROM patients WHERE user_id = ? ORDER BY nome")
+Q.define("patients.list_all", "SELECT * FROM patients ORDER BY nome")
+Q.define("patients.get", "SELECT * FROM patients WHERE id = ? AND user_id = ?")
+Q.define("patients.get_any_user", "SELECT * FROM patients WHERE id = ?")
+Q.define("patients.search", """
+    SELECT id, nome FROM patients
+    WHERE user_id = ? AND nome LIKE ? ESCAPE '\\'
+    ORDER BY nome, id
+    LIMIT ?
+""", pg="""
+    SELECT id, nome FROM patients
+    WHERE user_id = ? AND nome ILIKE ?
+    ORDER BY nome, id
+    LIMIT ?
+""")
+# lista de ids: JSON no SQLite, array no Postgres (um texto fixo, qualquer quantidade de ids)
+Q.define("patients.labels", """
+    SELECT id, nome FROM patients
+    WHERE user_id = ? AND id IN (SELECT value FROM json_each(?))
+""", pg="SELECT id, nome FROM patients WHERE user_id = ? AND id = ANY(?)")
+Q.define("patients.page_first", f"""
+    SELECT {PATIENT_PAGE_COLS} FROM patients
+    WHERE user_id = ?
+    ORDER BY nome, id
+    LIMIT ?
+""")
+Q.define("patients.page_after", f"""
+    SELECT {PATIENT_PAGE_COLS} FROM patients
+    WHERE user_id = ? AND (nome > ? OR (nome = ? AND id > ?))
+    ORDER BY nome, id
+    LIMIT ?
+""")
+Q.define("patients.count", "SELECT COUNT(*) FROM patients WHERE user_id = ?")
+Q.define("patients.update", """
+    UPDATE patients
+    SET nome = ?, telefone = ?, email = ?, nascimento = ?, sexo = ?, obs = ?
+    WHERE id = ? AND user_id = ?
+""")
+
 def create_patient(nome, telefone="", email="", nascimento="", sexo="", obs="", user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO patients (user_id, nome, telefone, email, nascimento, sexo, obs)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (user_id, nome, telefone, email, nascimento, sexo, obs))
-        pid = cur.fetchone()["id"]
-    else:
-        cur.execute("""
-            INSERT INTO patients (user_id, nome, telefone, email, nascimento, sexo, obs)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, nome, telefone, email, nascimento, sexo, obs))
-        pid = cur.lastrowid
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        pid = Q.insert(conn.cursor(), "patients.insert", (user_id, nome, telefone, email, nascimento, sexo, obs))
+
+    _invalidate_user(user_id)
     return pid
 
+@_cached
 def list_patients(user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if user_id:
-        cur.execute(
-            "SELECT * FROM patients WHERE user_id = ? ORDER BY nome"
-            if not USE_POSTGRES else
-            "SELECT * FROM patients WHERE user_id = %s ORDER BY nome",
-            (user_id,)
-        )
-    else:
-        cur.execute("SELECT * FROM patients ORDER BY nome")
-
-    rows = cur.fetchall()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if user_id:
+            Q.run(cur, "patients.list", (user_id,))
+        else:
+            Q.run(cur, "patients.list_all")
+        rows = cur.fetchall()
     return _dicts(rows)
 
+@_cached
 def get_patient(patient_id, user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if user_id is not None:
-        cur.execute(
-            "SELECT * FROM patients WHERE id = ? AND user_id = ?"
-            if not USE_POSTGRES else
-            "SELECT * FROM patients WHERE id = %s AND user_id = %s",
-            (patient_id, user_id)
-        )
-    else:
-        cur.execute(
-            "SELECT * FROM patients WHERE id = ?"
-            if not USE_POSTGRES else
-            "SELECT * FROM patients WHERE id = %s",
-            (patient_id,)
-        )
-
-    row = cur.fetchone()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if user_id is not None:
+            Q.run(cur, "patients.get", (patient_id, user_id))
+        else:
+            Q.run(cur, "patients.get_any_user", (patient_id,))
+        row = cur.fetchone()
     return dict(row) if row else None
 
+@_cached
+def search_patients(user_id, query: str = "", limit: int = 20):
+    """
+    Projeção leve (id, nome) para o seletor de paciente.
+    Sem texto devolve os primeiros `limit` por nome — custo constante, com 20 ou 20 mil pacientes.
+    """
+    q = (query or "").strip()
+    with get_conn(readonly=True) as conn:
+        cur = Q.run(conn.cursor(), "patients.search", (user_id, f"%{_like_escape(q)}%" if q else "%", limit))
+        rows = cur.fetchall()
+    return _dicts(rows)
+
+@_cached
+def get_patient_labels(user_id, patient_ids: tuple) -> dict:
+    """{id: nome} só dos ids pedidos (ex.: lista de recentes)."""
+    ids = [int(i) for i in patient_ids if i is not None]
+    if not ids:
+        return {}
+    with get_conn(readonly=True) as conn:
+        cur = Q.run(conn.cursor(), "patients.labels", (user_id, ids if USE_POSTGRES else json.dumps(ids)))
+        rows = cur.fetchall()
+    return {r["id"]: r["nome"] for r in _dicts(rows)}
+
+@_cached
+def list_patients_page(user_id, after: tuple | None = None, limit: int = 50):
+    """
+    Paginação por chave (nome, id): passe em `after` o (nome, id) da última linha da página anterior.
+    Não usa OFFSET, então a página 500 custa o mesmo que a primeira.
+    """
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if after is None:
+            Q.run(cur, "patients.page_first", (user_id, limit))
+        else:
+            after_nome, after_id = after
+            Q.run(cur, "patients.page_after", (user_id, after_nome, after_nome, after_id, limit))
+        rows = cur.fetchall()
+    return _dicts(rows)
+
+def count_patients(user_id) -> int:
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "patients.count", (user_id,)).fetchone()
+    return int(_scalar(row) or 0)
+
 # --------------------------------------------------
 # Assessments
 # --------------------------------------------------
 
+ASSESSMENT_FIELDS = (
+    "data_iso", "peso", "altura_cm", "cintura_cm", "quadril_cm", "pescoco_cm", "bf_usnavy_pct",
+    "objetivo", "atividade", "sono_h", "obs",
+)
+
+Q.define("assessments.insert", f"""
+    INSERT INTO assessments (user_id, patient_id, {', '.join(ASSESSMENT_FIELDS)})
+    VALUES ({', '.join(['?'] * (len(ASSESSMENT_FIELDS) + 2))})
+""", returning="id")
+Q.define("assessments.last", """
+    SELECT * FROM assessments
+    WHERE patient_id = ? AND user_id = ?
+    ORDER BY data_iso DESC, id DESC
+    LIMIT 1
+""")
+Q.define("assessments.last_any_user", """
+    SELECT * FROM assessments
+    WHERE patient_id = ?
+    ORDER BY data_iso DESC, id DESC
+    LIMIT 1
+""")
+
 def create_assessment(patient_id, payload: dict, user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO assessments (
-                user_id, patient_id, data_iso, peso, altura_cm, cintura_cm,
-                quadril_cm, pescoco_cm, bf_usnavy_pct,
-                objetivo, atividade, sono_h, obs
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            user_id,
-            patient_id,
-            payload.get("data_iso"),
-            payload.get("peso"),
-            payload.get("altura_cm"),
-            payload.get("cintura_cm"),
-            payload.get("quadril_cm"),
-            payload.get("pescoco_cm"),
-            payload.get("bf_usnavy_pct"),
-            payload.get("objetivo"),
-            payload.get("atividade"),
-            payload.get("sono_h"),
-            payload.get("obs"),
-        ))
-        new_id = cur.fetchone()["id"]
-    else:
-        cur.execute("""
-            INSERT INTO assessments (
-                user_id, patient_id, data_iso, peso, altura_cm, cintura_cm,
-                quadril_cm, pescoco_cm, bf_usnavy_pct,
-                objetivo, atividade, sono_h, obs
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            patient_id,
-            payload.get("data_iso"),
-            payload.get("peso"),
-            payload.get("altura_cm"),
-            payload.get("cintura_cm"),
-            payload.get("quadril_cm"),
-            payload.get("pescoco_cm"),
-            payload.get("bf_usnavy_pct"),
-            payload.get("objetivo"),
-            payload.get("atividade"),
-            payload.get("sono_h"),
-            payload.get("obs"),
-        ))
-        new_id = cur.lastrowid
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        new_id = Q.insert(
+            conn.cursor(), "assessments.insert",
+            (user_id, patient_id, *(payload.get(f) for f in ASSESSMENT_FIELDS))
+        )
+
+    _invalidate_user(user_id)
     return new_id
 
+@_cached
 def get_last_assessment(patient_id, user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if user_id is not None:
-        cur.execute("""
-            SELECT * FROM assessments
-            WHERE patient_id = ? AND user_id = ?
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """ if not USE_POSTGRES else """
-            SELECT * FROM assessments
-            WHERE patient_id = %s AND user_id = %s
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """, (patient_id, user_id))
-    else:
-        cur.execute("""
-            SELECT * FROM assessments
-            WHERE patient_id = ?
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """ if not USE_POSTGRES else """
-            SELECT * FROM assessments
-            WHERE patient_id = %s
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """, (patient_id,))
-
-    row = cur.fetchone()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if user_id is not None:
+            Q.run(cur, "assessments.last", (patient_id, user_id))
+        else:
+            Q.run(cur, "assessments.last_any_user", (patient_id,))
+        row = cur.fetchone()
     return dict(row) if row else None
 
+# ---------- séries para gráfico ----------
+# Tudo filtra por paciente + intervalo de data_iso, que cai no mesmo índice do
+# assessments.last (idx_assessments_patient_user_data). Estatísticas saem do SQL;
+# a série só vem inteira quando cabe em max_points ou quando o LTTB precisa dela.
+
+SERIES_METRICS = ("peso", "altura_cm", "cintura_cm", "quadril_cm", "pescoco_cm", "bf_usnavy_pct", "sono_h")
+SERIES_METHODS = ("lttb", "avg")
+
+for _suffix, _where in (("", "patient_id = ? AND user_id = ?"), ("_any_user", "patient_id = ?")):
+    _where += " AND data_iso >= ? AND data_iso <= ?"
+    Q.define(f"assessments.series_stats{_suffix}", f"""
+        SELECT COUNT(*) AS n,
+               {', '.join(f'COUNT({m}) AS {m}_n, MIN({m}) AS {m}_min, MAX({m}) AS {m}_max, AVG({m}) AS {m}_avg'
+                          for m in SERIES_METRICS)}
+        FROM assessments
+        WHERE {_where}
+    """)
+    Q.define(f"assessments.series_rows{_suffix}", f"""
+        SELECT data_iso, {', '.join(SERIES_METRICS)}
+        FROM assessments
+        WHERE {_where}
+        ORDER BY data_iso, id
+    """)
+    # NTILE divide as linhas (em ordem) em ? faixas do mesmo tamanho; sai uma linha por faixa
+    Q.define(f"assessments.series_buckets{_suffix}", f"""
+        SELECT MIN(data_iso) AS data_iso, COUNT(*) AS n,
+               {', '.join(f'AVG({m}) AS {m}' for m in SERIES_METRICS)}
+        FROM (
+            SELECT data_iso, {', '.join(SERIES_METRICS)},
+                   NTILE(?) OVER (ORDER BY data_iso, id) AS bucket
+            FROM assessments
+            WHERE {_where}
+        ) t
+        GROUP BY bucket
+        ORDER BY bucket
+    """)
+
+def _num(value):
+    # AVG no Postgres vem Decimal/float; no SQLite float
+    return None if value is None else float(value)
+
+def _day_number(data_iso: str) -> int:
+    return datetime.fromisoformat(str(data_iso)[:10]).toordinal()
+
+@_cached
+def list_assessments_series(patient_id, metrics=("peso", "cintura_cm", "bf_usnavy_pct"),
+                            date_from=None, date_to=None, max_points: int = 200,
+                            method: str = "lttb", user_id=None) -> dict:
+    """
+    Evolução das medidas do paciente entre date_from e date_to (ISO, inclusivos).
+
+    Devolve {"n", "method", "series": {métrica: [{"data_iso", "value"}]}, "stats": {...}}.
+    Com mais de max_points avaliações a série é reduzida:
+      - "lttb": lê as linhas do intervalo e escolhe até max_points por métrica (mantém picos);
+      - "avg": média por faixa calculada no banco (só max_points linhas saem do SQL).
+    O "method" devolvido é "raw" quando não precisou reduzir.
+    """
+    metrics = tuple(metrics)
+    unknown = [m for m in metrics if m not in SERIES_METRICS]
+    if unknown:
+        raise ValueError(f"Métrica desconhecida: {', '.join(unknown)}")
+    if method not in SERIES_METHODS:
+        raise ValueError(f"method deve ser um de {SERIES_METHODS}")
+    max_points = max(3, int(max_points))
+
+    suffix = "" if user_id is not None else "_any_user"
+    params = (patient_id, user_id) if user_id is not None else (patient_id,)
+    params += (date_from or "", date_to or "9999-12-31")
+
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        stats_row = dict(Q.run(cur, f"assessments.series_stats{suffix}", params).fetchone())
+        n = int(stats_row["n"] or 0)
+        used = "raw" if n <= max_points else method
+        if used == "avg":
+            rows = _dicts(Q.run(cur, f"assessments.series_buckets{suffix}", (max_points, *params)).fetchall())
+        else:
+            rows = _dicts(Q.run(cur, f"assessments.series_rows{suffix}", params).fetchall()) if n else []
+
+    series = {}
+    for m in metrics:
+        points = [(r["data_iso"], _num(r[m])) for r in rows if r[m] is not None]
+        if used == "lttb" and len(points) > max_points:
+            from utils.downsample import lttb
+            keep = lttb([_day_number(d) for d, _ in points], [v for _, v in points], max_points)
+            points = [points[i] for i in keep]
+        series[m] = [{"data_iso": d, "value": v} for d, v in points]
+
+    stats = {}
+    for m in metrics:
+        pts = series[m]
+        first = pts[0]["value"] if pts else None
+        last = pts[-1]["value"] if pts else None
+        stats[m] = {
+            "n": int(stats_row[f"{m}_n"] or 0),
+            "min": _num(stats_row[f"{m}_min"]),
+            "max": _num(stats_row[f"{m}_max"]),
+            "avg": _num(stats_row[f"{m}_avg"]),
+            # com "avg" as pontas são médias da primeira/última faixa
+            "first": first,
+            "last": last,
+            "change": (last - first) if pts else None,
+        }
+
+    return {"n": n, "method": used, "series": series, "stats": stats}
+
 # --------------------------------------------------
 # Diets
 # --------------------------------------------------
 
+DIET_FIELDS = (
+    "data_iso", "bmr", "tdee", "calorias_alvo", "meta", "p_gkg", "fat_pct",
+    "proteina_g", "carbo_g", "gordura_g",
+)
+
+Q.define("diets.insert", f"""
+    INSERT INTO diets (user_id, patient_id, {', '.join(DIET_FIELDS)})
+    VALUES ({', '.join(['?'] * (len(DIET_FIELDS) + 2))})
+""", returning="id")
+Q.define("diets.last", """
+    SELECT * FROM diets
+    WHERE patient_id = ? AND user_id = ?
+    ORDER BY data_iso DESC, id DESC
+    LIMIT 1
+""")
+Q.define("diets.last_any_user", """
+    SELECT * FROM diets
+    WHERE patient_id = ?
+    ORDER BY data_iso DESC, id DESC
+    LIMIT 1
+""")
+
 def create_diet(patient_id, payload: dict, user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO diets (
-                user_id, patient_id, data_iso, bmr, tdee, calorias_alvo,
-                meta, p_gkg, fat_pct, proteina_g, carbo_g, gordura_g
-            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (
-            user_id,
-            patient_id,
-            payload.get("data_iso"),
-            payload.get("bmr"),
-            payload.get("tdee"),
-            payload.get("calorias_alvo"),
-            payload.get("meta"),
-            payload.get("p_gkg"),
-            payload.get("fat_pct"),
-            payload.get("proteina_g"),
-            payload.get("carbo_g"),
-            payload.get("gordura_g"),
-        ))
-        new_id = cur.fetchone()["id"]
-    else:
-        cur.execute("""
-            INSERT INTO diets (
-                user_id, patient_id, data_iso, bmr, tdee, calorias_alvo,
-                meta, p_gkg, fat_pct, proteina_g, carbo_g, gordura_g
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            user_id,
-            patient_id,
-            payload.get("data_iso"),
-            payload.get("bmr"),
-            payload.get("tdee"),
-            payload.get("calorias_alvo"),
-            payload.get("meta"),
-            payload.get("p_gkg"),
-            payload.get("fat_pct"),
-            payload.get("proteina_g"),
-            payload.get("carbo_g"),
-            payload.get("gordura_g"),
-        ))
-        new_id = cur.lastrowid
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        new_id = Q.insert(
+            conn.cursor(), "diets.insert",
+            (user_id, patient_id, *(payload.get(f) for f in DIET_FIELDS))
+        )
+
+    _invalidate_user(user_id)
     return new_id
 
+@_cached
 def get_last_diet(patient_id, user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if user_id is not None:
-        cur.execute("""
-            SELECT * FROM diets
-            WHERE patient_id = ? AND user_id = ?
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """ if not USE_POSTGRES else """
-            SELECT * FROM diets
-            WHERE patient_id = %s AND user_id = %s
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """, (patient_id, user_id))
-    else:
-        cur.execute("""
-            SELECT * FROM diets
-            WHERE patient_id = ?
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """ if not USE_POSTGRES else """
-            SELECT * FROM diets
-            WHERE patient_id = %s
-            ORDER BY data_iso DESC, id DESC
-            LIMIT 1
-        """, (patient_id,))
-
-    row = cur.fetchone()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if user_id is not None:
+            Q.run(cur, "diets.last", (patient_id, user_id))
+        else:
+            Q.run(cur, "diets.last_any_user", (patient_id,))
+        row = cur.fetchone()
     return dict(row) if row else None
 
+# --------------------------------------------------
+# Users
+# --------------------------------------------------
+
+Q.define("users.by_email", "SELECT * FROM users WHERE email = ?")
+Q.define("users.insert", "INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?)", returning="id")
+
 def get_user_by_email(email: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM users WHERE email = ?"
-        if not USE_POSTGRES else
-        "SELECT * FROM users WHERE email = %s",
-        (email.strip().lower(),)
-    )
-    row = cur.fetchone()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "users.by_email", (email.strip().lower(),)).fetchone()
     return dict(row) if row else None
 
 def create_user(email: str, password_hash: str):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (email, password_hash, created_at) VALUES (?, ?, ?)"
-        if not USE_POSTGRES else
-        "INSERT INTO users (email, password_hash, created_at) VALUES (%s, %s, %s) RETURNING id",
-        (email.strip().lower(), password_hash, _now())
-    )
-
-    user_id = None
-    if USE_POSTGRES:
-        user_id = cur.fetchone()["id"]
-    else:
-        user_id = cur.lastrowid
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        user_id = Q.insert(conn.cursor(), "users.insert", (email.strip().lower(), password_hash, _now()))
     return user_id
 
 # --------------------------------------------------
 # Appointments (Agenda)
 # --------------------------------------------------
 
+_APPOINTMENTS_SELECT = """
+    SELECT a.*, p.nome AS patient_nome
+    FROM appointments a
+    JOIN patients p ON p.id = a.patient_id
+"""
+
+Q.define("appointments.insert", """
+    INSERT INTO appointments (user_id, patient_id, dt_iso, tipo, notas)
+    VALUES (?, ?, ?, ?, ?)
+""")
+Q.define("appointments.list", _APPOINTMENTS_SELECT + "WHERE a.user_id = ? ORDER BY a.dt_iso")
+Q.define("appointments.list_all", _APPOINTMENTS_SELECT + "ORDER BY a.dt_iso")
+Q.define("appointments.range", _APPOINTMENTS_SELECT + """
+    WHERE a.user_id = ? AND a.dt_iso >= ? AND a.dt_iso < ?
+    ORDER BY a.dt_iso
+""")
+Q.define("appointments.upcoming", _APPOINTMENTS_SELECT + """
+    WHERE a.user_id = ? AND a.dt_iso >= ?
+    ORDER BY a.dt_iso
+    LIMIT ?
+""")
+# NULL = campo não muda (um texto só em vez de montar o SET na hora)
+Q.define("appointments.update", """
+    UPDATE appointments
+    SET patient_id = COALESCE(?, patient_id),
+        dt_iso = COALESCE(?, dt_iso),
+        tipo = COALESCE(?, tipo),
+        notas = COALESCE(?, notas)
+    WHERE id = ? AND user_id = ?
+""")
+Q.define("appointments.delete", "DELETE FROM appointments WHERE id = ? AND user_id = ?")
+
 def create_appointment(patient_id, dt_iso, tipo="", notas="", user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute("""
-        INSERT INTO appointments (
-            user_id, patient_id, dt_iso, tipo, notas
-        ) VALUES (?, ?, ?, ?, ?)
-    """ if not USE_POSTGRES else """
-        INSERT INTO appointments (
-            user_id, patient_id, dt_iso, tipo, notas
-        ) VALUES (%s, %s, %s, %s, %s)
-    """, (
-        user_id,
-        patient_id,
-        dt_iso,
-        tipo,
-        notas,
-    ))
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "appointments.insert", (user_id, patient_id, dt_iso, tipo, notas))
+
+    _invalidate_user(user_id)
+
 
 def list_appointments(user_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if user_id:
-        cur.execute("""
-            SELECT a.*, p.nome AS patient_nome
-            FROM appointments a
-            JOIN patients p ON p.id = a.patient_id
-            WHERE a.user_id = ?
-            ORDER BY a.dt_iso
-        """ if not USE_POSTGRES else """
-            SELECT a.*, p.nome AS patient_nome
-            FROM appointments a
-            JOIN patients p ON p.id = a.patient_id
-            WHERE a.user_id = %s
-            ORDER BY a.dt_iso
-        """, (user_id,))
-    else:
-        cur.execute("""
-            SELECT a.*, p.nome AS patient_nome
-            FROM appointments a
-            JOIN patients p ON p.id = a.patient_id
-            ORDER BY a.dt_iso
-        """)
-
-    rows = cur.fetchall()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if user_id:
+            Q.run(cur, "appointments.list", (user_id,))
+        else:
+            Q.run(cur, "appointments.list_all")
+        rows = cur.fetchall()
     return [dict(r) for r in rows]
 
+@_cached
+def list_appointments_range(user_id, start_iso: str, end_iso: str):
+    """
+    Agendamentos do usuário com start_iso <= dt_iso < end_iso (janela do dia/semana/mês).
+    Usa o índice (user_id, dt_iso).
+    """
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "appointments.range", (user_id, start_iso, end_iso)).fetchall()
+    return _dicts(rows)
+
+def list_upcoming_appointments(user_id, limit: int = 10, now_iso: str | None = None):
+    """Próximos `limit` agendamentos a partir de agora."""
+    now_iso = now_iso or datetime.now().isoformat(timespec="minutes")
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "appointments.upcoming", (user_id, now_iso, limit)).fetchall()
+    return _dicts(rows)
+
 def update_appointment(appointment_id, user_id, patient_id=None, dt_iso=None, tipo=None, notas=None):
     """
     Atualiza campos do agendamento. Passe apenas o que quiser mudar.
     """
-    sets = []
-    params = []
-
-    def add(field, value):
-        sets.append(f"{field} = " + ("?" if not USE_POSTGRES else "%s"))
-        params.append(value)
-
-    if patient_id is not None:
-        add("patient_id", patient_id)
-    if dt_iso is not None:
-        add("dt_iso", dt_iso)
-    if tipo is not None:
-        add("tipo", tipo)
-    if notas is not None:
-        add("notas", notas)
-
-    if not sets:
+    if patient_id is None and dt_iso is None and tipo is None and notas is None:
         return
 
-    params.extend([appointment_id, user_id])
-
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        f"UPDATE appointments SET {', '.join(sets)} WHERE id = "
-        + ("?" if not USE_POSTGRES else "%s")
-        + " AND user_id = "
-        + ("?" if not USE_POSTGRES else "%s"),
-        tuple(params)
-    )
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "appointments.update", (patient_id, dt_iso, tipo, notas, appointment_id, user_id))
 
-    conn.commit()
-    conn.close()
+    _invalidate_user(user_id)
 
 
 def delete_appointment(appointment_id, user_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM appointments WHERE id = ? AND user_id = ?"
-        if not USE_POSTGRES else
-        "DELETE FROM appointments WHERE id = %s AND user_id = %s",
-        (appointment_id, user_id)
-    )
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "appointments.delete", (appointment_id, user_id))
+
+    _invalidate_user(user_id)
 
 
 # --------------------------------------------------
 # Foods (TACO)
 # --------------------------------------------------
 
-def upsert_foods(rows: list[dict]):
+FOOD_FIELDS = ("nome", "base_g", "kcal", "proteina_g", "carbo_g", "gordura_g", "fibra_g", "sodio_mg")
+UPSERT_CHUNK = 500
+
+_food_cols = ", ".join(FOOD_FIELDS + ("nome_key",))
+_food_updates = ", ".join(f"{c} = excluded.{c}" for c in FOOD_FIELDS)
+# no Postgres o VALUES vira um ? só, que o execute_values expande
+Q.define(
+    "foods.upsert",
+    f"INSERT INTO foods ({_food_cols}) VALUES ({', '.join(['?'] * (len(FOOD_FIELDS) + 1))}) "
+    f"ON CONFLICT (nome_key) DO UPDATE SET {_food_updates}",
+    pg=f"INSERT INTO foods ({_food_cols}) VALUES ? ON CONFLICT (nome_key) DO UPDATE SET {_food_updates}",
+)
+Q.define("foods.snapshot", f"SELECT nome_key, {', '.join(FOOD_FIELDS)} FROM foods")
+Q.define("foods.all", "SELECT * FROM foods ORDER BY id")
+Q.define("foods.count", "SELECT COUNT(*) FROM foods")
+Q.define("foods.get", "SELECT * FROM foods WHERE id = ?")
+Q.define("foods.clear", "DELETE FROM foods")
+Q.define("meta.set", "INSERT INTO app_meta (key, value) VALUES (?, ?) ON CONFLICT (key) DO UPDATE SET value = excluded.value")
+Q.define("meta.get", "SELECT value FROM app_meta WHERE key = ?")
+
+def food_key(nome: str) -> str:
+    """Chave única do alimento: "Feijão,  carioca (cru)" e "feijao carioca cru" são o mesmo."""
+    return " ".join(re.findall(r"\w+", fold_text(nome)))
+
+def upsert_foods(rows: list[dict]) -> dict:
     """
-    Insere alimentos. Se quiser impedir duplicados por nome, a gente melhora depois com UNIQUE + upsert.
+    Importa alimentos de verdade (insere os novos, atualiza os que mudaram, ignora os iguais).
+    Alimento é identificado por food_key(nome), então reimportar a TACO não duplica nada.
     rows: [{"nome": ..., "kcal": ..., "proteina_g": ...}, ...]
+    Retorna {"inserted": n, "updated": n, "unchanged": n, "skipped": n}.
     """
-    conn = get_conn()
-    cur = conn.cursor()
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
 
+    # normaliza a entrada; se o arquivo repetir um alimento, a última linha vence
+    incoming = {}
     for r in rows:
         nome = (r.get("nome") or "").strip()
-        if not nome:
+        key = food_key(nome)
+        if not key:
+            stats["skipped"] += 1
             continue
-
-        params = (
+        base_g = r.get("base_g")
+        incoming[key] = (
             nome,
-            r.get("base_g", 100.0),
+            float(base_g) if base_g is not None else 100.0,
             r.get("kcal"),
             r.get("proteina_g"),
             r.get("carbo_g"),
@@ -701,164 +1056,422 @@ def upsert_foods(rows: list[dict]):
             r.get("sodio_mg"),
         )
 
-        cur.execute("""
-            INSERT INTO foods (nome, base_g, kcal, proteina_g, carbo_g, gordura_g, fibra_g, sodio_mg)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """ if not USE_POSTGRES else """
-            INSERT INTO foods (nome, base_g, kcal, proteina_g, carbo_g, gordura_g, fibra_g, sodio_mg)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-        """, params)
-
-    conn.commit()
-    conn.close()
+    # primário: a réplica atrasada faria reinserir/contar errado o que acabou de ser importado
+    with get_conn(readonly=True, primary=True) as conn:
+        existing = {}
+        for r in Q.run(conn.cursor(), "foods.snapshot").fetchall():
+            r = dict(r)
+            existing[r["nome_key"]] = tuple(r[c] for c in FOOD_FIELDS)
+
+    to_write = []
+    for key, values in incoming.items():
+        current = existing.get(key)
+        if current is None:
+            stats["inserted"] += 1
+        elif current != values:
+            stats["updated"] += 1
+        else:
+            stats["unchanged"] += 1
+            continue
+        to_write.append(values + (key,))
+
+    if not to_write:
+        return stats
+
+    written = 0
+    try:
+        for start in range(0, len(to_write), UPSERT_CHUNK):
+            chunk = to_write[start:start + UPSERT_CHUNK]
+            # uma transação por bloco: import grande não segura o lock do banco inteiro de uma vez
+            with get_conn() as conn:
+                cur = conn.cursor()
+                Q.run_many(cur, "foods.upsert", chunk)
+                # carimbo junto de cada bloco: se um bloco seguinte falhar, o catálogo
+                # ainda recarrega o que já foi confirmado
+                _bump_foods_version(cur)
+            written += len(chunk)
+    finally:
+        if written:
+            if stats["updated"]:
+                # valores de alimentos já usados em dietas mudaram
+                rebuild_diet_totals()
+            # itens de dieta em cache trazem dados do alimento
+            _invalidate_user(None)
+    return stats
+
+def _bump_foods_version(cur):
+    # muda o carimbo que o FoodCatalog (utils/food_catalog.py) observa
+    Q.run(cur, "meta.set", ("foods_version", uuid.uuid4().hex))
+
+def get_foods_version() -> str | None:
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "meta.get", ("foods_version",)).fetchone()
+    return _scalar(row)
+
+def list_all_foods():
+    """Tabela foods inteira (é pequena e global) — usada para montar o FoodCatalog."""
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "foods.all").fetchall()
+    return _dicts(rows)
 
 def count_foods():
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("SELECT COUNT(*) FROM foods")
-    row = cur.fetchone()
-    n = _scalar(row)
-    conn.close()
-    return int(n)
+    with get_conn(readonly=True) as conn:
+        row = Q.run(conn.cursor(), "foods.count").fetchone()
+    return int(_scalar(row))
+
+def fold_text(text: str) -> str:
+    """Minúsculo e sem acento ("Feijão" -> "feijao"), para busca e comparação de nomes."""
+    text = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower().strip()
+
+def _like_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+# busca: cada banco tem a sua consulta (só a do dialeto ativo chega a rodar)
+Q.define("foods.search_trgm", """
+    SELECT * FROM foods
+    WHERE nutri_unaccent(nome) LIKE ?
+       OR nutri_unaccent(?) <% nutri_unaccent(nome)
+    ORDER BY
+        (nutri_unaccent(nome) LIKE ?) DESC,
+        word_similarity(nutri_unaccent(?), nutri_unaccent(nome)) DESC,
+        length(nome), nome
+    LIMIT ?
+""")
+Q.define("foods.search_fts", """
+    SELECT f.* FROM foods_fts
+    JOIN foods f ON f.id = foods_fts.rowid
+    WHERE foods_fts MATCH ?
+    ORDER BY bm25(foods_fts), length(f.nome), f.nome
+    LIMIT ?
+""")
+Q.define("foods.search_like", "SELECT * FROM foods WHERE nome LIKE ? ORDER BY nome LIMIT ?")
+Q.define("foods.search_ilike", "SELECT * FROM foods WHERE nome ILIKE ? ORDER BY length(nome), nome LIMIT ?")
+Q.define("meta.fts_exists", "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'foods_fts'")
+Q.define("meta.trgm_exists", """
+    SELECT 1 FROM pg_extension
+    WHERE extname = 'pg_trgm'
+      AND EXISTS (SELECT 1 FROM pg_proc WHERE proname = 'nutri_unaccent')
+""")
+
+_sqlite_has_fts = None
+_pg_has_trgm = None
+
+def _foods_fts_available(cur) -> bool:
+    # foods_fts é criada pela migration 3; SQLite sem FTS5 compilado fica sem ela
+    global _sqlite_has_fts
+    if _sqlite_has_fts is None:
+        _sqlite_has_fts = Q.run(cur, "meta.fts_exists").fetchone() is not None
+    return _sqlite_has_fts
+
+def _foods_trgm_available(cur) -> bool:
+    # pg_trgm/unaccent vêm da migration 3; sem permissão de CREATE EXTENSION ficam de fora
+    global _pg_has_trgm
+    if _pg_has_trgm is None:
+        _pg_has_trgm = Q.run(cur, "meta.trgm_exists").fetchone() is not None
+    return _pg_has_trgm
 
 def search_foods(query: str, limit: int = 50):
+    """
+    Busca por relevância, sem diferenciar acento/maiúscula ("feijao" acha "Feijão").
+    - SQLite: FTS5 (foods_fts), cada palavra vira prefixo: "arr int" acha "Arroz integral"
+    - Postgres: pg_trgm + unaccent (índice GIN em nutri_unaccent(nome))
+    Sem FTS5 / pg_trgm cai no LIKE / ILIKE (sem ranking nem acento).
+    As páginas buscam no catálogo em memória (utils/food_catalog.py); esta fica como o
+    caminho em SQL (db_async, bench, scripts) e não é chamada pelo app.
+    """
     q = (query or "").strip()
     if not q:
         return []
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT * FROM foods WHERE nome LIKE ? ORDER BY nome LIMIT ?"
-        if not USE_POSTGRES else
-        "SELECT * FROM foods WHERE nome ILIKE %s ORDER BY nome LIMIT %s",
-        (f"%{q}%", limit)
-    )
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
 
-    rows = cur.fetchall()
-    conn.close()
+        if USE_POSTGRES and _foods_trgm_available(cur):
+            folded = _like_escape(fold_text(q))
+            Q.run(cur, "foods.search_trgm", (f"%{folded}%", q, f"{folded}%", q, limit))
+        elif USE_POSTGRES:
+            Q.run(cur, "foods.search_ilike", (f"%{_like_escape(q)}%", limit))
+        elif _foods_fts_available(cur):
+            terms = re.findall(r"\w+", fold_text(q))
+            if not terms:
+                return []
+            match = " ".join(f'"{t}"*' for t in terms)
+            Q.run(cur, "foods.search_fts", (match, limit))
+        else:
+            Q.run(cur, "foods.search_like", (f"%{q}%", limit))
+
+        rows = cur.fetchall()
     return [dict(r) for r in rows]
 
 def get_food(food_id: int):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT * FROM foods WHERE id = ?"
-        if not USE_POSTGRES else
-        "SELECT * FROM foods WHERE id = %s",
-        (food_id,)
-    )
-    row = cur.fetchone()
-    conn.close()
-    return dict(row) if row else None
+    # do catálogo em memória (mesmo dado, sem ida ao banco); import aqui: ele importa o db
+    from utils.food_catalog import get_catalog
+    return get_catalog().get_food(food_id)
 
 def clear_foods():
     """Usado caso você queira reimportar do zero."""
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM foods")
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        Q.run(cur, "foods.clear")
+        rebuild_diet_totals(cur)
+        _bump_foods_version(cur)
+
+    _invalidate_user(None)
 
 # --------------------------------------------------
 # Diet Items (Montagem de refeições)
 # --------------------------------------------------
 
+_DIET_ITEMS_SELECT = """
+    SELECT di.id, di.meal, di.grams, di.food_id,
+           f.nome, f.base_g, f.kcal, f.proteina_g, f.carbo_g, f.gordura_g, f.fibra_g, f.sodio_mg
+    FROM diet_items di
+    JOIN foods f ON f.id = di.food_id
+"""
+
+Q.define("diet_items.insert", """
+    INSERT INTO diet_items (user_id, patient_id, diet_id, meal, food_id, grams, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+""", returning="id")
+Q.define("diet_items.list_by_diet", _DIET_ITEMS_SELECT + """
+    WHERE di.user_id = ? AND di.patient_id = ? AND di.diet_id = ?
+    ORDER BY di.meal, di.id
+""")
+Q.define("diet_items.list", _DIET_ITEMS_SELECT + """
+    WHERE di.user_id = ? AND di.patient_id = ?
+    ORDER BY di.meal, di.id
+""")
+# mesmo filtro do diet_totals.apply_item (item antigo sem user_id conta como 0)
+Q.define("diet_items.delete", "DELETE FROM diet_items WHERE id = ? AND COALESCE(user_id, 0) = COALESCE(?, 0)")
+
+# ---------- totais (diet_totals) ----------
+# Uma linha por (usuário, paciente, dieta, refeição), atualizada na mesma transação
+# que insere/apaga o item: a tela e o PDF leem os totais prontos em vez de somar os itens.
+
+TOTAL_FIELDS = ("kcal", "proteina_g", "carbo_g", "gordura_g")
+_TOTALS_COLS = "user_id, patient_id, diet_key, meal, items, " + ", ".join(TOTAL_FIELDS)
+# mesma conta da tela: grams / base_g (base 0 ou vazia vale 100 g), nutriente vazio vale 0
+_ITEM_FACTOR = "di.grams / COALESCE(NULLIF(f.base_g, 0), 100.0)"
+
+Q.define("diet_totals.apply_item", f"""
+    INSERT INTO diet_totals ({_TOTALS_COLS})
+    SELECT COALESCE(di.user_id, 0), di.patient_id, COALESCE(di.diet_id, 0), di.meal, delta.n,
+           {", ".join(f"delta.n * COALESCE(f.{c}, 0) * {_ITEM_FACTOR}" for c in TOTAL_FIELDS)}
+    FROM diet_items di
+    JOIN foods f ON f.id = di.food_id
+    CROSS JOIN (SELECT CAST(? AS INTEGER) AS n) delta
+    WHERE di.id = ? AND COALESCE(di.user_id, 0) = COALESCE(?, 0)
+    ON CONFLICT (user_id, patient_id, diet_key, meal) DO UPDATE SET
+        items = diet_totals.items + excluded.items,
+        {", ".join(f"{c} = diet_totals.{c} + excluded.{c}" for c in TOTAL_FIELDS)}
+""")
+Q.define("diet_totals.clear", "DELETE FROM diet_totals")
+Q.define("diet_totals.rebuild", f"""
+    INSERT INTO diet_totals ({_TOTALS_COLS})
+    SELECT COALESCE(di.user_id, 0), di.patient_id, COALESCE(di.diet_id, 0), di.meal, COUNT(*),
+           {", ".join(f"SUM(COALESCE(f.{c}, 0) * {_ITEM_FACTOR})" for c in TOTAL_FIELDS)}
+    FROM diet_items di
+    JOIN foods f ON f.id = di.food_id
+    GROUP BY COALESCE(di.user_id, 0), di.patient_id, COALESCE(di.diet_id, 0), di.meal
+""")
+Q.define("diet_totals.by_diet", f"""
+    SELECT meal, items, {", ".join(TOTAL_FIELDS)}
+    FROM diet_totals
+    WHERE user_id = COALESCE(?, 0) AND patient_id = ? AND diet_key = ? AND items > 0
+    ORDER BY meal
+""")
+# sem dieta: soma todas as dietas do paciente (mesma regra do list_diet_items)
+Q.define("diet_totals.by_patient", f"""
+    SELECT meal, SUM(items) AS items, {", ".join(f"SUM({c}) AS {c}" for c in TOTAL_FIELDS)}
+    FROM diet_totals
+    WHERE user_id = COALESCE(?, 0) AND patient_id = ?
+    GROUP BY meal
+    HAVING SUM(items) > 0
+    ORDER BY meal
+""")
+
+def _totals_from_rows(rows) -> dict:
+    day = dict.fromkeys(("items",) + TOTAL_FIELDS, 0)
+    meals = {}
+    for r in rows or []:
+        r = dict(r)
+        meals[r["meal"]] = {k: r[k] or 0 for k in day}
+        for k in day:
+            day[k] += r[k] or 0
+    return {"day": day, "meals": meals}
+
+def rebuild_diet_totals(cur=None):
+    """Recalcula diet_totals do zero (depois de mudar valores em foods)."""
+    if cur is None:
+        with get_conn() as conn:
+            return rebuild_diet_totals(conn.cursor())
+    Q.run(cur, "diet_totals.clear")
+    Q.run(cur, "diet_totals.rebuild")
+
+@_cached
+def get_diet_totals(user_id, patient_id, diet_id=None) -> dict:
+    """
+    {"day": {...}, "meals": {refeição: {...}}}, cada um com items, kcal, proteina_g, carbo_g, gordura_g.
+    Custa o número de refeições, não o de itens.
+    """
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if diet_id:
+            Q.run(cur, "diet_totals.by_diet", (user_id, patient_id, diet_id))
+        else:
+            Q.run(cur, "diet_totals.by_patient", (user_id, patient_id))
+        rows = cur.fetchall()
+    return _totals_from_rows(rows)
+
 def add_diet_item(user_id, patient_id, diet_id, meal, food_id, grams):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO diet_items (user_id, patient_id, diet_id, meal, food_id, grams, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            RETURNING id
-        """, (user_id, patient_id, diet_id, meal, food_id, grams, _now()))
-        new_id = cur.fetchone()["id"]
-    else:
-        cur.execute("""
-            INSERT INTO diet_items (user_id, patient_id, diet_id, meal, food_id, grams, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (user_id, patient_id, diet_id, meal, food_id, grams, _now()))
-        new_id = cur.lastrowid
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        new_id = Q.insert(
+            cur, "diet_items.insert",
+            (user_id, patient_id, diet_id, meal, food_id, grams, _now())
+        )
+        Q.run(cur, "diet_totals.apply_item", (1, new_id, user_id))
+
+    _invalidate_user(user_id)
     return new_id
 
+@_cached
 def list_diet_items(user_id, patient_id, diet_id=None):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if diet_id:
-        cur.execute("""
-            SELECT di.id, di.meal, di.grams, di.food_id,
-                   f.nome, f.base_g, f.kcal, f.proteina_g, f.carbo_g, f.gordura_g, f.fibra_g, f.sodio_mg
-            FROM diet_items di
-            JOIN foods f ON f.id = di.food_id
-            WHERE di.user_id = ? AND di.patient_id = ? AND di.diet_id = ?
-            ORDER BY di.meal, di.id
-        """ if not USE_POSTGRES else """
-            SELECT di.id, di.meal, di.grams, di.food_id,
-                   f.nome, f.base_g, f.kcal, f.proteina_g, f.carbo_g, f.gordura_g, f.fibra_g, f.sodio_mg
-            FROM diet_items di
-            JOIN foods f ON f.id = di.food_id
-            WHERE di.user_id = %s AND di.patient_id = %s AND di.diet_id = %s
-            ORDER BY di.meal, di.id
-        """, (user_id, patient_id, diet_id))
-    else:
-        cur.execute("""
-            SELECT di.id, di.meal, di.grams, di.food_id,
-                   f.nome, f.base_g, f.kcal, f.proteina_g, f.carbo_g, f.gordura_g, f.fibra_g, f.sodio_mg
-            FROM diet_items di
-            JOIN foods f ON f.id = di.food_id
-            WHERE di.user_id = ? AND di.patient_id = ?
-            ORDER BY di.meal, di.id
-        """ if not USE_POSTGRES else """
-            SELECT di.id, di.meal, di.grams, di.food_id,
-                   f.nome, f.base_g, f.kcal, f.proteina_g, f.carbo_g, f.gordura_g, f.fibra_g, f.sodio_mg
-            FROM diet_items di
-            JOIN foods f ON f.id = di.food_id
-            WHERE di.user_id = %s AND di.patient_id = %s
-            ORDER BY di.meal, di.id
-        """, (user_id, patient_id))
-
-    rows = cur.fetchall()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        if diet_id:
+            Q.run(cur, "diet_items.list_by_diet", (user_id, patient_id, diet_id))
+        else:
+            Q.run(cur, "diet_items.list", (user_id, patient_id))
+        rows = cur.fetchall()
     return [dict(r) for r in rows]
 
 
 def delete_diet_item(user_id, item_id):
-    conn = get_conn()
-    cur = conn.cursor()
-    cur.execute(
-        "DELETE FROM diet_items WHERE id = ? AND user_id = ?"
-        if not USE_POSTGRES else
-        "DELETE FROM diet_items WHERE id = %s AND user_id = %s",
-        (item_id, user_id)
-    )
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        cur = conn.cursor()
+        # desconta antes de apagar (o item ainda existe para o JOIN com foods)
+        Q.run(cur, "diet_totals.apply_item", (-1, item_id, user_id))
+        Q.run(cur, "diet_items.delete", (item_id, user_id))
+
+    _invalidate_user(user_id)
 
 
 def update_patient(patient_id, user_id, nome, telefone="", email="", nascimento=None, sexo="", obs=""):
-        conn = get_conn()
+    nasc_str = str(nascimento) if nascimento is not None else ""
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "patients.update", (nome, telefone, email, nasc_str, sexo, obs, patient_id, user_id))
+
+    _invalidate_user(user_id)
+
+
+# --------------------------------------------------
+# Bundle das páginas do paciente
+# --------------------------------------------------
+
+# Postgres: uma consulta só (LATERAL pega a última avaliação/dieta e os itens em JSON)
+Q.define("patients.bundle", """
+    SELECT row_to_json(p) AS patient,
+           row_to_json(a) AS assessment,
+           row_to_json(d) AS diet,
+           COALESCE(i.items, '[]'::json) AS items,
+           COALESCE(t.totals, '[]'::json) AS totals
+    FROM patients p
+    LEFT JOIN LATERAL (
+        SELECT * FROM assessments
+        WHERE patient_id = p.id AND user_id = p.user_id
+        ORDER BY data_iso DESC, id DESC
+        LIMIT 1
+    ) a ON true
+    LEFT JOIN LATERAL (
+        SELECT * FROM diets
+        WHERE patient_id = p.id AND user_id = p.user_id
+        ORDER BY data_iso DESC, id DESC
+        LIMIT 1
+    ) d ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.meal, x.id) AS items
+        FROM (
+""" + _DIET_ITEMS_SELECT + """
+            WHERE di.user_id = p.user_id AND di.patient_id = p.id
+              AND (d.id IS NULL OR di.diet_id = d.id)
+        ) x
+    ) i ON true
+    LEFT JOIN LATERAL (
+        SELECT json_agg(x ORDER BY x.meal) AS totals
+        FROM (
+            SELECT meal, SUM(items) AS items, """ + ", ".join(f"SUM({c}) AS {c}" for c in TOTAL_FIELDS) + """
+            FROM diet_totals
+            WHERE user_id = p.user_id AND patient_id = p.id
+              AND (d.id IS NULL OR diet_key = d.id)
+            GROUP BY meal
+            HAVING SUM(items) > 0
+        ) x
+    ) t ON true
+    WHERE p.id = ? AND p.user_id = ?
+""")
+
+@_cached
+def get_patient_bundle(user_id, patient_id) -> dict | None:
+    """
+    Tudo o que as páginas do paciente (dieta, refeições, relatório) leem, de uma vez:
+    {"patient", "assessment", "diet", "items", "totals"} — items/totals são os da última
+    dieta (ou de todas do paciente, se ainda não houver dieta); totals no formato do
+    get_diet_totals. None se o paciente não é do usuário.
+
+    Postgres: uma ida ao banco. SQLite: mesma conexão e statements em cache
+    (sem rede no meio, as consultas por índice custam quase nada).
+    """
+    with get_conn(readonly=True) as conn:
         cur = conn.cursor()
 
-        nasc_str = str(nascimento) if nascimento is not None else ""
+        if USE_POSTGRES:
+            row = Q.run(cur, "patients.bundle", (patient_id, user_id)).fetchone()
+            if not row:
+                return None
+            return {
+                "patient": row["patient"],
+                "assessment": row["assessment"],
+                "diet": row["diet"],
+                "items": row["items"],
+                "totals": _totals_from_rows(row["totals"]),
+            }
+
+        patient = Q.run(cur, "patients.get", (patient_id, user_id)).fetchone()
+        if not patient:
+            return None
+        assessment = Q.run(cur, "assessments.last", (patient_id, user_id)).fetchone()
+        diet = Q.run(cur, "diets.last", (patient_id, user_id)).fetchone()
+        if diet:
+            items = Q.run(cur, "diet_items.list_by_diet", (user_id, patient_id, diet["id"])).fetchall()
+            totals = Q.run(cur, "diet_totals.by_diet", (user_id, patient_id, diet["id"])).fetchall()
+        else:
+            items = Q.run(cur, "diet_items.list", (user_id, patient_id)).fetchall()
+            totals = Q.run(cur, "diet_totals.by_patient", (user_id, patient_id)).fetchall()
+
+    return {
+        "patient": dict(patient),
+        "assessment": dict(assessment) if assessment else None,
+        "diet": dict(diet) if diet else None,
+        "items": _dicts(items),
+        "totals": _totals_from_rows(totals),
+    }
 
-        cur.execute("""
-            UPDATE patients
-            SET nome = ?, telefone = ?, email = ?, nascimento = ?, sexo = ?, obs = ?
-            WHERE id = ? AND user_id = ?
-        """ if not USE_POSTGRES else """
-            UPDATE patients
-            SET nome = %s, telefone = %s, email = %s, nascimento = %s, sexo = %s, obs = %s
-            WHERE id = %s AND user_id = %s
-        """, (nome, telefone, email, nasc_str, sexo, obs, patient_id, user_id))
 
-        conn.commit()
-        conn.close()    
+# --------------------------------------------------
+# Feedback / eventos
+# --------------------------------------------------
+
+Q.define("feedback.insert", """
+    INSERT INTO feedback (user_id, page, message, rating, created_at)
+    VALUES (?, ?, ?, ?, ?)
+""")
+Q.define("feedback.list", "SELECT * FROM feedback ORDER BY created_at DESC LIMIT ?")
+Q.define(
+    "events.insert",
+    "INSERT INTO event_logs (user_id, event_name, meta, created_at) VALUES (?, ?, ?, ?)",
+    pg="INSERT INTO event_logs (user_id, event_name, meta, created_at) VALUES ?",
+)
 
 def create_feedback(user_id: int, page: str, message: str, rating: int | None = None):
     page = (page or "").strip()
@@ -866,60 +1479,49 @@ def create_feedback(user_id: int, page: str, message: str, rating: int | None =
     if not message:
         return
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO feedback (user_id, page, message, rating, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (user_id, page, message, rating, _now()))
-    else:
-        cur.execute("""
-            INSERT INTO feedback (user_id, page, message, rating, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (user_id, page, message, rating, _now()))
-
-    conn.commit()
-    conn.close()
+    with get_conn() as conn:
+        Q.run(conn.cursor(), "feedback.insert", (user_id, page, message, rating, _now()))
 
 
 def list_feedback(limit: int = 200):
-    conn = get_conn()
-    cur = conn.cursor()
-
-    cur.execute(
-        "SELECT * FROM feedback ORDER BY created_at DESC LIMIT ?"
-        if not USE_POSTGRES else
-        "SELECT * FROM feedback ORDER BY created_at DESC LIMIT %s",
-        (limit,)
-    )
-
-    rows = cur.fetchall()
-    conn.close()
+    with get_conn(readonly=True) as conn:
+        rows = Q.run(conn.cursor(), "feedback.list", (limit,)).fetchall()
     return _dicts(rows)
 
 
 def log_event(user_id: int | None, event_name: str, meta: dict | None = None):
+    """
+    Registra um evento de uso. Não grava na hora: vai para a fila do
+    utils/event_logger.py, que grava em lote numa thread separada.
+    Dentro de db.transaction() só vai se a transação for confirmada ("error" vai sempre).
+    """
     event_name = (event_name or "").strip()
     if not event_name:
         return
 
     meta_json = json.dumps(meta or {}, ensure_ascii=False)
+    created_at = _now()
 
-    conn = get_conn()
-    cur = conn.cursor()
-
-    if USE_POSTGRES:
-        cur.execute("""
-            INSERT INTO event_logs (user_id, event_name, meta, created_at)
-            VALUES (%s, %s, %s, %s)
-        """, (user_id, event_name, meta_json, _now()))
-    else:
-        cur.execute("""
-            INSERT INTO event_logs (user_id, event_name, meta, created_at)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, event_name, meta_json, _now()))
+    from utils import event_logger
+    tx = _tx.get()
+    if tx is not None and event_name in event_logger.CRITICAL_EVENTS:
+        # "error" não some junto com a transação que falhou: vai quando ela terminar
+        tx._finally.append(lambda: log_event(user_id, event_name, meta))
+        return
+    if not event_logger.ASYNC:
+        # dentro de transação entra no mesmo COMMIT
+        insert_events([(user_id, event_name, meta_json, created_at)])
+        return
+    row = (user_id, event_name, meta_json, created_at)
+    if tx is not None:
+        # só registra se a ação foi confirmada
+        tx.on_commit(lambda: event_logger.get_event_logger().log(*row))
+        return
+    event_logger.get_event_logger().log(*row)
 
-    conn.commit()
-    conn.close()
\ No newline at end of file
+def insert_events(rows: list[tuple]):
+    """INSERT de várias linhas em event_logs. rows: [(user_id, event_name, meta_json, created_at), ...]"""
+    if not rows:
+        return
+    with get_conn() as conn:
+        Q.run_many(conn.cursor(), "events.insert", rows)
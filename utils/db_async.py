@@ -0,0 +1,413 @@
+"""
+Camada assíncrona do banco, para quem não é página do Streamlit (jobs em lote, geração
+de relatórios, uma API futura): centenas de consultas ao mesmo tempo sem uma thread
+por pedido.
+
+    from utils.db_async import AsyncDB
+
+    async with AsyncDB() as adb:
+        pacientes = await adb.list_patients(user_id)
+        bundles = await asyncio.gather(*(adb.get_patient_bundle(user_id, p["id"]) for p in pacientes))
+
+- Postgres: asyncpg, com o pool dele (DB_ASYNC_POOL_MIN/MAX). O cache de prepared
+  statements do asyncpg faz o papel do PREPARE do utils/queries.py (DB_PG_PREPARE=0 desliga)
+- SQLite: aiosqlite + AsyncSQLitePool (utils/pool.py), escritas uma por vez
+- mesmas consultas (registro Q) e mesmas funções do utils/db.py, com await
+- o banco vem do construtor (padrão: DATABASE_URL ou data/nutriapp.db), não das globais
+  do utils/db.py — dá para ter dois abertos ao mesmo tempo
+- não aplica migrations: rode `python -m utils.migrations upgrade` antes
+- escrita feita aqui invalida o cache de leitura do utils/db.py do mesmo processo
+"""
+import os
+import re
+import json
+import sqlite3
+from contextlib import asynccontextmanager, nullcontext
+from datetime import date, datetime
+from pathlib import Path
+
+from utils import db
+from utils.db import Q, ASSESSMENT_FIELDS, DIET_FIELDS, _totals_from_rows, _like_escape, fold_text, _now
+from utils.pool import AsyncSQLitePool, POOL_MAX, POOL_TIMEOUT
+from utils.queries import PG_PREPARE
+
+ASYNC_POOL_MIN = int(os.getenv("DB_ASYNC_POOL_MIN", "1"))
+ASYNC_POOL_MAX = int(os.getenv("DB_ASYNC_POOL_MAX", str(POOL_MAX)))
+
+
+def _adapt(params) -> tuple:
+    # data vira texto, igual ao que o lado síncrono grava (asyncpg não converte sozinho)
+    return tuple(v.isoformat() if isinstance(v, (date, datetime)) else v for v in params)
+
+
+# --------------------------------------------------
+# Conexões (mesma interface nos dois bancos)
+# --------------------------------------------------
+
+class _PgConn:
+    def __init__(self, conn):
+        self.raw = conn
+
+    async def fetch(self, name: str, params=()) -> list[dict]:
+        rows = await self.raw.fetch(Q.sql(name, numbered=True), *_adapt(params))
+        return [dict(r) for r in rows]
+
+    async def fetchrow(self, name: str, params=()) -> dict | None:
+        row = await self.raw.fetchrow(Q.sql(name, numbered=True), *_adapt(params))
+        return dict(row) if row else None
+
+    async def fetchval(self, name: str, params=()):
+        return await self.raw.fetchval(Q.sql(name, numbered=True), *_adapt(params))
+
+    async def execute(self, name: str, params=()):
+        await self.raw.execute(Q.sql(name, numbered=True), *_adapt(params))
+
+    async def insert(self, name: str, params=()):
+        # consultas registradas com returning="id"
+        return await self.fetchval(name, params)
+
+
+class _SQLiteConn:
+    def __init__(self, conn):
+        self.raw = conn
+
+    async def fetch(self, name: str, params=()) -> list[dict]:
+        async with self.raw.execute(Q.sql(name), _adapt(params)) as cur:
+            return [dict(r) for r in await cur.fetchall()]
+
+    async def fetchrow(self, name: str, params=()) -> dict | None:
+        async with self.raw.execute(Q.sql(name), _adapt(params)) as cur:
+            row = await cur.fetchone()
+        return dict(row) if row else None
+
+    async def fetchval(self, name: str, params=()):
+        async with self.raw.execute(Q.sql(name), _adapt(params)) as cur:
+            row = await cur.fetchone()
+        return row[0] if row else None
+
+    async def execute(self, name: str, params=()):
+        async with self.raw.execute(Q.sql(name), _adapt(params)):
+            pass
+
+    async def insert(self, name: str, params=()):
+        async with self.raw.execute(Q.sql(name), _adapt(params)) as cur:
+            return cur.lastrowid
+
+
+async def _init_pg_conn(conn):
+    # json/jsonb chegam como dict/list (o bundle usa row_to_json/json_agg)
+    for typ in ("json", "jsonb"):
+        await conn.set_type_codec(typ, encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+
+# --------------------------------------------------
+# Banco
+# --------------------------------------------------
+
+class AsyncDB:
+    def __init__(self, database_url: str | None = None, sqlite_path=None,
+                 min_size: int = ASYNC_POOL_MIN, max_size: int = ASYNC_POOL_MAX, timeout: float = POOL_TIMEOUT):
+        url = database_url if database_url is not None else os.getenv("DATABASE_URL")
+        self.postgres = bool(url)
+        self.database_url = db.normalize_db_url(url) if url else None
+        self.sqlite_path = Path(sqlite_path) if sqlite_path else db.SQLITE_PATH
+        self.min_size = min_size
+        self.max_size = max(1, max_size)
+        self.timeout = timeout
+        self._pool = None
+        self._has_fts = None
+        self._has_trgm = None
+
+    async def open(self):
+        if self._pool is not None:
+            return self
+        if self.postgres:
+            import asyncpg
+            self._pool = await asyncpg.create_pool(
+                self.database_url,
+                min_size=min(self.min_size, self.max_size),
+                max_size=self.max_size,
+                ssl="require",
+                statement_cache_size=max(100, 2 * len(Q)) if PG_PREPARE else 0,
+                init=_init_pg_conn,
+            )
+        else:
+            self._pool = AsyncSQLitePool(self._connect_sqlite, maxconn=self.max_size, timeout=self.timeout)
+        return self
+
+    async def close(self):
+        pool, self._pool = self._pool, None
+        if pool is None:
+            return
+        if self.postgres:
+            await pool.close()
+        else:
+            await pool.closeall()
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connect_sqlite(self):
+        import aiosqlite
+        conn = await aiosqlite.connect(
+            self.sqlite_path,
+            timeout=db.SQLITE_BUSY_TIMEOUT_MS / 1000,
+            cached_statements=Q.sqlite_cache_size(),
+        )
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def pool_stats(self) -> dict:
+        if self._pool is None:
+            return {}
+        if self.postgres:
+            return {"backend": "asyncpg", "size": self._pool.get_size(), "idle": self._pool.get_idle_size(),
+                    "max": self.max_size}
+        return self._pool.stats()
+
+    @asynccontextmanager
+    async def connection(self, readonly: bool = False):
+        """
+        Uma transação:
+
+            async with adb.connection() as c:
+                pid = await c.insert("patients.insert", (...))
+                await c.execute("...", (...))
+
+        Commit no fim do bloco, rollback se der exceção. readonly=True: só leitura
+        (no SQLite não espera a vez de escrever).
+        """
+        if self._pool is None:
+            await self.open()
+
+        if self.postgres:
+            async with self._pool.acquire(timeout=self.timeout) as conn:
+                if readonly:
+                    yield _PgConn(conn)
+                else:
+                    async with conn.transaction():
+                        yield _PgConn(conn)
+            return
+
+        pool = self._pool
+        async with (nullcontext() if readonly else pool.write_lock):
+            conn = await pool.getconn()
+            discard = False
+            try:
+                yield _SQLiteConn(conn)
+                await conn.commit()
+            except BaseException:
+                try:
+                    await conn.rollback()
+                except Exception:
+                    discard = True
+                raise
+            finally:
+                await pool.putconn(conn, discard=discard)
+
+    async def _fetch(self, name: str, params=()) -> list[dict]:
+        async with self.connection(readonly=True) as c:
+            return await c.fetch(name, params)
+
+    async def _fetchrow(self, name: str, params=()) -> dict | None:
+        async with self.connection(readonly=True) as c:
+            return await c.fetchrow(name, params)
+
+    async def _fetchval(self, name: str, params=()):
+        async with self.connection(readonly=True) as c:
+            return await c.fetchval(name, params)
+
+    # ---------- pacientes ----------
+
+    async def create_patient(self, nome, telefone="", email="", nascimento="", sexo="", obs="", user_id=None):
+        async with self.connection() as c:
+            pid = await c.insert("patients.insert", (user_id, nome, telefone, email, nascimento, sexo, obs))
+        db._invalidate_user(user_id)
+        return pid
+
+    async def list_patients(self, user_id=None):
+        if user_id:
+            return await self._fetch("patients.list", (user_id,))
+        return await self._fetch("patients.list_all")
+
+    async def get_patient(self, patient_id, user_id=None):
+        if user_id is not None:
+            return await self._fetchrow("patients.get", (patient_id, user_id))
+        return await self._fetchrow("patients.get_any_user", (patient_id,))
+
+    async def search_patients(self, user_id, query: str = "", limit: int = 20):
+        q = (query or "").strip()
+        return await self._fetch("patients.search", (user_id, f"%{_like_escape(q)}%" if q else "%", limit))
+
+    async def get_patient_labels(self, user_id, patient_ids) -> dict:
+        ids = [int(i) for i in patient_ids if i is not None]
+        if not ids:
+            return {}
+        rows = await self._fetch("patients.labels", (user_id, ids if self.postgres else json.dumps(ids)))
+        return {r["id"]: r["nome"] for r in rows}
+
+    async def list_patients_page(self, user_id, after: tuple | None = None, limit: int = 50):
+        if after is None:
+            return await self._fetch("patients.page_first", (user_id, limit))
+        after_nome, after_id = after
+        return await self._fetch("patients.page_after", (user_id, after_nome, after_nome, after_id, limit))
+
+    async def count_patients(self, user_id) -> int:
+        return int(await self._fetchval("patients.count", (user_id,)) or 0)
+
+    async def update_patient(self, patient_id, user_id, nome, telefone="", email="", nascimento=None, sexo="", obs=""):
+        nasc_str = str(nascimento) if nascimento is not None else ""
+        async with self.connection() as c:
+            await c.execute("patients.update", (nome, telefone, email, nasc_str, sexo, obs, patient_id, user_id))
+        db._invalidate_user(user_id)
+
+    async def get_patient_bundle(self, user_id, patient_id) -> dict | None:
+        """Mesmo formato do db.get_patient_bundle."""
+        async with self.connection(readonly=True) as c:
+            if self.postgres:
+                row = await c.fetchrow("patients.bundle", (patient_id, user_id))
+                if not row:
+                    return None
+                return dict(row, totals=_totals_from_rows(row["totals"]))
+
+            patient = await c.fetchrow("patients.get", (patient_id, user_id))
+            if not patient:
+                return None
+            assessment = await c.fetchrow("assessments.last", (patient_id, user_id))
+            diet = await c.fetchrow("diets.last", (patient_id, user_id))
+            if diet:
+                items = await c.fetch("diet_items.list_by_diet", (user_id, patient_id, diet["id"]))
+                totals = await c.fetch("diet_totals.by_diet", (user_id, patient_id, diet["id"]))
+            else:
+                items = await c.fetch("diet_items.list", (user_id, patient_id))
+                totals = await c.fetch("diet_totals.by_patient", (user_id, patient_id))
+        return {
+            "patient": patient,
+            "assessment": assessment,
+            "diet": diet,
+            "items": items,
+            "totals": _totals_from_rows(totals),
+        }
+
+    # ---------- avaliações ----------
+
+    async def create_assessment(self, patient_id, payload: dict, user_id=None):
+        async with self.connection() as c:
+            new_id = await c.insert(
+                "assessments.insert",
+                (user_id, patient_id, *(payload.get(f) for f in ASSESSMENT_FIELDS)),
+            )
+        db._invalidate_user(user_id)
+        return new_id
+
+    async def get_last_assessment(self, patient_id, user_id=None):
+        if user_id is not None:
+            return await self._fetchrow("assessments.last", (patient_id, user_id))
+        return await self._fetchrow("assessments.last_any_user", (patient_id,))
+
+    # ---------- dietas ----------
+
+    async def create_diet(self, patient_id, payload: dict, user_id=None):
+        async with self.connection() as c:
+            new_id = await c.insert("diets.insert", (user_id, patient_id, *(payload.get(f) for f in DIET_FIELDS)))
+        db._invalidate_user(user_id)
+        return new_id
+
+    async def get_last_diet(self, patient_id, user_id=None):
+        if user_id is not None:
+            return await self._fetchrow("diets.last", (patient_id, user_id))
+        return await self._fetchrow("diets.last_any_user", (patient_id,))
+
+    async def list_diet_items(self, user_id, patient_id, diet_id=None):
+        if diet_id:
+            return await self._fetch("diet_items.list_by_diet", (user_id, patient_id, diet_id))
+        return await self._fetch("diet_items.list", (user_id, patient_id))
+
+    async def get_diet_totals(self, user_id, patient_id, diet_id=None) -> dict:
+        if diet_id:
+            rows = await self._fetch("diet_totals.by_diet", (user_id, patient_id, diet_id))
+        else:
+            rows = await self._fetch("diet_totals.by_patient", (user_id, patient_id))
+        return _totals_from_rows(rows)
+
+    async def add_diet_item(self, user_id, patient_id, diet_id, meal, food_id, grams):
+        async with self.connection() as c:
+            new_id = await c.insert(
+                "diet_items.insert", (user_id, patient_id, diet_id, meal, food_id, grams, _now())
+            )
+            await c.execute("diet_totals.apply_item", (1, new_id, user_id))
+        db._invalidate_user(user_id)
+        return new_id
+
+    async def delete_diet_item(self, user_id, item_id):
+        async with self.connection() as c:
+            await c.execute("diet_totals.apply_item", (-1, item_id, user_id))
+            await c.execute("diet_items.delete", (item_id, user_id))
+        db._invalidate_user(user_id)
+
+    # ---------- alimentos ----------
+
+    async def search_foods(self, query: str, limit: int = 50):
+        """Mesma busca do db.search_foods (pg_trgm ou ILIKE no Postgres, FTS5 ou LIKE no SQLite)."""
+        q = (query or "").strip()
+        if not q:
+            return []
+        async with self.connection(readonly=True) as c:
+            if self.postgres:
+                if self._has_trgm is None:
+                    self._has_trgm = await c.fetchrow("meta.trgm_exists") is not None
+                if not self._has_trgm:
+                    return await c.fetch("foods.search_ilike", (f"%{_like_escape(q)}%", limit))
+                folded = _like_escape(fold_text(q))
+                return await c.fetch("foods.search_trgm", (f"%{folded}%", q, f"{folded}%", q, limit))
+            if self._has_fts is None:
+                self._has_fts = await c.fetchrow("meta.fts_exists") is not None
+            if self._has_fts:
+                terms = re.findall(r"\w+", fold_text(q))
+                if not terms:
+                    return []
+                return await c.fetch("foods.search_fts", (" ".join(f'"{t}"*' for t in terms), limit))
+            return await c.fetch("foods.search_like", (f"%{q}%", limit))
+
+    async def get_food(self, food_id: int):
+        return await self._fetchrow("foods.get", (food_id,))
+
+    async def list_all_foods(self):
+        return await self._fetch("foods.all")
+
+    async def count_foods(self) -> int:
+        return int(await self._fetchval("foods.count") or 0)
+
+    # ---------- agenda ----------
+
+    async def create_appointment(self, patient_id, dt_iso, tipo="", notas="", user_id=None):
+        async with self.connection() as c:
+            await c.execute("appointments.insert", (user_id, patient_id, dt_iso, tipo, notas))
+        db._invalidate_user(user_id)
+
+    async def list_appointments(self, user_id=None):
+        if user_id:
+            return await self._fetch("appointments.list", (user_id,))
+        return await self._fetch("appointments.list_all")
+
+    async def list_appointments_range(self, user_id, start_iso: str, end_iso: str):
+        return await self._fetch("appointments.range", (user_id, start_iso, end_iso))
+
+    async def list_upcoming_appointments(self, user_id, limit: int = 10, now_iso: str | None = None):
+        now_iso = now_iso or datetime.now().isoformat(timespec="minutes")
+        return await self._fetch("appointments.upcoming", (user_id, now_iso, limit))
+
+    async def update_appointment(self, appointment_id, user_id, patient_id=None, dt_iso=None, tipo=None, notas=None):
+        if patient_id is None and dt_iso is None and tipo is None and notas is None:
+            return
+        async with self.connection() as c:
+            await c.execute("appointments.update", (patient_id, dt_iso, tipo, notas, appointment_id, user_id))
+        db._invalidate_user(user_id)
+
+    async def delete_appointment(self, appointment_id, user_id):
+        async with self.connection() as c:
+            await c.execute("appointments.delete", (appointment_id, user_id))
+        db._invalidate_user(user_id)
@@ -0,0 +1,49 @@
+import os
+import streamlit as st
+
+from utils import profiler
+from utils.db import cache_stats
+
+# painel só para desenvolvimento/diagnóstico: DEBUG_PANEL=1
+DEBUG_PANEL = os.getenv("DEBUG_PANEL", "0") == "1"
+
+def debug_panel(trace):
+    """Sidebar com o último rerun completo desta sessão + números do processo."""
+    if not DEBUG_PANEL:
+        return
+
+    with st.sidebar.expander("🐞 Banco (debug)", expanded=False):
+        if trace is None or not trace.finished:
+            st.caption("Ainda sem rerun completo (ou DB_PROFILE=0).")
+        else:
+            s = trace.summary()
+            st.caption(f'Último rerun: {s["page"]} — {s["queries"]} consulta(s), '
+                       f'{s["db_ms"]:.1f} ms de banco em {s["elapsed_ms"]:.0f} ms')
+            for w in s["warnings"]:
+                st.warning(w)
+            if s["statements"]:
+                st.dataframe(s["statements"], hide_index=True, use_container_width=True)
+
+        tab_q, tab_p, tab_slow = st.tabs(["Consultas", "Páginas", "Lentas"])
+        with tab_q:
+            rows = [
+                {"consulta": name, "n": h["n"], "p50": h["p50_ms"], "p95": h["p95_ms"],
+                 "máx": h["max_ms"], "total": h["total_ms"]}
+                for name, h in profiler.statement_stats().items()
+            ]
+            rows.sort(key=lambda r: -r["total"])
+            st.dataframe(rows, hide_index=True, use_container_width=True)
+            c = cache_stats()
+            st.caption(f'Cache: {c["hit_rate"]:.0%} de acerto, {c["size"]} entradas')
+        with tab_p:
+            st.dataframe(
+                [
+                    {"página": name, "reruns": p["reruns"], "consultas/rerun": p["avg_queries"],
+                     "máx": p["max_queries"], "ms p50": p["db_ms"]["p50_ms"], "ms p95": p["db_ms"]["p95_ms"]}
+                    for name, p in profiler.page_stats().items()
+                ],
+                hide_index=True, use_container_width=True,
+            )
+        with tab_slow:
+            st.caption(f"Acima de {profiler.SLOW_MS:.0f} ms (DB_SLOW_MS)")
+            st.dataframe(profiler.slow_queries(), hide_index=True, use_container_width=True)
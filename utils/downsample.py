@@ -0,0 +1,44 @@
+"""
+Redução de séries para gráfico.
+
+Paciente de anos com check-in semanal passa de centenas de pontos; o gráfico não
+precisa de mais que a largura dele. O LTTB (Largest-Triangle-Three-Buckets, Steinarsson)
+escolhe em cada faixa o ponto que forma o maior triângulo com o ponto anterior e a média
+da faixa seguinte — mantém picos e vales, que a média por faixa achataria.
+"""
+import numpy as np
+
+
+def lttb(x, y, n_out: int) -> np.ndarray:
+    """
+    Índices dos pontos a manter (sempre inclui o primeiro e o último).
+    x precisa estar em ordem crescente.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (n_out - 2)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    a = 0
+    for i in range(n_out - 2):
+        # faixa atual [start, end) e média da próxima
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        if end >= nxt_end:
+            avg_x, avg_y = x[n - 1], y[n - 1]
+        else:
+            avg_x, avg_y = x[end:nxt_end].mean(), y[end:nxt_end].mean()
+
+        area = np.abs(
+            (x[a] - avg_x) * (y[start:end] - y[a])
+            - (x[a] - x[start:end]) * (avg_y - y[a])
+        )
+        a = start + int(area.argmax())
+        keep[i + 1] = a
+    keep[-1] = n - 1
+    return keep
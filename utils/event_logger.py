@@ -0,0 +1,190 @@
+"""
+Logger de eventos em background.
+
+db.log_event() só coloca o evento numa fila em memória; uma thread grava em lote
+(INSERT de várias linhas) quando junta EVENT_LOG_BATCH_SIZE eventos ou a cada
+EVENT_LOG_FLUSH_INTERVAL segundos. Assim a ação do usuário não espera a telemetria.
+
+- fila limitada (EVENT_LOG_MAX_BUFFER); acima de 80% cheia, eventos comuns passam a ser
+  amostrados (EVENT_LOG_SAMPLE_RATE) e, lotada, descartados — "error" nunca é amostrado
+- banco fora do ar → o lote vai para data/event_spool.jsonl e é reenviado depois
+- flush no encerramento do processo (atexit)
+- de hora em hora a mesma thread roda a manutenção do event_logs (utils/event_store.py)
+- EVENT_LOG_ASYNC=0 volta ao modo síncrono (scripts, debug)
+"""
+import os
+import json
+import time
+import atexit
+import random
+import threading
+from collections import deque
+from pathlib import Path
+
+from utils import db, event_store
+
+ASYNC = os.getenv("EVENT_LOG_ASYNC", "1") != "0"
+BATCH_SIZE = int(os.getenv("EVENT_LOG_BATCH_SIZE", "200"))
+FLUSH_INTERVAL = float(os.getenv("EVENT_LOG_FLUSH_INTERVAL", "2"))
+MAX_BUFFER = int(os.getenv("EVENT_LOG_MAX_BUFFER", "10000"))
+SAMPLE_RATE = float(os.getenv("EVENT_LOG_SAMPLE_RATE", "0.1"))
+SPOOL_PATH = Path("data") / "event_spool.jsonl"
+
+CRITICAL_EVENTS = {"error"}
+_HIGH_WATER = 0.8
+
+
+class EventLogger:
+    def __init__(self, writer=None, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 max_buffer=MAX_BUFFER, sample_rate=SAMPLE_RATE, spool_path=SPOOL_PATH):
+        self._writer = writer or db.insert_events
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(1, max_buffer)
+        self.sample_rate = sample_rate
+        self.spool_path = Path(spool_path)
+
+        self._buf = deque()
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()   # um lote por vez (thread de fundo ou flush manual)
+        self._thread = None
+        self._stopping = False
+        self._stats = {"logged": 0, "written": 0, "sampled_out": 0, "dropped": 0, "spooled": 0, "replayed": 0}
+
+    # ---------- entrada ----------
+
+    def log(self, user_id, event_name: str, meta_json: str, created_at: str):
+        row = (user_id, event_name, meta_json, created_at)
+        critical = event_name in CRITICAL_EVENTS
+
+        with self._cond:
+            n = len(self._buf)
+            if not critical and n >= self.max_buffer * _HIGH_WATER and random.random() >= self.sample_rate:
+                self._stats["sampled_out"] += 1
+                return
+            if n >= self.max_buffer:
+                if not critical:
+                    self._stats["dropped"] += 1
+                    return
+                # "error" entra no lugar do evento mais antigo
+                self._buf.popleft()
+                self._stats["dropped"] += 1
+            self._buf.append(row)
+            self._stats["logged"] += 1
+            if len(self._buf) >= self.batch_size:
+                self._cond.notify()
+
+        self._ensure_thread()
+
+    # ---------- gravação ----------
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._cond:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-logger", daemon=True)
+            self._thread.start()
+
+    def _take(self, n: int) -> list:
+        with self._cond:
+            batch = []
+            while self._buf and len(batch) < n:
+                batch.append(self._buf.popleft())
+            return batch
+
+    def _write(self, batch: list) -> bool:
+        try:
+            self._writer(batch)
+        except Exception:
+            self._spool(batch)
+            return False
+        self._stats["written"] += len(batch)
+        return True
+
+    def _spool(self, batch: list):
+        try:
+            self.spool_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.spool_path, "a", encoding="utf-8") as f:
+                for row in batch:
+                    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+            self._stats["spooled"] += len(batch)
+        except OSError:
+            self._stats["dropped"] += len(batch)
+
+    def _replay_spool(self):
+        if not self.spool_path.exists():
+            return
+        tmp = self.spool_path.with_suffix(".replaying")
+        try:
+            self.spool_path.replace(tmp)
+        except OSError:
+            return
+        with open(tmp, encoding="utf-8") as f:
+            rows = [tuple(json.loads(line)) for line in f if line.strip()]
+        for i in range(0, len(rows), self.batch_size):
+            chunk = rows[i:i + self.batch_size]
+            try:
+                self._writer(chunk)
+            except Exception:
+                # banco caiu de novo: devolve o que faltou para o spool
+                self._spool(rows[i:])
+                break
+            self._stats["replayed"] += len(chunk)
+        tmp.unlink(missing_ok=True)
+
+    def flush(self):
+        """Grava tudo o que está na fila agora (bloqueia)."""
+        with self._write_lock:
+            ok = True
+            while True:
+                batch = self._take(self.batch_size)
+                if not batch:
+                    break
+                ok = self._write(batch) and ok
+            if ok:
+                self._replay_spool()
+
+    def _run(self):
+        last_flush = time.monotonic()
+        while True:
+            with self._cond:
+                while not self._stopping and len(self._buf) < self.batch_size:
+                    remaining = self.flush_interval - (time.monotonic() - last_flush)
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                stopping = self._stopping
+            self.flush()
+            last_flush = time.monotonic()
+            if stopping:
+                return
+            event_store.maybe_maintain()
+
+    def close(self, timeout: float = 5.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        t = self._thread
+        if t is not None and t.is_alive():
+            t.join(timeout)
+        self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, buffered=len(self._buf))
+
+
+_logger = None
+_logger_lock = threading.Lock()
+
+def get_event_logger() -> EventLogger:
+    global _logger
+    if _logger is None:
+        with _logger_lock:
+            if _logger is None:
+                _logger = EventLogger()
+                atexit.register(_logger.close)
+    return _logger
@@ -0,0 +1,398 @@
+"""
+Manutenção do event_logs: a tabela "quente" fica do mesmo tamanho e o histórico de uso fica.
+
+- Postgres: event_logs é particionada por mês (RANGE em created_at, criada pela migration 7);
+  as partições dos próximos meses são criadas com antecedência
+- SQLite: rotação — event_logs guarda só o mês corrente; os meses anteriores vão para
+  tabelas event_logs_AAAA_MM
+- rollups diários (ROLLUPS: event_daily, error_daily, feedback_daily): cada execução
+  recalcula os dias desde a marca do rollup em app_meta (mais EVENT_ROLLUP_LOOKBACK_DAYS
+  de folga, para eventos que chegam atrasados do spool do event_logger)
+- retenção: meses de eventos crus mais velhos que EVENT_RETENTION_MONTHS são apagados
+  inteiros (DROP da partição/tabela do mês, sem DELETE linha a linha); os rollups ficam.
+  EVENT_RETENTION_MONTHS=0 guarda tudo.
+
+Roda sozinha pela thread do event_logger (no máximo a cada EVENT_MAINTENANCE_INTERVAL
+segundos) ou pela linha de comando:
+
+    python -m utils.event_store maintain
+    python -m utils.event_store status
+
+Dias e meses são em UTC (created_at vem de datetime.utcnow()).
+"""
+import os
+import re
+import sys
+import time
+import threading
+from datetime import date, datetime, timedelta
+
+from utils import db
+
+RETENTION_MONTHS = int(os.getenv("EVENT_RETENTION_MONTHS", "13"))
+PARTITIONS_AHEAD = int(os.getenv("EVENT_PARTITIONS_AHEAD", "2"))
+ROLLUP_LOOKBACK_DAYS = int(os.getenv("EVENT_ROLLUP_LOOKBACK_DAYS", "2"))
+MAINTENANCE_INTERVAL = float(os.getenv("EVENT_MAINTENANCE_INTERVAL", "3600"))  # 0 = só pelo comando
+
+# chave do pg_try_advisory_xact_lock: uma réplica por vez faz a manutenção
+MAINTENANCE_LOCK_KEY = 7_142_002
+
+ROLLUP_META_KEY = "event_rollup_day"
+
+_MONTH_TABLE_RE = re.compile(r"^event_logs_(\d{4})_(\d{2})$")
+
+
+# --------------------------------------------------
+# Datas
+# --------------------------------------------------
+
+def _today() -> date:
+    return datetime.utcnow().date()
+
+def _month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def _add_months(d: date, n: int) -> date:
+    m = d.year * 12 + (d.month - 1) + n
+    return date(m // 12, m % 12 + 1, 1)
+
+def month_table(month: date) -> str:
+    return f"event_logs_{month:%Y_%m}"
+
+def _ph() -> str:
+    return "%s" if db.USE_POSTGRES else "?"
+
+
+# --------------------------------------------------
+# Tabelas por mês (partições no Postgres, arquivo no SQLite)
+# --------------------------------------------------
+
+def month_tables(cur) -> dict[date, str]:
+    """{primeiro dia do mês: nome da tabela} das tabelas/partições mensais existentes."""
+    if db.USE_POSTGRES:
+        cur.execute("""
+            SELECT c.relname AS name
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_class p ON p.oid = i.inhparent
+            WHERE p.relname = 'event_logs'
+        """)
+        names = [r["name"] for r in cur.fetchall()]
+    else:
+        cur.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 'event_logs_%'")
+        names = [r[0] for r in cur.fetchall()]
+
+    out = {}
+    for name in names:
+        m = _MONTH_TABLE_RE.match(name)
+        if m:
+            out[date(int(m.group(1)), int(m.group(2)), 1)] = name
+    return out
+
+def create_partition(cur, month: date):
+    """
+    Postgres: partição do mês. Cria a tabela solta, traz o que tiver caído na partição
+    default nesse intervalo e só então faz o ATTACH (criar direto com PARTITION OF falharia
+    se a default já tivesse linhas do mês).
+    """
+    name = month_table(month)
+    lo, hi = month.isoformat(), _add_months(month, 1).isoformat()
+    cur.execute(f"CREATE TABLE {name} (LIKE event_logs INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    cur.execute(f"""
+        INSERT INTO {name} SELECT * FROM event_logs_default
+        WHERE created_at >= %s AND created_at < %s
+    """, (lo, hi))
+    cur.execute("DELETE FROM event_logs_default WHERE created_at >= %s AND created_at < %s", (lo, hi))
+    cur.execute(f"ALTER TABLE event_logs ATTACH PARTITION {name} FOR VALUES FROM ('{lo}') TO ('{hi}')")
+
+def ensure_partitions(cur, today: date | None = None, months=()):
+    """Postgres: partições do mês corrente + PARTITIONS_AHEAD meses (e dos `months` pedidos)."""
+    current = _month_start(today or _today())
+    wanted = {_add_months(current, i) for i in range(PARTITIONS_AHEAD + 1)} | set(months)
+    existing = month_tables(cur)
+    for month in sorted(wanted):
+        if month not in existing:
+            create_partition(cur, month)
+
+def _create_archive_table(cur, name: str):
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS {name} (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            event_name TEXT NOT NULL,
+            meta TEXT,
+            created_at TEXT
+        )
+    """)
+
+def rotate_sqlite(cur, today: date | None = None) -> int:
+    """SQLite: tira de event_logs tudo o que é de meses anteriores. Retorna linhas movidas."""
+    current = _month_start(today or _today()).isoformat()
+    cur.execute("SELECT DISTINCT substr(created_at, 1, 7) FROM event_logs WHERE created_at < ?", (current,))
+    months = []
+    for (ym,) in cur.fetchall():
+        try:
+            months.append(date(int(ym[:4]), int(ym[5:7]), 1))
+        except (TypeError, ValueError):
+            continue
+
+    moved = 0
+    for month in sorted(months):
+        name = month_table(month)
+        _create_archive_table(cur, name)
+        cur.execute(f"""
+            INSERT OR REPLACE INTO {name} (id, user_id, event_name, meta, created_at)
+            SELECT id, user_id, event_name, meta, created_at FROM event_logs
+            WHERE created_at >= ? AND created_at < ?
+        """, (month.isoformat(), _add_months(month, 1).isoformat()))
+        moved += cur.rowcount
+    if months:
+        # o que sobrar com data estranha (antes do mês corrente, mas fora do padrão) fica
+        cur.execute("""
+            DELETE FROM event_logs
+            WHERE created_at >= ? AND created_at < ?
+        """, (min(months).isoformat(), current))
+    return moved
+
+
+# --------------------------------------------------
+# Rollups diários
+# --------------------------------------------------
+
+def _json_text(col: str, key: str) -> str:
+    if db.USE_POSTGRES:
+        return f"({col}::json ->> '{key}')"
+    return f"json_extract({col}, '$.{key}')"
+
+
+class DailyRollup:
+    """
+    Agregado por dia, recalculado a partir da própria marca em app_meta (último dia fechado).
+    `select` é o SELECT que gera as linhas da tabela; {src} é trocado pela origem já
+    filtrada pelo intervalo de dias (colunas user_id, event_name, meta, created_at para
+    eventos; as do feedback para feedback).
+    """
+    def __init__(self, table: str, columns: str, meta_key: str, source: str, select: str):
+        self.table = table
+        self.columns = columns
+        self.meta_key = meta_key
+        self.source = source            # "events" | "feedback"
+        self.select = select
+
+    def __repr__(self):
+        return f"<DailyRollup {self.table}>"
+
+
+ROLLUPS = [
+    DailyRollup(
+        "event_daily", "day, user_id, event_name, n", ROLLUP_META_KEY, "events",
+        """
+        SELECT substr(created_at, 1, 10), COALESCE(user_id, 0), event_name, COUNT(*)
+        FROM {src} e
+        GROUP BY substr(created_at, 1, 10), COALESCE(user_id, 0), event_name
+        """,
+    ),
+    # erros por página/ação, do meta dos eventos "error"
+    DailyRollup(
+        "error_daily", "day, page, action, n", "error_rollup_day", "events",
+        f"""
+        SELECT substr(created_at, 1, 10),
+               COALESCE({_json_text("meta", "page")}, ''),
+               COALESCE({_json_text("meta", "action")}, ''),
+               COUNT(*)
+        FROM {{src}} e
+        WHERE event_name = 'error'
+        GROUP BY 1, 2, 3
+        """,
+    ),
+    # notas do feedback (sem nota → -1)
+    DailyRollup(
+        "feedback_daily", "day, page, rating, n", "feedback_rollup_day", "feedback",
+        """
+        SELECT substr(created_at, 1, 10), COALESCE(page, ''), COALESCE(rating, -1), COUNT(*)
+        FROM {src} f
+        GROUP BY 1, 2, 3
+        """,
+    ),
+]
+
+
+def _event_sources(cur, start: date, end: date) -> list[str]:
+    if db.USE_POSTGRES:
+        return ["event_logs"]      # as partições fora do intervalo são podadas pelo planner
+    tables = ["event_logs"]
+    for month, name in month_tables(cur).items():
+        if month < end and _add_months(month, 1) > start:
+            tables.append(name)
+    return tables
+
+def _source_sql(cur, r: DailyRollup, start: date, end: date) -> tuple[str, tuple]:
+    """Subquery da origem do rollup entre start e end (exclusivo) + parâmetros."""
+    ph = _ph()
+    lo, hi = start.isoformat(), end.isoformat()
+    if r.source == "feedback":
+        return f"(SELECT * FROM feedback WHERE created_at >= {ph} AND created_at < {ph})", (lo, hi)
+    tables = _event_sources(cur, start, end)
+    union = " UNION ALL ".join(
+        f"SELECT user_id, event_name, meta, created_at FROM {t} WHERE created_at >= {ph} AND created_at < {ph}"
+        for t in tables
+    )
+    return f"({union})", (lo, hi) * len(tables)
+
+def _oldest_day(cur, r: DailyRollup) -> date | None:
+    tables = ["feedback"] if r.source == "feedback" else _event_sources(cur, date.min, date.max)
+    oldest = []
+    for t in tables:
+        cur.execute(f"SELECT MIN(created_at) FROM {t}")
+        v = db._scalar(cur.fetchone())
+        if v:
+            oldest.append(v)
+    return date.fromisoformat(min(oldest)[:10]) if oldest else None
+
+def rolled_until(cur, r: DailyRollup) -> date | None:
+    """Último dia fechado do rollup (None se nunca rodou)."""
+    last = db._scalar(db.Q.run(cur, "meta.get", (r.meta_key,)).fetchone())
+    return date.fromisoformat(last) if last else None
+
+def refresh_rollup(cur, r: DailyRollup, today: date | None = None) -> dict:
+    """
+    Recalcula os dias fechados (até ontem) ainda não consolidados, mais
+    ROLLUP_LOOKBACK_DAYS de folga. Idempotente: cada dia é apagado e contado de novo.
+    """
+    ph = _ph()
+    today = today or _today()
+    yesterday = today - timedelta(days=1)
+
+    last = rolled_until(cur, r)
+    if last:
+        start = min(last + timedelta(days=1), today - timedelta(days=ROLLUP_LOOKBACK_DAYS))
+    else:
+        start = _oldest_day(cur, r) or today      # primeira vez: desde a linha mais antiga
+
+    rows = 0
+    if start < today:
+        src, params = _source_sql(cur, r, start, today)
+        cur.execute(f"DELETE FROM {r.table} WHERE day >= {ph} AND day < {ph}", (start.isoformat(), today.isoformat()))
+        cur.execute(f"INSERT INTO {r.table} ({r.columns}) {r.select.format(src=src)}", params)
+        rows = cur.rowcount
+    db.Q.run(cur, "meta.set", (r.meta_key, yesterday.isoformat()))
+    return {"from": start.isoformat() if start < today else None, "rows": rows}
+
+def rollup(cur, today: date | None = None) -> dict:
+    return {r.table: refresh_rollup(cur, r, today) for r in ROLLUPS}
+
+
+# --------------------------------------------------
+# Retenção
+# --------------------------------------------------
+
+def apply_retention(cur, today: date | None = None) -> list[str]:
+    """Apaga os meses de eventos crus fora da retenção (só os que o rollup já cobriu)."""
+    if RETENTION_MONTHS <= 0:
+        return []
+    today = today or _today()
+    cutoff = _add_months(_month_start(today), -RETENTION_MONTHS)
+
+    # só o que todos os rollups de eventos já cobriram
+    marks = [rolled_until(cur, r) for r in ROLLUPS if r.source == "events"]
+    covered = min(marks) + timedelta(days=1) if all(marks) else date.min
+
+    dropped = []
+    for month, name in sorted(month_tables(cur).items()):
+        end = _add_months(month, 1)
+        if end <= cutoff and end <= covered:
+            if db.USE_POSTGRES:
+                cur.execute(f"ALTER TABLE event_logs DETACH PARTITION {name}")
+            cur.execute(f"DROP TABLE {name}")
+            dropped.append(name)
+
+    if db.USE_POSTGRES and cutoff <= covered:
+        # sobras antigas na partição default (datas fora de qualquer partição)
+        cur.execute("DELETE FROM event_logs_default WHERE created_at < %s", (cutoff.isoformat(),))
+    return dropped
+
+
+# --------------------------------------------------
+# Execução
+# --------------------------------------------------
+
+def maintain(today: date | None = None) -> dict:
+    """Rollup + partições/rotação + retenção, numa transação. Seguro rodar em paralelo."""
+    today = today or _today()
+    with db.get_conn() as conn:
+        cur = conn.cursor()
+        if db.USE_POSTGRES:
+            cur.execute("SELECT pg_try_advisory_xact_lock(%s) AS ok", (MAINTENANCE_LOCK_KEY,))
+            if not cur.fetchone()["ok"]:
+                return {"skipped": True}
+            ensure_partitions(cur, today)
+            result = {"rollup": rollup(cur, today)}
+        else:
+            # rollup antes da rotação: os dias de folga ainda estão na tabela quente
+            result = {"rollup": rollup(cur, today), "rotated": rotate_sqlite(cur, today)}
+        result["dropped"] = apply_retention(cur, today)
+    return result
+
+_last_auto_run = None
+_auto_lock = threading.Lock()
+
+def maybe_maintain():
+    """Chamado pela thread do event_logger; roda no máximo a cada MAINTENANCE_INTERVAL segundos."""
+    global _last_auto_run
+    if MAINTENANCE_INTERVAL <= 0:
+        return
+    with _auto_lock:
+        now = time.monotonic()
+        if _last_auto_run is not None and now - _last_auto_run < MAINTENANCE_INTERVAL:
+            return
+        _last_auto_run = now
+    try:
+        maintain()
+    except Exception as e:
+        print(f"[event_store] manutenção falhou: {e!r}", file=sys.stderr)
+
+def status() -> dict:
+    with db.get_conn(readonly=True) as conn:
+        cur = conn.cursor()
+        tables = month_tables(cur)
+        counts = {}
+        for month, name in sorted(tables.items()):
+            cur.execute(f"SELECT COUNT(*) FROM {name}")
+            counts[name] = int(db._scalar(cur.fetchone()) or 0)
+        if not db.USE_POSTGRES:
+            cur.execute("SELECT COUNT(*) FROM event_logs")
+            counts["event_logs"] = int(db._scalar(cur.fetchone()) or 0)
+        rollups = {}
+        for r in ROLLUPS:
+            cur.execute(f"SELECT COUNT(*) FROM {r.table}")
+            n = int(db._scalar(cur.fetchone()) or 0)
+            last = rolled_until(cur, r)
+            rollups[r.table] = {"rows": n, "until": last.isoformat() if last else None}
+    return {"tables": counts, "rollups": rollups, "retention_months": RETENTION_MONTHS}
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "status"
+
+    if cmd == "maintain":
+        print(maintain())
+    elif cmd == "status":
+        s = status()
+        for table, r in s["rollups"].items():
+            print(f"{table}: {r['rows']} linhas, até {r['until'] or '—'}")
+        print(f"Retenção: {s['retention_months'] or 'sem limite'} meses")
+        for name, n in s["tables"].items():
+            print(f"   {name}: {n}")
+    else:
+        print("uso: python -m utils.event_store [maintain|status]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
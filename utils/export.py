@@ -0,0 +1,360 @@
+"""
+Exportação de todos os dados de uma nutricionista: pacientes, avaliações, dietas, itens
+das refeições e agenda, um arquivo por tabela (CSV, Parquet ou XLSX) dentro de um .zip.
+
+    for chunk in iter_export(user_id, "csv"):      # bytes do .zip, lote a lote
+        response.write(chunk)
+
+    python -m utils.export email@x.com csv > dados.zip
+    python -m utils.export --cleanup                  # cron: apaga exportações vencidas
+
+Gerar o .zip não cresce a memória com o tamanho do consultório: cada tabela é lida com
+Q.stream (cursor do servidor no Postgres, fetchmany no SQLite), cada lote vai direto para
+o destino e o .zip é escrito sem seek. O XLSX é a exceção: o openpyxl (write_only) junta
+as linhas em arquivo temporário no disco e só monta a planilha no fim de cada tabela.
+
+Só a CLI entrega em streaming de verdade. A página grava o .zip em EXPORT_DIR e o
+st.download_button lê o arquivo inteiro para a memória do servidor, então lá o tamanho
+é limitado por EXPORT_MAX_MB (acima disso, use a CLI) e o arquivo é apagado depois de
+EXPORT_TTL_HOURS (dados de pacientes não ficam largados no disco).
+"""
+import io
+import os
+import sys
+import csv
+import time
+import zipfile
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+
+from utils.db import Q, get_conn, get_user_by_email, ASSESSMENT_FIELDS, DIET_FIELDS
+
+EXPORT_FORMATS = ("csv", "parquet", "xlsx")
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "2000"))
+XLSX_MAX_ROWS = 1_048_575   # limite do Excel por aba (fora o cabeçalho)
+EXPORT_DIR = Path(os.getenv("EXPORT_DIR", str(Path("data") / "exports")))
+EXPORT_MAX_MB = float(os.getenv("EXPORT_MAX_MB", "200"))      # só para export_to_file (página)
+EXPORT_TTL_HOURS = float(os.getenv("EXPORT_TTL_HOURS", "24"))
+
+
+class ExportTooLarge(RuntimeError):
+    """O .zip passou de EXPORT_MAX_MB (a página não consegue servir sem carregar tudo)."""
+
+_NUMBERS = {
+    "peso", "altura_cm", "cintura_cm", "quadril_cm", "pescoco_cm", "bf_usnavy_pct", "sono_h",
+    "bmr", "tdee", "calorias_alvo", "p_gkg", "fat_pct", "proteina_g", "carbo_g", "gordura_g", "grams",
+}
+_INTEGERS = {"id", "patient_id", "diet_id", "food_id"}
+
+
+class Export:
+    def __init__(self, table: str, columns: tuple, sql: str):
+        self.table = table
+        self.columns = columns
+        self.statement = f"export.{table}"
+        Q.define(self.statement, sql)
+
+    def kind(self, column: str) -> str:
+        if column in _INTEGERS:
+            return "int"
+        return "float" if column in _NUMBERS else "str"
+
+
+def _export(table: str, columns: tuple, select: str | None = None, order: str = "id") -> Export:
+    # SELECT das colunas da própria tabela, só do usuário, em ordem estável
+    select = select or f"SELECT {', '.join(columns)} FROM {table} WHERE user_id = ?"
+    return Export(table, columns, f"{select} ORDER BY {order}")
+
+EXPORTS = (
+    _export("patients", ("id", "nome", "telefone", "email", "nascimento", "sexo", "obs")),
+    _export("assessments", ("id", "patient_id", *ASSESSMENT_FIELDS)),
+    _export("diets", ("id", "patient_id", *DIET_FIELDS)),
+    # nome do alimento junto: o food_id sozinho não diz nada fora do app
+    _export("diet_items", ("id", "patient_id", "diet_id", "meal", "food_id", "alimento", "grams", "created_at"), """
+        SELECT di.id, di.patient_id, di.diet_id, di.meal, di.food_id, f.nome AS alimento, di.grams, di.created_at
+        FROM diet_items di
+        LEFT JOIN foods f ON f.id = di.food_id
+        WHERE di.user_id = ?
+    """, order="di.id"),
+    _export("appointments", ("id", "patient_id", "dt_iso", "tipo", "notas")),
+)
+
+
+# --------------------------------------------------
+# Escritores (um arquivo por tabela)
+# --------------------------------------------------
+
+def _value(kind: str, v):
+    if v is None or v == "":
+        return None
+    try:
+        if kind == "int":
+            return int(v)
+        if kind == "float":
+            return float(v)
+    except (TypeError, ValueError):
+        return None     # lixo antigo em coluna numérica do SQLite
+    return str(v)
+
+
+class CsvWriter:
+    def __init__(self, fp, export: Export):
+        # BOM: o Excel só acerta os acentos do UTF-8 com ele
+        self._text = io.TextIOWrapper(fp, encoding="utf-8-sig", newline="")
+        self._csv = csv.writer(self._text)
+        self._csv.writerow(export.columns)
+        self._columns = export.columns
+
+    def write(self, rows):
+        self._csv.writerows([r[c] for c in self._columns] for r in rows)
+        self._text.flush()
+
+    def close(self):
+        self._text.flush()
+        self._text.detach()
+
+
+class _Position:
+    # o pyarrow pergunta tell() ao arquivo; a entrada do zip sem seek não sabe responder
+    def __init__(self, fp):
+        self._fp = fp
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data):
+        n = self._fp.write(data)
+        self._pos += len(data)
+        return n
+
+    def tell(self):
+        return self._pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class ParquetWriter:
+    """Um row group por lote — nunca a tabela inteira em memória."""
+
+    def __init__(self, fp, export: Export):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        types = {"int": pa.int64(), "float": pa.float64(), "str": pa.string()}
+        self._pa = pa
+        self._kinds = [(c, export.kind(c)) for c in export.columns]
+        self._schema = pa.schema([(c, types[k]) for c, k in self._kinds])
+        self._writer = pq.ParquetWriter(_Position(fp), self._schema, compression="snappy")
+
+    def write(self, rows):
+        columns = [[_value(k, r[c]) for r in rows] for c, k in self._kinds]
+        self._writer.write_table(self._pa.Table.from_arrays(
+            [self._pa.array(col, type=field.type) for col, field in zip(columns, self._schema)],
+            schema=self._schema,
+        ))
+
+    def close(self):
+        self._writer.close()
+
+
+class XlsxWriter:
+    """
+    openpyxl em modo write_only: as linhas vão para arquivo temporário, não para a memória.
+    Passou de XLSX_MAX_ROWS, continua numa aba nova (patients_2, ...).
+    """
+
+    def __init__(self, fp, export: Export):
+        from openpyxl import Workbook
+        from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+        self._fp = fp
+        self._export = export
+        self._kinds = [(c, export.kind(c)) for c in export.columns]
+        self._illegal = ILLEGAL_CHARACTERS_RE
+        self._wb = Workbook(write_only=True)
+        self._sheets = 0
+        self._new_sheet()
+
+    def _new_sheet(self):
+        self._sheets += 1
+        name = self._export.table if self._sheets == 1 else f"{self._export.table}_{self._sheets}"
+        self._ws = self._wb.create_sheet(name)
+        self._ws.append(list(self._export.columns))
+        self._rows = 0
+
+    def _cell(self, kind, v):
+        v = _value(kind, v)
+        # caractere de controle em texto livre (obs, notas) derruba o openpyxl
+        return self._illegal.sub("", v) if isinstance(v, str) else v
+
+    def write(self, rows):
+        for r in rows:
+            if self._rows >= XLSX_MAX_ROWS:
+                self._new_sheet()
+            self._ws.append([self._cell(k, r[c]) for c, k in self._kinds])
+            self._rows += 1
+
+    def close(self):
+        self._wb.save(self._fp)
+
+
+WRITERS = {"csv": CsvWriter, "parquet": ParquetWriter, "xlsx": XlsxWriter}
+
+
+# --------------------------------------------------
+# Exportação
+# --------------------------------------------------
+
+class _Pipe(io.RawIOBase):
+    """Destino do zip: guarda o que foi escrito até alguém buscar (sem seek, sem tell)."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def take(self) -> bytes:
+        out = b"".join(self._chunks)
+        self._chunks.clear()
+        return out
+
+
+def export_filename(fmt: str) -> str:
+    return f"nutriapp-export-{datetime.now().strftime('%Y%m%d-%H%M')}-{fmt}.zip"
+
+def iter_export(user_id, fmt: str = "csv", batch: int = EXPORT_BATCH, progress=None):
+    """
+    Gera os bytes do .zip conforme as tabelas são lidas.
+    progress(tabela, linhas_até_agora) é chamado a cada lote (barra de progresso da página).
+    Tudo numa conexão só, aberta até o último byte — quem consome deve ir até o fim (ou fechar o gerador).
+    """
+    if fmt not in WRITERS:
+        raise ValueError(f"formato desconhecido: {fmt} (use {', '.join(EXPORT_FORMATS)})")
+    pipe = _Pipe()
+    with get_conn(readonly=True) as conn, zipfile.ZipFile(pipe, "w", zipfile.ZIP_DEFLATED) as zf:
+        for export in EXPORTS:
+            info = zipfile.ZipInfo(f"{export.table}.{fmt}", date_time=datetime.now().timetuple()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            # force_zip64: sem seek o tamanho não é conhecido antes, e pode passar de 2 GB
+            with zf.open(info, "w", force_zip64=True) as entry:
+                writer = WRITERS[fmt](entry, export)
+                n = 0
+                if progress:
+                    progress(export.table, n)
+                with closing(Q.stream(conn, export.statement, (user_id,), batch=batch)) as batches:
+                    for rows in batches:
+                        writer.write(rows)
+                        n += len(rows)
+                        if progress:
+                            progress(export.table, n)
+                        yield pipe.take()
+                writer.close()
+            yield pipe.take()
+    yield pipe.take()
+
+def write_export(user_id, fp, fmt: str = "csv", batch: int = EXPORT_BATCH, progress=None,
+                 max_bytes: int | None = None) -> int:
+    """
+    Escreve o .zip em `fp` (arquivo, socket, stdout...). Devolve o total de bytes.
+    Com max_bytes, para com ExportTooLarge assim que passar (o que já foi escrito fica incompleto).
+    """
+    total = 0
+    with closing(iter_export(user_id, fmt, batch=batch, progress=progress)) as chunks:
+        for chunk in chunks:
+            if chunk:
+                fp.write(chunk)
+                total += len(chunk)
+                if max_bytes is not None and total > max_bytes:
+                    raise ExportTooLarge(f"exportação passou de {max_bytes / 1024 / 1024:.0f} MB")
+    return total
+
+
+def export_to_file(user_id, fmt: str = "csv", progress=None, max_mb: float = EXPORT_MAX_MB) -> Path:
+    """
+    Grava em EXPORT_DIR/<user_id>/ e devolve o caminho (a página oferece o download dele).
+    Fica só a última exportação de cada usuário; a nova vai para .part e só troca no fim.
+    Passou de max_mb: ExportTooLarge e nada fica no disco.
+    """
+    cleanup_exports()
+    folder = EXPORT_DIR / str(user_id)
+    folder.mkdir(parents=True, exist_ok=True)
+    path = folder / export_filename(fmt)
+    tmp = path.with_suffix(".part")
+    try:
+        with open(tmp, "wb") as f:
+            write_export(user_id, f, fmt, progress=progress, max_bytes=int(max_mb * 1024 * 1024))
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    for old in folder.glob("*.zip"):
+        old.unlink(missing_ok=True)
+    tmp.replace(path)
+    return path
+
+def latest_export(user_id) -> Path | None:
+    files = sorted((EXPORT_DIR / str(user_id)).glob("*.zip"))
+    return files[-1] if files else None
+
+def cleanup_exports(ttl_hours: float = EXPORT_TTL_HOURS) -> list[Path]:
+    """Apaga exportações (e .part largados) mais velhas que ttl_hours. Devolve o que apagou."""
+    if ttl_hours <= 0 or not EXPORT_DIR.exists():
+        return []
+    cutoff = time.time() - ttl_hours * 3600
+    removed = []
+    for folder in EXPORT_DIR.iterdir():
+        if not folder.is_dir():
+            continue
+        for path in list(folder.glob("*.zip")) + list(folder.glob("*.part")):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+                    removed.append(path)
+            except FileNotFoundError:
+                pass    # outra sessão apagou antes
+        try:
+            folder.rmdir()  # só se ficou vazia
+        except OSError:
+            pass
+    return removed
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    if argv == ["--cleanup"]:
+        # para o cron: apaga o que passou de EXPORT_TTL_HOURS mesmo sem ninguém abrir a página
+        removed = cleanup_exports()
+        print(f"{len(removed)} exportação(ões) apagada(s)", file=sys.stderr)
+        return 0
+    if not argv or len(argv) > 2 or (len(argv) == 2 and argv[1] not in EXPORT_FORMATS):
+        print(f"uso: python -m utils.export EMAIL [{'|'.join(EXPORT_FORMATS)}] > dados.zip", file=sys.stderr)
+        print("     python -m utils.export --cleanup", file=sys.stderr)
+        return 2
+    user = get_user_by_email(argv[0])
+    if not user:
+        print(f"usuário não encontrado: {argv[0]}", file=sys.stderr)
+        return 1
+    if sys.stdout.isatty():
+        print("redirecione a saída para um arquivo (> dados.zip)", file=sys.stderr)
+        return 2
+    fmt = argv[1] if len(argv) == 2 else "csv"
+    total = write_export(user["id"], sys.stdout.buffer, fmt)
+    sys.stdout.buffer.flush()
+    print(f"{total / 1024:.0f} KB", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Catálogo de alimentos em memória (um por processo).
+
+A tabela foods é pequena, global e quase nunca muda, então a busca de digitação
+(pages/6_TACO.py e pages/7_montar_refeicoes.py) roda aqui e não no banco:
+
+    from utils.food_catalog import get_catalog
+    get_catalog().search("feijao")      # prefixo, trecho e erro de digitação
+    get_catalog().get_food(food_id)
+
+O catálogo confere o carimbo app_meta.foods_version no máximo a cada
+FOOD_CATALOG_CHECK_INTERVAL segundos e se recarrega sozinho depois de um import.
+"""
+import os
+import re
+import time
+import threading
+
+from utils import db
+
+CHECK_INTERVAL = float(os.getenv("FOOD_CATALOG_CHECK_INTERVAL", "5"))
+
+_WORD_RE = re.compile(r"\w+")
+
+# pontuação por palavra da busca
+_SCORE_PREFIX = 3.0
+_SCORE_SUBSTRING = 2.0
+_SCORE_FUZZY = 1.0
+
+
+def _trigrams(text: str) -> set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+def _padded(word: str) -> str:
+    # "$$" no começo e "$" no fim: prefixo e fim de palavra também viram trigramas
+    return f"$${word}$"
+
+def _max_edits(token: str) -> int:
+    # palavra curta com 2 erros vira outra palavra ("arroz" ~ "ervas"), então escala com o tamanho
+    if len(token) < 4:
+        return 0
+    if len(token) < 8:
+        return 1
+    return 2
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    """
+    Distância de edição com troca de vizinhas ("frnago" -> "frango" = 1).
+    Para assim que passar do limite (devolve limit+1).
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    prev2 = None
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            v = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb))
+            if prev2 is not None and j > 1 and ca == b[j - 2] and a[i - 2] == cb:
+                v = min(v, prev2[j - 2] + 1)
+            cur.append(v)
+        if min(cur) > limit:
+            return limit + 1
+        prev2, prev = prev, cur
+    return prev[-1]
+
+
+class _Index:
+    """Estrutura imutável; o catálogo troca a referência inteira ao recarregar."""
+
+    def __init__(self, foods: list[dict], version):
+        self.version = version
+        self.foods = foods
+        self.by_id = {f["id"]: f for f in foods}
+        self.folded = [db.fold_text(f.get("nome")) for f in foods]
+
+        self.words: list[str] = []                  # vocabulário (palavras únicas)
+        self.word_foods: list[set[int]] = []        # palavra -> posições em self.foods
+        self.gram_words: dict[str, set[int]] = {}   # trigrama (com padding) -> palavras
+
+        word_pos: dict[str, int] = {}
+        for i, name in enumerate(self.folded):
+            for w in _WORD_RE.findall(name):
+                wi = word_pos.get(w)
+                if wi is None:
+                    wi = word_pos[w] = len(self.words)
+                    self.words.append(w)
+                    self.word_foods.append(set())
+                    for g in _trigrams(_padded(w)):
+                        self.gram_words.setdefault(g, set()).add(wi)
+                self.word_foods[wi].add(i)
+
+    def _words_containing(self, token: str) -> set[int]:
+        if len(token) < 3:
+            # curto demais para trigrama: varre o vocabulário (alguns milhares de palavras)
+            return {wi for wi, w in enumerate(self.words) if token in w}
+        grams = _trigrams(token) or {token}
+        postings = sorted((self.gram_words.get(g, set()) for g in grams), key=len)
+        cand = set(postings[0])
+        for p in postings[1:]:
+            cand &= p
+            if not cand:
+                break
+        return {wi for wi in cand if token in self.words[wi]}
+
+    def _words_fuzzy(self, token: str, skip: set[int]) -> dict[int, int]:
+        k = _max_edits(token)
+        if not k:
+            return {}
+        grams = _trigrams(_padded(token))
+        counts: dict[int, int] = {}
+        for g in grams:
+            for wi in self.gram_words.get(g, ()):
+                counts[wi] = counts.get(wi, 0) + 1
+        # cada edição destrói no máximo 3 trigramas (troca de vizinhas, 4)
+        need = max(1, len(grams) - 4 * k)
+        out = {}
+        for wi, c in counts.items():
+            if c < need or wi in skip:
+                continue
+            d = _edit_distance(token, self.words[wi], k)
+            if d <= k:
+                out[wi] = d
+        return out
+
+    def search(self, query: str, limit: int) -> list[dict]:
+        folded_q = db.fold_text(query)
+        tokens = _WORD_RE.findall(folded_q)
+        if not tokens:
+            return []
+
+        total: dict[int, float] | None = None
+        for tok in tokens:
+            scores: dict[int, float] = {}
+            exact = self._words_containing(tok)
+            for wi in exact:
+                s = _SCORE_PREFIX if self.words[wi].startswith(tok) else _SCORE_SUBSTRING
+                for fi in self.word_foods[wi]:
+                    if s > scores.get(fi, 0):
+                        scores[fi] = s
+            for wi, d in self._words_fuzzy(tok, exact).items():
+                s = _SCORE_FUZZY - 0.25 * d
+                for fi in self.word_foods[wi]:
+                    if s > scores.get(fi, 0):
+                        scores[fi] = s
+
+            # todas as palavras da busca precisam bater (AND)
+            if total is None:
+                total = scores
+            else:
+                total = {fi: total[fi] + s for fi, s in scores.items() if fi in total}
+            if not total:
+                return []
+
+        def rank(fi):
+            name = self.folded[fi]
+            return (-total[fi], not name.startswith(folded_q), len(name), name)
+
+        best = sorted(total, key=rank)[:limit]
+        return [dict(self.foods[fi]) for fi in best]
+
+
+class FoodCatalog:
+    def __init__(self, loader=None, version_fn=None, check_interval: float = CHECK_INTERVAL):
+        self._loader = loader or db.list_all_foods
+        self._version_fn = version_fn or db.get_foods_version
+        self.check_interval = check_interval
+        self._index: _Index | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self, force: bool = False):
+        """Recarrega se o carimbo mudou (ou sempre, com force=True)."""
+        with self._lock:
+            self._refresh_locked(force)
+
+    def _refresh_locked(self, force: bool = False):
+        version = self._version_fn()
+        self._checked_at = time.monotonic()
+        if force or self._index is None or self._index.version != version:
+            self._index = _Index(self._loader(), version)
+
+    def invalidate(self):
+        """Força a conferência do carimbo na próxima consulta."""
+        self._checked_at = 0.0
+
+    def _stale(self) -> bool:
+        return self._index is None or (time.monotonic() - self._checked_at) > self.check_interval
+
+    def _current(self) -> _Index:
+        if self._stale():
+            with self._lock:
+                # outra thread pode ter acabado de conferir enquanto a gente esperava
+                if self._stale():
+                    self._refresh_locked()
+        return self._index
+
+    def search(self, query: str, limit: int = 50) -> list[dict]:
+        if not (query or "").strip():
+            return []
+        return self._current().search(query, limit)
+
+    def get_food(self, food_id) -> dict | None:
+        food = self._current().by_id.get(food_id)
+        return dict(food) if food else None
+
+    def __len__(self):
+        return len(self._current().foods)
+
+    @property
+    def version(self):
+        return self._current().version
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+def get_catalog() -> FoodCatalog:
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = FoodCatalog()
+    return _catalog
@@ -0,0 +1,201 @@
+"""
+Índices das consultas quentes + diagnóstico.
+
+Os índices são criados pela migration 2 (utils/migrations.py). Para conferir o estado:
+
+    python -m utils.indexes report     # faltando / inválidos / sem uso + plano das consultas
+    python -m utils.indexes create     # (re)cria o que faltar, sem passar pelas migrations
+"""
+import sys
+
+from utils import db
+
+
+class Index:
+    def __init__(self, name: str, table: str, columns: tuple[str, ...], query: str):
+        self.name = name
+        self.table = table
+        self.columns = columns
+        self.query = query          # nome da consulta do registro (db.Q) que o índice atende
+
+    def ddl(self, concurrently: bool = False) -> str:
+        conc = "CONCURRENTLY " if concurrently else ""
+        return f"CREATE INDEX {conc}IF NOT EXISTS {self.name} ON {self.table} ({', '.join(self.columns)})"
+
+
+# Uma entrada por consulta do utils/db.py que roda em todo rerun.
+# A ordem das colunas segue: igualdade primeiro, depois o ORDER BY.
+INDEXES = [
+    Index("idx_patients_user_nome", "patients", ("user_id", "nome", "id"), "patients.list"),
+    Index(
+        "idx_assessments_patient_user_data", "assessments",
+        ("patient_id", "user_id", "data_iso DESC", "id DESC"),
+        "assessments.last",
+    ),
+    Index(
+        "idx_diets_patient_user_data", "diets",
+        ("patient_id", "user_id", "data_iso DESC", "id DESC"),
+        "diets.last",
+    ),
+    Index(
+        "idx_diet_items_user_patient_diet", "diet_items",
+        ("user_id", "patient_id", "diet_id", "meal", "id"),
+        "diet_items.list_by_diet",
+    ),
+    Index("idx_appointments_user_dt", "appointments", ("user_id", "dt_iso"), "appointments.range"),
+    Index("idx_feedback_created_at", "feedback", ("created_at",), "feedback.list"),
+]
+
+
+# --------------------------------------------------
+# Criação
+# --------------------------------------------------
+
+def _drop_invalid_postgres(cur, names):
+    # CREATE INDEX CONCURRENTLY que falhou deixa um índice INVALID para trás,
+    # e o IF NOT EXISTS pularia ele para sempre
+    cur.execute("""
+        SELECT c.relname AS name
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE NOT i.indisvalid AND c.relname = ANY(%s)
+    """, (list(names),))
+    for r in cur.fetchall():
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {r['name']}")
+
+def create_indexes(cur, indexes=None):
+    """
+    Cria os índices que faltam (idempotente).
+    No Postgres usa CONCURRENTLY, então o cursor precisa estar em autocommit.
+    """
+    indexes = indexes or INDEXES
+    if db.USE_POSTGRES:
+        _drop_invalid_postgres(cur, [ix.name for ix in indexes])
+    for ix in indexes:
+        cur.execute(ix.ddl(concurrently=db.USE_POSTGRES))
+
+
+# --------------------------------------------------
+# Diagnóstico
+# --------------------------------------------------
+
+def _existing_indexes(cur) -> dict[str, str]:
+    """nome -> tabela, só índices criados por nós ou pela aplicação (sem PK/autoindex)."""
+    if db.USE_POSTGRES:
+        cur.execute("""
+            SELECT indexname AS name, tablename AS tbl
+            FROM pg_indexes
+            WHERE schemaname = current_schema()
+        """)
+        return {r["name"]: r["tbl"] for r in cur.fetchall()}
+    cur.execute("""
+        SELECT name, tbl_name FROM sqlite_master
+        WHERE type = 'index' AND name NOT LIKE 'sqlite_autoindex_%'
+    """)
+    return {r[0]: r[1] for r in cur.fetchall()}
+
+def _query_plan(cur, name: str) -> list[str]:
+    stmt = db.Q[name]
+    params = tuple(0 for _ in range(stmt.nparams))
+    if db.USE_POSTGRES:
+        cur.execute("EXPLAIN " + stmt.pg, params)
+        return [list(r.values())[0] for r in cur.fetchall()]
+    cur.execute("EXPLAIN QUERY PLAN " + stmt.sqlite, params)
+    return [r[3] for r in cur.fetchall()]
+
+def _uses_full_scan(plan: list[str]) -> bool:
+    for line in plan:
+        if db.USE_POSTGRES:
+            if "Seq Scan" in line:
+                return True
+        elif line.startswith("SCAN ") and "USING" not in line:
+            return True
+    return False
+
+def index_report() -> dict:
+    """
+    - missing: índices esperados que não existem no banco
+    - invalid: (Postgres) índices que ficaram INVALID depois de um CONCURRENTLY com erro
+    - unused:  (Postgres) índices sem nenhum idx_scan desde o último reset das estatísticas
+    - full_scans: consultas quentes cujo plano ainda faz scan completo da tabela
+      (no Postgres, tabela pequena pode preferir Seq Scan mesmo com índice — normal)
+    """
+    report = {"missing": [], "invalid": [], "unused": [], "full_scans": [], "plans": {}}
+
+    with db.get_conn(readonly=True, primary=True) as conn:
+        cur = conn.cursor()
+        existing = _existing_indexes(cur)
+
+        report["missing"] = [ix.name for ix in INDEXES if ix.name not in existing]
+
+        if db.USE_POSTGRES:
+            cur.execute("""
+                SELECT c.relname AS name
+                FROM pg_index i
+                JOIN pg_class c ON c.oid = i.indexrelid
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE NOT i.indisvalid AND n.nspname = current_schema()
+            """)
+            report["invalid"] = [r["name"] for r in cur.fetchall()]
+
+            cur.execute("""
+                SELECT s.indexrelname AS name, s.relname AS tbl, s.idx_scan
+                FROM pg_stat_user_indexes s
+                JOIN pg_index i ON i.indexrelid = s.indexrelid
+                WHERE s.idx_scan = 0 AND NOT i.indisunique AND NOT i.indisprimary
+                ORDER BY s.relname, s.indexrelname
+            """)
+            report["unused"] = [f'{r["tbl"]}.{r["name"]}' for r in cur.fetchall()]
+
+        for ix in INDEXES:
+            try:
+                plan = _query_plan(cur, ix.query)
+            except Exception as e:
+                plan = [f"erro: {e}"]
+                if db.USE_POSTGRES:
+                    conn.rollback()
+            report["plans"][ix.name] = plan
+            if _uses_full_scan(plan):
+                report["full_scans"].append(ix.name)
+
+    return report
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "report"
+
+    if cmd == "create":
+        if db.USE_POSTGRES:
+            conn = db.get_postgres_conn()
+            conn.autocommit = True
+            try:
+                create_indexes(conn.cursor())
+            finally:
+                conn.close()
+        else:
+            with db.get_conn() as conn:
+                create_indexes(conn.cursor())
+        print("OK")
+    elif cmd == "report":
+        r = index_report()
+        print("Faltando:     ", ", ".join(r["missing"]) or "—")
+        print("Inválidos:    ", ", ".join(r["invalid"]) or "—")
+        print("Sem uso:      ", ", ".join(r["unused"]) or "—")
+        print("Scan completo:", ", ".join(r["full_scans"]) or "—")
+        for name, plan in r["plans"].items():
+            print(f"\n{name}:")
+            for line in plan:
+                print(f"   {line}")
+    else:
+        print("uso: python -m utils.indexes [report|create]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,586 @@
+"""
+Migrations versionadas do banco.
+
+Cada migration tem um número (ordem de aplicação) e fica registrada em `schema_migrations`.
+Rodam uma vez por processo (primeira chamada de ensure_schema) ou pela linha de comando:
+
+    python -m utils.migrations upgrade
+    python -m utils.migrations status
+
+Com várias réplicas do app subindo juntas, só uma aplica as migrations por vez
+(advisory lock no Postgres, BEGIN IMMEDIATE no SQLite); as outras esperam e
+encontram o banco já atualizado.
+"""
+import os
+import sys
+import threading
+from datetime import datetime
+
+from utils import db
+
+# chave fixa do pg_advisory_lock (qualquer bigint; só precisa ser sempre a mesma)
+ADVISORY_LOCK_KEY = 7_142_001
+
+# DB_AUTO_MIGRATE=0 → o app só confere a versão e quem aplica é o comando acima
+AUTO_MIGRATE = os.getenv("DB_AUTO_MIGRATE", "1") != "0"
+
+
+class Migration:
+    def __init__(self, version: int, name: str, fn, transactional: bool = True):
+        self.version = version
+        self.name = name
+        self.fn = fn
+        # False → roda fora de transação (ex.: CREATE INDEX CONCURRENTLY no Postgres)
+        self.transactional = transactional
+
+
+MIGRATIONS: list[Migration] = []
+
+def migration(version: int, name: str, transactional: bool = True):
+    def deco(fn):
+        assert all(m.version != version for m in MIGRATIONS), f"migration {version} duplicada"
+        MIGRATIONS.append(Migration(version, name, fn, transactional))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return fn
+    return deco
+
+def latest_version() -> int:
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+# --------------------------------------------------
+# Helpers para as migrations
+# --------------------------------------------------
+
+def _types():
+    # tipos por banco
+    if db.USE_POSTGRES:
+        return {"auto_id": "SERIAL PRIMARY KEY", "text": "TEXT", "real": "REAL"}
+    return {"auto_id": "INTEGER PRIMARY KEY AUTOINCREMENT", "text": "TEXT", "real": "REAL"}
+
+def _add_column_if_missing(cur, table, column, coltype):
+    if db.USE_POSTGRES:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {coltype};")
+        return
+    cur.execute(f"PRAGMA table_info({table})")
+    cols = [r[1] for r in cur.fetchall()]
+    if column not in cols:
+        cur.execute(f"ALTER TABLE {table} ADD COLUMN {column} {coltype};")
+
+
+# --------------------------------------------------
+# Migrations (sempre acrescente no fim, nunca edite uma já publicada)
+# --------------------------------------------------
+
+@migration(1, "schema inicial")
+def _m001_schema_inicial(cur):
+    t = _types()
+    auto_id, text, real = t["auto_id"], t["text"], t["real"]
+
+    # ---------- users (futuro login) ----------
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS users (
+        id {auto_id},
+        email {text} UNIQUE,
+        password_hash {text},
+        created_at {text}
+    );
+    """)
+
+    # ---------- patients ----------
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS patients (
+        id {auto_id},
+        user_id INTEGER,
+        nome {text} NOT NULL,
+        telefone {text},
+        email {text},
+        nascimento {text},
+        sexo {text},
+        obs {text}
+    );
+    """)
+
+    # ---------- appointments ----------
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS appointments (
+        id {auto_id},
+        user_id INTEGER,
+        patient_id INTEGER NOT NULL,
+        dt_iso {text} NOT NULL,
+        tipo {text},
+        notas {text}
+    );
+    """)
+
+    # ---------- assessments ----------
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS assessments (
+            id {auto_id},
+            user_id INTEGER,
+            patient_id INTEGER NOT NULL,
+            data_iso {text} NOT NULL,
+            peso {real},
+            altura_cm {real},
+            cintura_cm {real},
+            quadril_cm {real},
+            pescoco_cm {real},
+            bf_usnavy_pct {real},
+            objetivo {text},
+            atividade {text},
+            sono_h {real},
+            obs {text}
+        );
+        """)
+
+    # bancos criados antes dessas colunas existirem
+    _add_column_if_missing(cur, "assessments", "pescoco_cm", "REAL")
+    _add_column_if_missing(cur, "assessments", "bf_usnavy_pct", "REAL")
+
+    # ---------- diets ----------
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS diets (
+        id {auto_id},
+        user_id INTEGER,
+        patient_id INTEGER NOT NULL,
+        data_iso {text} NOT NULL,
+        bmr {real},
+        tdee {real},
+        calorias_alvo {real},
+        meta {text},
+        p_gkg {real},
+        fat_pct {real},
+        proteina_g {real},
+        carbo_g {real},
+        gordura_g {real}
+    );
+    """)
+
+    # ---------- foods (TACO) ----------
+    cur.execute(f"""
+    CREATE TABLE IF NOT EXISTS foods (
+        id {auto_id},
+        nome {text} NOT NULL,
+        base_g {real} DEFAULT 100,
+        kcal {real},
+        proteina_g {real},
+        carbo_g {real},
+        gordura_g {real},
+        fibra_g {real},
+        sodio_mg {real}
+    );
+    """)
+
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS diet_items (
+            id {auto_id},
+            user_id INTEGER,
+            patient_id INTEGER NOT NULL,
+            diet_id INTEGER,
+            meal {text} NOT NULL,
+            food_id INTEGER NOT NULL,
+            grams {real} NOT NULL,
+            created_at {text}
+        );
+        """)
+
+    # ---------- beta_allowlist (beta fechada) ----------
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS beta_allowlist (
+            id {auto_id},
+            email {text} UNIQUE NOT NULL,
+            created_at {text}
+        );
+        """)
+
+    # ---------- feedback ----------
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS feedback (
+            id {auto_id},
+            user_id INTEGER,
+            page {text},
+            message {text} NOT NULL,
+            rating INTEGER,
+            created_at {text}
+        );
+        """)
+
+    # ---------- event_logs ----------
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS event_logs (
+            id {auto_id},
+            user_id INTEGER,
+            event_name {text} NOT NULL,
+            meta {text},
+            created_at {text}
+        );
+        """)
+
+
+@migration(2, "índices das consultas principais", transactional=False)
+def _m002_indices(cur):
+    # fora de transação: no Postgres os índices são criados com CONCURRENTLY
+    from utils.indexes import create_indexes
+    create_indexes(cur)
+
+
+@migration(3, "busca de alimentos (FTS5 / pg_trgm)", transactional=False)
+def _m003_busca_alimentos(cur):
+    if db.USE_POSTGRES:
+        # roda em autocommit: se um statement falhar, os anteriores já valeram e a conexão segue usável
+        try:
+            cur.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+            cur.execute("CREATE EXTENSION IF NOT EXISTS unaccent")
+            # unaccent() não é IMMUTABLE, então não entra direto num índice
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION nutri_unaccent(text) RETURNS text
+                LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+                AS $$ SELECT lower(public.unaccent('public.unaccent'::regdictionary, $1)) $$
+            """)
+        except Exception as e:
+            # sem permissão de CREATE EXTENSION (banco gerenciado) → search_foods fica no ILIKE
+            print(f"[migrations] pg_trgm/unaccent indisponível, busca de alimentos fica no ILIKE: {e!r}",
+                  file=sys.stderr)
+            return
+        cur.execute("""
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_foods_nome_trgm
+            ON foods USING gin (nutri_unaccent(nome) gin_trgm_ops)
+        """)
+        return
+
+    # SQLite: índice FTS5 "external content" em cima de foods, mantido por triggers
+    try:
+        cur.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS foods_fts USING fts5(
+                nome,
+                content='foods',
+                content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """)
+    except Exception as e:
+        # SQLite compilado sem FTS5 → search_foods continua no LIKE
+        print(f"[migrations] FTS5 indisponível, busca de alimentos fica no LIKE: {e!r}", file=sys.stderr)
+        return
+
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS foods_fts_ai AFTER INSERT ON foods BEGIN
+            INSERT INTO foods_fts (rowid, nome) VALUES (new.id, new.nome);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS foods_fts_ad AFTER DELETE ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, nome) VALUES ('delete', old.id, old.nome);
+        END
+    """)
+    cur.execute("""
+        CREATE TRIGGER IF NOT EXISTS foods_fts_au AFTER UPDATE OF nome ON foods BEGIN
+            INSERT INTO foods_fts (foods_fts, rowid, nome) VALUES ('delete', old.id, old.nome);
+            INSERT INTO foods_fts (rowid, nome) VALUES (new.id, new.nome);
+        END
+    """)
+    # alimentos que já estavam no banco
+    cur.execute("INSERT INTO foods_fts (foods_fts) VALUES ('rebuild')")
+
+
+@migration(4, "app_meta (carimbo de versão do catálogo de alimentos)")
+def _m004_app_meta(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS app_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+    """)
+    ph = "%s" if db.USE_POSTGRES else "?"
+    cur.execute(
+        f"INSERT INTO app_meta (key, value) VALUES ({ph}, {ph}) ON CONFLICT (key) DO NOTHING",
+        ("foods_version", "1"),
+    )
+
+
+@migration(5, "foods.nome_key único (import idempotente)")
+def _m005_foods_nome_key(cur):
+    ph = "%s" if db.USE_POSTGRES else "?"
+    _add_column_if_missing(cur, "foods", "nome_key", "TEXT")
+
+    cur.execute("SELECT id, nome FROM foods ORDER BY id")
+    keep = {}      # nome_key -> id mantido (o mais antigo)
+    for r in cur.fetchall():
+        r = dict(r)
+        key = db.food_key(r["nome"])
+        if key in keep:
+            # duplicado de imports antigos: aponta os itens de dieta pro original e apaga
+            cur.execute(f"UPDATE diet_items SET food_id = {ph} WHERE food_id = {ph}", (keep[key], r["id"]))
+            cur.execute(f"DELETE FROM foods WHERE id = {ph}", (r["id"],))
+        else:
+            keep[key] = r["id"]
+            cur.execute(f"UPDATE foods SET nome_key = {ph} WHERE id = {ph}", (key, r["id"]))
+
+    cur.execute("CREATE UNIQUE INDEX IF NOT EXISTS ux_foods_nome_key ON foods (nome_key)")
+
+
+@migration(6, "diet_totals (totais por dieta e refeição)")
+def _m006_diet_totals(cur):
+    real = _types()["real"]
+    # diet_key = diet_id (0 para itens sem dieta); user_id nulo vira 0 — tudo na PK
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS diet_totals (
+            user_id INTEGER NOT NULL,
+            patient_id INTEGER NOT NULL,
+            diet_key INTEGER NOT NULL,
+            meal TEXT NOT NULL,
+            items INTEGER NOT NULL DEFAULT 0,
+            kcal {real} NOT NULL DEFAULT 0,
+            proteina_g {real} NOT NULL DEFAULT 0,
+            carbo_g {real} NOT NULL DEFAULT 0,
+            gordura_g {real} NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, patient_id, diet_key, meal)
+        );
+    """)
+    db.rebuild_diet_totals(cur)
+
+
+@migration(7, "event_logs por mês + event_daily")
+def _m007_event_logs_mensal(cur):
+    from utils import event_store
+
+    # user_id nulo (evento anônimo) vira 0 para caber na PK
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS event_daily (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            event_name TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (day, user_id, event_name)
+        );
+    """)
+
+    if not db.USE_POSTGRES:
+        # SQLite: a tabela continua a mesma; a rotação (event_store) é que esvazia os meses velhos
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_event_logs_created_at ON event_logs (created_at)")
+        return
+
+    # Postgres: recria event_logs particionada por created_at, reaproveitando a sequence do id
+    cur.execute("ALTER TABLE event_logs RENAME TO event_logs_legacy")
+    cur.execute("SELECT pg_get_serial_sequence('event_logs_legacy', 'id') AS seq")
+    seq = cur.fetchone()["seq"]
+    # a chave primária de tabela particionada precisa incluir a coluna da partição
+    cur.execute(f"""
+        CREATE TABLE event_logs (
+            id BIGINT NOT NULL DEFAULT nextval('{seq}'),
+            user_id INTEGER,
+            event_name TEXT NOT NULL,
+            meta TEXT,
+            created_at TEXT NOT NULL,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
+    """)
+    cur.execute("CREATE TABLE event_logs_default PARTITION OF event_logs DEFAULT")
+    cur.execute("CREATE INDEX idx_event_logs_created_at ON event_logs (created_at)")
+
+    cur.execute("SELECT DISTINCT substr(created_at, 1, 7) AS ym FROM event_logs_legacy WHERE created_at IS NOT NULL")
+    months = []
+    for r in cur.fetchall():
+        try:
+            months.append(datetime.strptime(r["ym"], "%Y-%m").date())
+        except (TypeError, ValueError):
+            continue
+    event_store.ensure_partitions(cur, months=months)
+
+    cur.execute("""
+        INSERT INTO event_logs (id, user_id, event_name, meta, created_at)
+        SELECT id, user_id, event_name, meta, COALESCE(created_at, '1970-01-01T00:00:00')
+        FROM event_logs_legacy
+    """)
+    # a sequence era "dona" da tabela antiga: sem isso o DROP levaria junto
+    cur.execute(f"ALTER SEQUENCE {seq} OWNED BY event_logs.id")
+    cur.execute("DROP TABLE event_logs_legacy")
+
+
+@migration(8, "error_daily + feedback_daily (painel de uso)")
+def _m008_agregados_admin(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS error_daily (
+            day TEXT NOT NULL,
+            page TEXT NOT NULL,
+            action TEXT NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (day, page, action)
+        );
+    """)
+    # rating nulo (feedback sem nota) vira -1
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS feedback_daily (
+            day TEXT NOT NULL,
+            page TEXT NOT NULL,
+            rating INTEGER NOT NULL,
+            n INTEGER NOT NULL,
+            PRIMARY KEY (day, page, rating)
+        );
+    """)
+
+
+# --------------------------------------------------
+# Runner
+# --------------------------------------------------
+
+def _ensure_migrations_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TEXT
+        );
+    """)
+
+def _applied_versions(cur) -> set[int]:
+    cur.execute("SELECT version FROM schema_migrations")
+    return {int(db._scalar(r)) for r in cur.fetchall()}
+
+def _record(cur, m: Migration):
+    ph = "%s" if db.USE_POSTGRES else "?"
+    cur.execute(
+        f"INSERT INTO schema_migrations (version, name, applied_at) VALUES ({ph}, {ph}, {ph})",
+        (m.version, m.name, datetime.utcnow().isoformat()),
+    )
+
+def _migrate_postgres(log) -> list[int]:
+    applied_now = []
+    conn = db.get_postgres_conn()
+    try:
+        conn.autocommit = True
+        cur = conn.cursor()
+        cur.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        try:
+            _ensure_migrations_table(cur)
+            done = _applied_versions(cur)
+            for m in MIGRATIONS:
+                if m.version in done:
+                    continue
+                log(f"aplicando migration {m.version}: {m.name}")
+                if m.transactional:
+                    conn.autocommit = False
+                    try:
+                        m.fn(conn.cursor())
+                        _record(conn.cursor(), m)
+                        conn.commit()
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    finally:
+                        conn.autocommit = True
+                else:
+                    # autocommit: cada statement é a sua própria transação
+                    m.fn(cur)
+                    _record(cur, m)
+                applied_now.append(m.version)
+        finally:
+            cur.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+    finally:
+        conn.close()
+    return applied_now
+
+def _migrate_sqlite(log) -> list[int]:
+    applied_now = []
+    conn = db.get_sqlite_conn()
+    conn.isolation_level = None  # controle manual das transações
+    try:
+        cur = conn.cursor()
+        _ensure_migrations_table(cur)
+        for m in MIGRATIONS:
+            # BEGIN IMMEDIATE pega o lock de escrita do arquivo; re-checa a versão já com o lock
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                if m.version in _applied_versions(cur):
+                    cur.execute("COMMIT")
+                    continue
+                log(f"aplicando migration {m.version}: {m.name}")
+                m.fn(cur)
+                _record(cur, m)
+                cur.execute("COMMIT")
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+            applied_now.append(m.version)
+    finally:
+        conn.close()
+    return applied_now
+
+def migrate(log=None) -> list[int]:
+    """Aplica as migrations pendentes. Retorna as versões aplicadas agora."""
+    log = log or (lambda msg: None)
+    if db.USE_POSTGRES:
+        return _migrate_postgres(log)
+    return _migrate_sqlite(log)
+
+def applied_versions() -> set[int]:
+    try:
+        with db.get_conn(readonly=True, primary=True) as conn:
+            return _applied_versions(conn.cursor())
+    except Exception:
+        return set()
+
+def current_version() -> int:
+    try:
+        with db.get_conn(readonly=True, primary=True) as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT MAX(version) FROM schema_migrations")
+            v = db._scalar(cur.fetchone())
+    except Exception:
+        # tabela ainda não existe → banco zerado
+        return 0
+    return int(v or 0)
+
+
+# --------------------------------------------------
+# Checagem barata para o hot path (bootstrap)
+# --------------------------------------------------
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+def ensure_schema():
+    """
+    Primeira chamada do processo: confere a versão do banco e aplica o que faltar
+    (ou reclama, se DB_AUTO_MIGRATE=0). Depois disso não toca mais no banco.
+    """
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if _schema_ready:
+            return
+        if current_version() < latest_version():
+            if not AUTO_MIGRATE:
+                raise RuntimeError(
+                    f"Banco na versão {current_version()}, app espera {latest_version()}. "
+                    "Rode: python -m utils.migrations upgrade"
+                )
+            migrate()
+        _schema_ready = True
+
+
+# --------------------------------------------------
+# CLI
+# --------------------------------------------------
+
+def main(argv=None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    cmd = argv[0] if argv else "upgrade"
+
+    if cmd == "upgrade":
+        applied = migrate(log=print)
+        print(f"OK — versão {current_version()} ({len(applied)} migration(s) aplicada(s) agora)")
+    elif cmd == "status":
+        done = applied_versions()
+        print(f"Banco: versão {current_version()} | App: versão {latest_version()}")
+        for m in MIGRATIONS:
+            print(f"  [{'x' if m.version in done else ' '}] {m.version:03d} {m.name}")
+    else:
+        print("uso: python -m utils.migrations [upgrade|status]")
+        return 2
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
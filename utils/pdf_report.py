@@ -3,7 +3,9 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.units import cm
 from datetime import datetime
 
-def build_pdf(path, patient: dict, assessment: dict | None, diet: dict | None, diet_items: list[dict] | None = None):
+def build_pdf(path, patient: dict, assessment: dict | None, diet: dict | None, diet_items: list[dict] | None = None,
+              totals: dict | None = None):
+    """totals: db.get_diet_totals() / bundle["totals"]; sem ele o total do dia é somado dos itens."""
     diet_items = diet_items or []
     
     c = canvas.Canvas(path, pagesize=A4)
@@ -132,10 +134,11 @@ def build_pdf(path, patient: dict, assessment: dict | None, diet: dict | None, d
                 c.setFont("Helvetica", 10)
 
             mm = item_macros(it)
-            tot_day["kcal"] += mm["kcal"]
-            tot_day["p"] += mm["p"]
-            tot_day["c"] += mm["c"]
-            tot_day["g"] += mm["g"]
+            if totals is None:
+                tot_day["kcal"] += mm["kcal"]
+                tot_day["p"] += mm["p"]
+                tot_day["c"] += mm["c"]
+                tot_day["g"] += mm["g"]
 
             line = (
                 f"- {it.get('nome','')} | {float(it.get('grams') or 0):.0f} g | "
@@ -145,6 +148,10 @@ def build_pdf(path, patient: dict, assessment: dict | None, diet: dict | None, d
             c.drawString(x, y, line)
             y -= 0.45 * cm
 
+        if totals is not None:
+            day = totals["day"]
+            tot_day = {"kcal": day["kcal"], "p": day["proteina_g"], "c": day["carbo_g"], "g": day["gordura_g"]}
+
         y -= 0.6 * cm
         c.setFont("Helvetica-Bold", 11)
         c.drawString(
@@ -0,0 +1,579 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import LifoQueue, Queue, Empty
+
+# --------------------------------------------------
+# Configuração (variáveis de ambiente)
+# --------------------------------------------------
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except (TypeError, ValueError):
+        return default
+
+POOL_MIN = _env_int("DB_POOL_MIN", 1)                          # conexões abertas na subida
+POOL_MAX = _env_int("DB_POOL_MAX", 10)                         # limite de conexões simultâneas
+POOL_TIMEOUT = _env_float("DB_POOL_TIMEOUT", 30.0)             # segundos esperando uma conexão livre
+POOL_MAX_LIFETIME = _env_float("DB_POOL_MAX_LIFETIME", 1800.0) # recicla conexões mais velhas que isso
+POOL_HEALTHCHECK_IDLE = _env_float("DB_POOL_HEALTHCHECK_IDLE", 30.0)  # SELECT 1 se ficou parada mais que isso
+
+
+class PoolTimeout(RuntimeError):
+    """Nenhuma conexão livre dentro de DB_POOL_TIMEOUT."""
+
+
+class _Slot:
+    __slots__ = ("conn", "created_at", "last_used")
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+# --------------------------------------------------
+# Postgres: pool limitado e thread-safe
+# --------------------------------------------------
+
+class PostgresPool:
+    """
+    Pool de conexões psycopg2.
+    - no máximo `maxconn` conexões abertas (quem passar disso espera até `timeout`)
+    - conexões mais velhas que `max_lifetime` são recicladas
+    - conexão parada há mais de `healthcheck_idle` segundos leva um SELECT 1 antes de ser entregue
+    """
+
+    def __init__(self, connect, minconn=POOL_MIN, maxconn=POOL_MAX, timeout=POOL_TIMEOUT,
+                 max_lifetime=POOL_MAX_LIFETIME, healthcheck_idle=POOL_HEALTHCHECK_IDLE):
+        self._connect = connect
+        self.maxconn = max(1, int(maxconn))
+        self.minconn = min(max(0, int(minconn)), self.maxconn)
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+
+        self._idle = LifoQueue()          # LIFO: reaproveita a conexão mais "quente"
+        self._slots = {}                  # id(conn) -> _Slot (só as emprestadas)
+        self._sem = threading.BoundedSemaphore(self.maxconn)
+        self._lock = threading.Lock()
+        self._closed = False
+
+        for _ in range(self.minconn):
+            self._idle.put(_Slot(self._connect()))
+
+    def _expired(self, slot) -> bool:
+        return bool(self.max_lifetime) and (time.monotonic() - slot.created_at) > self.max_lifetime
+
+    def _healthy(self, slot) -> bool:
+        conn = slot.conn
+        if getattr(conn, "closed", 0):
+            return False
+        if self.healthcheck_idle is not None and (time.monotonic() - slot.last_used) > self.healthcheck_idle:
+            try:
+                cur = conn.cursor()
+                cur.execute("SELECT 1")
+                cur.fetchone()
+                cur.close()
+                conn.rollback()
+            except Exception:
+                return False
+        return True
+
+    def getconn(self):
+        if self._closed:
+            raise RuntimeError("Pool fechado.")
+        if not self._sem.acquire(timeout=self.timeout):
+            raise PoolTimeout(f"Sem conexão livre no pool após {self.timeout}s (DB_POOL_MAX={self.maxconn}).")
+
+        try:
+            slot = None
+            while slot is None:
+                try:
+                    candidate = self._idle.get_nowait()
+                except Empty:
+                    slot = _Slot(self._connect())
+                    break
+                if self._expired(candidate) or not self._healthy(candidate):
+                    _close_quietly(candidate.conn)
+                    continue
+                slot = candidate
+        except BaseException:
+            self._sem.release()
+            raise
+
+        with self._lock:
+            self._slots[id(slot.conn)] = slot
+        return slot.conn
+
+    def putconn(self, conn, discard: bool = False):
+        with self._lock:
+            slot = self._slots.pop(id(conn), None)
+        if slot is None:
+            # não é nossa (ou já devolvida) → só fecha
+            _close_quietly(conn)
+            return
+
+        try:
+            if discard or self._closed or getattr(conn, "closed", 0) or self._expired(slot):
+                _close_quietly(conn)
+            else:
+                slot.last_used = time.monotonic()
+                self._idle.put(slot)
+        finally:
+            self._sem.release()
+
+    def closeall(self):
+        self._closed = True
+        while True:
+            try:
+                _close_quietly(self._idle.get_nowait().conn)
+            except Empty:
+                break
+
+    def stats(self) -> dict:
+        with self._lock:
+            in_use = len(self._slots)
+        return {"backend": "postgres", "in_use": in_use, "idle": self._idle.qsize(), "max": self.maxconn}
+
+
+# --------------------------------------------------
+# SQLite: uma conexão em cache por thread
+# --------------------------------------------------
+
+class SQLiteThreadPool:
+    """
+    SQLite não ganha nada com pool compartilhado (a conexão é barata e o lock é do arquivo),
+    então cada thread guarda a sua conexão e reaproveita entre chamadas.
+    Mesmas regras de max_lifetime / health check do pool do Postgres.
+    """
+
+    def __init__(self, connect, max_lifetime=POOL_MAX_LIFETIME, healthcheck_idle=POOL_HEALTHCHECK_IDLE):
+        self._connect = connect
+        self.max_lifetime = max_lifetime
+        self.healthcheck_idle = healthcheck_idle
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._all = {}                    # thread ident -> _Slot (para closeall/stats)
+        self._closed = False
+
+    def _healthy(self, slot) -> bool:
+        if self.max_lifetime and (time.monotonic() - slot.created_at) > self.max_lifetime:
+            return False
+        if self.healthcheck_idle is not None and (time.monotonic() - slot.last_used) > self.healthcheck_idle:
+            try:
+                slot.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                return False
+        return True
+
+    def _forget(self, slot):
+        with self._lock:
+            for ident, s in list(self._all.items()):
+                if s is slot:
+                    del self._all[ident]
+
+    def getconn(self):
+        if self._closed:
+            raise RuntimeError("Pool fechado.")
+        slot = getattr(self._local, "slot", None)
+        if slot is not None and not self._healthy(slot):
+            self._forget(slot)
+            _close_quietly(slot.conn)
+            slot = None
+        if slot is None:
+            slot = _Slot(self._connect())
+            self._local.slot = slot
+            with self._lock:
+                # limpa conexões de threads que já morreram (Streamlit cria uma thread por rerun)
+                alive = {t.ident for t in threading.enumerate()}
+                for ident in [i for i in self._all if i not in alive]:
+                    _close_quietly(self._all.pop(ident).conn)
+                self._all[threading.get_ident()] = slot
+        return slot.conn
+
+    def putconn(self, conn, discard: bool = False):
+        slot = getattr(self._local, "slot", None)
+        if slot is None or slot.conn is not conn:
+            return
+        if discard or self._closed:
+            self._local.slot = None
+            self._forget(slot)
+            _close_quietly(conn)
+        else:
+            slot.last_used = time.monotonic()
+
+    def closeall(self):
+        self._closed = True
+        with self._lock:
+            slots = list(self._all.values())
+            self._all.clear()
+        for slot in slots:
+            _close_quietly(slot.conn)
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = len(self._all)
+        return {"backend": "sqlite", "threads": n}
+
+
+# --------------------------------------------------
+# SQLite: escritor único (perfil de produção)
+# --------------------------------------------------
+
+WRITER_MAX_BATCH = _env_int("SQLITE_WRITER_MAX_BATCH", 64)    # blocos de escrita por COMMIT
+WRITER_TIMEOUT = _env_float("SQLITE_WRITER_TIMEOUT", 30.0)    # segundos esperando a vez de escrever
+# segundos que um bloco pode ficar com a conexão (com o BEGIN IMMEDIATE aberto); passou,
+# o que ele gravou é desfeito e a conexão vai para o próximo da fila
+WRITER_HOLD_TIMEOUT = _env_float("SQLITE_WRITER_HOLD_TIMEOUT", 30.0)
+
+
+class _Lease:
+    """Um bloco `with get_conn()` esperando (ou usando) a conexão do escritor."""
+    __slots__ = ("lock", "granted", "done", "committed", "taken", "cancelled", "revoked", "ok", "error")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.granted = threading.Event()
+        self.done = threading.Event()
+        self.committed = threading.Event()
+        self.taken = False
+        self.cancelled = False
+        self.revoked = False      # passou de WRITER_HOLD_TIMEOUT: não pode mais usar a conexão
+        self.ok = False
+        self.error = None
+
+    def check(self):
+        if self.revoked:
+            raise PoolTimeout("Bloco de escrita passou de SQLITE_WRITER_HOLD_TIMEOUT; o que ele gravou foi desfeito.")
+
+
+class _LeasedCursor:
+    """Cursor do escritor emprestado a um bloco: para de funcionar quando o empréstimo é revogado."""
+
+    def __init__(self, cur, lease):
+        self._cur = cur
+        self._lease = lease
+
+    def _call(self, fn, *args):
+        with self._lease.lock:
+            self._lease.check()
+            return fn(*args)
+
+    def execute(self, *args):
+        self._call(self._cur.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self._call(self._cur.executemany, *args)
+        return self
+
+    def fetchone(self):
+        return self._call(self._cur.fetchone)
+
+    def fetchmany(self, *args):
+        return self._call(self._cur.fetchmany, *args)
+
+    def fetchall(self):
+        return self._call(self._cur.fetchall)
+
+    def __iter__(self):
+        return iter(self.fetchall())
+
+    def __getattr__(self, name):
+        return getattr(self._cur, name)
+
+
+class _LeasedConnection:
+    """A conexão do escritor vista por um bloco (ver _LeasedCursor)."""
+
+    def __init__(self, conn, lease):
+        self._conn = conn
+        self._lease = lease
+
+    def cursor(self):
+        return _LeasedCursor(self._conn.cursor(), self._lease)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SQLiteWriter:
+    """
+    Todas as escritas do processo passam por uma conexão só, cuidada por uma thread.
+
+    Quem vai escrever entra na fila. A thread abre BEGIN IMMEDIATE, empresta a conexão
+    para cada bloco da fila em sequência (um SAVEPOINT por bloco: erro num bloco não
+    desfaz os outros) e fecha o lote com um COMMIT só. O bloco só sai do `with` depois
+    do COMMIT do seu lote, então quem lê logo em seguida já enxerga a escrita.
+    Dentro do processo as sessões não disputam mais o lock do arquivo.
+
+    Bloco que segura a conexão mais que hold_timeout é revogado: a thread desfaz o
+    SAVEPOINT dele e segue a fila; o bloco recebe PoolTimeout no próximo comando
+    (ou ao sair do `with`).
+    """
+
+    def __init__(self, connect, max_batch=WRITER_MAX_BATCH, timeout=WRITER_TIMEOUT,
+                 hold_timeout=WRITER_HOLD_TIMEOUT):
+        self._connect = connect
+        self.max_batch = max(1, int(max_batch))
+        self.timeout = timeout
+        self.hold_timeout = hold_timeout
+        self._queue = Queue()
+        self._conn = None
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._stats = {"batches": 0, "writes": 0, "failed": 0, "revoked": 0, "largest_batch": 0}
+
+    # ---------- lado de quem escreve ----------
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def connection(self):
+        if self._closed:
+            raise RuntimeError("Escritor SQLite fechado.")
+        lease = _Lease()
+        self._ensure_thread()
+        self._queue.put(lease)
+
+        if not lease.granted.wait(self.timeout):
+            with lease.lock:
+                if not lease.taken:
+                    lease.cancelled = True
+                    raise PoolTimeout(f"Escritor SQLite ocupado por mais de {self.timeout}s.")
+            lease.granted.wait()   # a thread pegou no último instante
+        if lease.error is not None:
+            raise lease.error
+
+        try:
+            yield _LeasedConnection(self._conn, lease)
+        except BaseException:
+            lease.done.set()
+            raise
+        with lease.lock:
+            lease.check()
+            lease.ok = True
+            lease.done.set()
+
+        lease.committed.wait()
+        if lease.error is not None:
+            raise lease.error
+
+    # ---------- thread do escritor ----------
+
+    def _run(self):
+        try:
+            self._conn = self._connect()
+            self._conn.isolation_level = None      # BEGIN/COMMIT ficam por nossa conta
+        except Exception as e:
+            self._fail_pending(e)
+            return
+        try:
+            while True:
+                lease = self._queue.get()
+                if lease is None:
+                    break
+                self._run_batch(lease)
+        finally:
+            _close_quietly(self._conn)
+            self._conn = None
+
+    def _fail_pending(self, error):
+        while True:
+            try:
+                lease = self._queue.get_nowait()
+            except Empty:
+                return
+            if lease is not None:
+                lease.error = error
+                lease.granted.set()
+
+    def _take(self, lease) -> bool:
+        with lease.lock:
+            if lease.cancelled:
+                return False
+            lease.taken = True
+            return True
+
+    def _next(self, count: int):
+        if count >= self.max_batch:
+            return None
+        try:
+            lease = self._queue.get_nowait()
+        except Empty:
+            return None
+        if lease is None:
+            self._queue.put(None)      # fechamento: termina o lote e sai na próxima volta
+        return lease
+
+    def _run_batch(self, lease):
+        conn = self._conn
+        if not self._take(lease):
+            return
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.Error as e:
+            lease.error = e
+            lease.granted.set()
+            return
+
+        ok, n = [], 0
+        broken = None
+        while lease is not None:
+            if n == 0 or self._take(lease):
+                sp = f"w{n}"
+                n += 1
+                conn.execute(f"SAVEPOINT {sp}")
+                lease.granted.set()
+                if not lease.done.wait(self.hold_timeout):
+                    self._revoke(lease)
+                try:
+                    if not lease.ok:
+                        conn.execute(f"ROLLBACK TO {sp}")
+                        self._count(failed=1)
+                    conn.execute(f"RELEASE {sp}")
+                except sqlite3.Error as e:
+                    # a transação inteira se perdeu (ex.: disco cheio)
+                    broken = e
+                    if lease.ok:
+                        ok.append(lease)
+                    break
+                if lease.ok:
+                    ok.append(lease)
+            lease = self._next(n)
+
+        try:
+            if broken is not None:
+                raise broken
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            try:
+                conn.execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+            for l in ok:
+                l.error = e
+        for l in ok:
+            l.committed.set()
+
+        self._count(batches=1, writes=len(ok))
+        with self._stats_lock:
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], n)
+
+    def _revoke(self, lease):
+        # comando do bloco rodando agora (SELECT enorme, lock externo...) é abortado;
+        # depois do lock ninguém mais usa a conexão por esse empréstimo
+        self._conn.interrupt()
+        with lease.lock:
+            if not lease.done.is_set():
+                lease.revoked = True
+                self._count(revoked=1)
+
+    def _count(self, **deltas):
+        with self._stats_lock:
+            for k, v in deltas.items():
+                self._stats[k] += v
+
+    def closeall(self):
+        self._closed = True
+        t = self._thread
+        if t is not None and t.is_alive():
+            self._queue.put(None)
+            t.join(5)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return dict(self._stats, queued=self._queue.qsize())
+
+
+# --------------------------------------------------
+# SQLite assíncrono (aiosqlite, usado pelo utils/db_async.py)
+# --------------------------------------------------
+
+class AsyncSQLitePool:
+    """
+    Pool pequeno de conexões aiosqlite (cada uma já é uma thread própria).
+    - no máximo `maxconn` conexões; quem passar disso espera até `timeout`
+    - escrita é uma por vez (write_lock): várias conexões gravando no mesmo arquivo
+      só ficariam disputando o lock do SQLite
+    """
+
+    def __init__(self, connect, maxconn=POOL_MAX, timeout=POOL_TIMEOUT):
+        self._connect = connect           # coroutine que abre uma conexão
+        self.maxconn = max(1, int(maxconn))
+        self.timeout = timeout
+        self._idle = []                   # pilha: reaproveita a mais "quente"
+        self._sem = asyncio.Semaphore(self.maxconn)
+        self.write_lock = asyncio.Lock()
+        self._in_use = 0
+        self._closed = False
+
+    async def getconn(self):
+        if self._closed:
+            raise RuntimeError("Pool fechado.")
+        try:
+            await asyncio.wait_for(self._sem.acquire(), self.timeout)
+        except asyncio.TimeoutError:
+            raise PoolTimeout(f"Sem conexão livre no pool após {self.timeout}s (DB_POOL_MAX={self.maxconn}).")
+        try:
+            conn = self._idle.pop() if self._idle else await self._connect()
+        except BaseException:
+            self._sem.release()
+            raise
+        self._in_use += 1
+        return conn
+
+    async def putconn(self, conn, discard: bool = False):
+        self._in_use -= 1
+        try:
+            if discard or self._closed:
+                try:
+                    await conn.close()
+                except Exception:
+                    pass
+            else:
+                self._idle.append(conn)
+        finally:
+            self._sem.release()
+
+    async def closeall(self):
+        self._closed = True
+        while self._idle:
+            try:
+                await self._idle.pop().close()
+            except Exception:
+                pass
+
+    def stats(self) -> dict:
+        return {"backend": "aiosqlite", "in_use": self._in_use, "idle": len(self._idle), "max": self.maxconn}
@@ -0,0 +1,270 @@
+"""
+Tempo de cada consulta do banco, por consulta e por página.
+
+Toda consulta do app passa pelo registro (db.Q.run / run_many / insert), que chama
+record() com o tempo gasto. Daqui saem:
+
+- histograma por consulta (processo todo) e, por página, tempo de banco e nº de consultas por rerun;
+- log de consultas lentas (> DB_SLOW_MS) com o formato dos parâmetros, nunca os valores
+  — em memória (últimas 200) e em DB_SLOW_LOG (JSON por linha; vazio = só memória);
+- rastro do rerun (Trace): a mesma consulta com os mesmos parâmetros mais de uma vez,
+  a mesma leitura do utils/db.py chamada de novo (mesmo que o cache responda) e
+  consulta repetida com parâmetros diferentes (cara de N+1, laço fazendo 1 SELECT por item).
+
+O bootstrap.page_run abre um Trace no começo do rerun e fecha no fim do script; o painel
+de debug (utils/debug_panel.py, DEBUG_PANEL=1) mostra o último rerun completo.
+"""
+import os
+import sys
+import json
+import time
+import bisect
+import contextvars
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+
+PROFILE_ENABLED = os.getenv("DB_PROFILE", "1") != "0"
+SLOW_MS = float(os.getenv("DB_SLOW_MS", "200"))
+SLOW_LOG = os.getenv("DB_SLOW_LOG", str(Path("data") / "slow_queries.log"))
+N_PLUS_ONE_MIN = int(os.getenv("DB_N_PLUS_ONE_MIN", "5"))
+
+# limites superiores das faixas (ms); a última faixa é "acima de 2500"
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+
+class Histogram:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, ms: float):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.total += ms
+        if ms > self.max:
+            self.max = ms
+
+    def quantile(self, q: float) -> float:
+        """Aproximado: limite superior da faixa onde cai o quantil (o máximo na última)."""
+        if not self.n:
+            return 0.0
+        target = q * self.n
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return min(BUCKETS_MS[i], self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+    def as_dict(self) -> dict:
+        return {
+            "n": self.n,
+            "total_ms": round(self.total, 2),
+            "avg_ms": round(self.total / self.n, 3) if self.n else 0.0,
+            "p50_ms": round(self.quantile(0.5), 3),
+            "p95_ms": round(self.quantile(0.95), 3),
+            "max_ms": round(self.max, 3),
+            "buckets": dict(zip([f"≤{b}" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}"], self.counts)),
+        }
+
+
+def param_shape(params) -> str:
+    """Tipos dos parâmetros, sem os valores: (int, str[12], None). Lote: 300×(int, str[5])."""
+    if isinstance(params, list) and params and isinstance(params[0], (tuple, list)):
+        return f"{len(params)}×{param_shape(params[0])}"
+    parts = []
+    for p in params or ():
+        if p is None:
+            parts.append("None")
+        elif isinstance(p, (str, bytes, list, tuple)):
+            parts.append(f"{type(p).__name__}[{len(p)}]")
+        else:
+            parts.append(type(p).__name__)
+    return f"({', '.join(parts)})"
+
+
+# --------------------------------------------------
+# Rastro por rerun
+# --------------------------------------------------
+
+class Trace:
+    def __init__(self, page: str):
+        self.page = page
+        self.started = time.monotonic()
+        self.queries = []                  # (nome, formato dos parâmetros, ms)
+        self._same_params = Counter()      # (nome, hash dos parâmetros) -> vezes
+        self._distinct = {}                # nome -> {hash dos parâmetros}
+        self._calls = Counter()            # (função, hash dos argumentos) -> vezes
+        self.finished = False
+        self.elapsed_ms = None
+
+    def add_query(self, name: str, params, ms: float):
+        key = _params_key(params)
+        self.queries.append((name, param_shape(params), ms))
+        self._same_params[(name, key)] += 1
+        self._distinct.setdefault(name, set()).add(key)
+
+    def add_call(self, fn_name: str, args, kwargs):
+        self._calls[(fn_name, _params_key((args, sorted(kwargs.items()))))] += 1
+
+    @property
+    def db_ms(self) -> float:
+        return sum(q[2] for q in self.queries)
+
+    def by_statement(self) -> list[dict]:
+        out = {}
+        for name, _, ms in self.queries:
+            s = out.setdefault(name, {"name": name, "calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            s["calls"] += 1
+            s["total_ms"] += ms
+            s["max_ms"] = max(s["max_ms"], ms)
+        for s in out.values():
+            s["total_ms"] = round(s["total_ms"], 3)
+            s["max_ms"] = round(s["max_ms"], 3)
+        return sorted(out.values(), key=lambda s: -s["total_ms"])
+
+    def warnings(self) -> list[str]:
+        out = []
+        for (name, _), n in self._same_params.items():
+            if n > 1:
+                out.append(f"{name}: {n}× com os mesmos parâmetros")
+        for (fn_name, _), n in self._calls.items():
+            if n > 1:
+                out.append(f"{fn_name}(): chamada {n}× com os mesmos argumentos")
+        for name, keys in self._distinct.items():
+            if len(keys) >= N_PLUS_ONE_MIN:
+                out.append(f"{name}: {len(keys)} execuções com parâmetros diferentes (N+1?)")
+        return sorted(out)
+
+    def summary(self) -> dict:
+        return {
+            "page": self.page,
+            "queries": len(self.queries),
+            "db_ms": round(self.db_ms, 3),
+            "elapsed_ms": self.elapsed_ms,
+            "statements": self.by_statement(),
+            "warnings": self.warnings(),
+        }
+
+
+def _params_key(params) -> int:
+    # só o hash: o rastro não guarda valor de parâmetro
+    try:
+        return hash(params)
+    except TypeError:
+        return hash(repr(params))
+
+
+# --------------------------------------------------
+# Coleta
+# --------------------------------------------------
+
+_trace = contextvars.ContextVar("db_trace", default=None)
+_lock = threading.Lock()
+_by_statement: dict[str, Histogram] = {}
+_by_page: dict[str, dict] = {}
+_slow = deque(maxlen=200)
+
+def record(name: str, params, seconds: float):
+    """Observador do registro de consultas (db.Q.observer)."""
+    ms = seconds * 1000.0
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_query(name, params, ms)
+    with _lock:
+        hist = _by_statement.get(name)
+        if hist is None:
+            hist = _by_statement[name] = Histogram()
+        hist.add(ms)
+    if ms >= SLOW_MS:
+        _log_slow(name, params, ms, trace.page if trace is not None else None)
+
+def _log_slow(name, params, ms, page):
+    entry = {
+        "at": datetime.utcnow().isoformat(timespec="seconds"),
+        "name": name,
+        "ms": round(ms, 1),
+        "params": param_shape(params),
+        "page": page,
+    }
+    with _lock:
+        _slow.append(entry)
+        if not SLOW_LOG:
+            return
+        try:
+            path = Path(SLOW_LOG)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError as e:
+            print(f"[profiler] não consegui gravar o log de consultas lentas: {e}", file=sys.stderr)
+
+def note_call(fn_name: str, args, kwargs):
+    """Leitura do utils/db.py chamada neste rerun (conta mesmo quando o cache responde)."""
+    trace = _trace.get()
+    if trace is not None:
+        trace.add_call(fn_name, args, kwargs)
+
+def start_rerun(page: str) -> Trace | None:
+    """Abre o rastro do rerun atual (no contexto da thread do script)."""
+    if not PROFILE_ENABLED:
+        return None
+    trace = Trace(page)
+    _trace.set(trace)
+    return trace
+
+def finish_rerun(trace: Trace | None):
+    """Fecha o rastro (uma vez só) e soma nos números da página."""
+    if trace is None or trace.finished:
+        return
+    trace.finished = True
+    if _trace.get() is trace:
+        _trace.set(None)
+    trace.elapsed_ms = round((time.monotonic() - trace.started) * 1000.0, 1)
+    with _lock:
+        page = _by_page.setdefault(trace.page, {"reruns": 0, "queries": 0, "max_queries": 0, "db_ms": Histogram()})
+        page["reruns"] += 1
+        page["queries"] += len(trace.queries)
+        page["max_queries"] = max(page["max_queries"], len(trace.queries))
+        page["db_ms"].add(trace.db_ms)
+
+def current_trace() -> Trace | None:
+    return _trace.get()
+
+
+# --------------------------------------------------
+# Leitura
+# --------------------------------------------------
+
+def statement_stats() -> dict:
+    """{consulta: histograma} desde a subida do processo."""
+    with _lock:
+        return {name: h.as_dict() for name, h in sorted(_by_statement.items())}
+
+def page_stats() -> dict:
+    """{página: reruns, consultas por rerun (média/máx) e tempo de banco por rerun}."""
+    with _lock:
+        return {
+            name: {
+                "reruns": p["reruns"],
+                "avg_queries": round(p["queries"] / p["reruns"], 1) if p["reruns"] else 0.0,
+                "max_queries": p["max_queries"],
+                "db_ms": p["db_ms"].as_dict(),
+            }
+            for name, p in sorted(_by_page.items())
+        }
+
+def slow_queries() -> list[dict]:
+    """Consultas lentas mais recentes primeiro."""
+    with _lock:
+        return list(reversed(_slow))
+
+def reset():
+    with _lock:
+        _by_statement.clear()
+        _by_page.clear()
+        _slow.clear()
@@ -0,0 +1,233 @@
+"""
+Registro de consultas: cada SQL é escrito uma vez só (estilo SQLite, com ?) e
+traduzido para o dialeto ativo quando é registrado (na importação do utils/db.py).
+
+    Q.define("patients.get", "SELECT * FROM patients WHERE id = ? AND user_id = ?")
+    Q.run(cur, "patients.get", (patient_id, user_id)).fetchone()
+
+- Postgres: a consulta vira prepared statement do servidor — PREPARE na primeira vez
+  em cada conexão, EXECUTE nas seguintes —, então parse/plano saem do caminho das
+  consultas curtas. DB_PG_PREPARE=0 desliga (ex.: PgBouncer em modo transaction).
+- SQLite: o cache de statements do sqlite3 (cached_statements) é dimensionado pelo registro.
+- Q.stats(): quantas vezes cada consulta rodou (e quantas vezes foi preparada).
+- Q.sql(): o texto pronto para outro driver (a camada assíncrona usa o mesmo registro).
+- Q.stream(): resultado grande em lotes (cursor do servidor no Postgres, fetchmany no SQLite).
+- Q.observer: chamado com (nome, parâmetros, segundos) depois de cada execução
+  (o utils/db.py liga o utils/profiler.py aqui).
+"""
+import os
+import re
+import time
+import itertools
+import threading
+
+PG_PREPARE = os.getenv("DB_PG_PREPARE", "1") != "0"
+
+
+def _compact(sql: str) -> str:
+    # uma linha só: fica legível em log/estatística
+    return " ".join(line.strip() for line in sql.strip().splitlines() if line.strip())
+
+def _translate(sql: str) -> tuple[str, str, int]:
+    """
+    ? -> (%s para o psycopg2, $n para PREPARE, nº de parâmetros).
+    ? dentro de '...' não é parâmetro. % vira %% só na versão do psycopg2
+    (o PREPARE roda sem parâmetros, então o psycopg2 não mexe no texto).
+    """
+    fmt, num = [], []
+    n = 0
+    in_str = False
+    for ch in sql:
+        if ch == "'":
+            in_str = not in_str
+        elif ch == "?" and not in_str:
+            n += 1
+            fmt.append("%s")
+            num.append(f"${n}")
+            continue
+        fmt.append("%%" if ch == "%" else ch)
+        num.append(ch)
+    return "".join(fmt), "".join(num), n
+
+
+class Statement:
+    def __init__(self, name: str, sql: str, pg: str | None = None, returning: str | None = None):
+        self.name = name
+        self.returning = returning
+        self.sqlite = _compact(sql)
+
+        src = _compact(pg if pg is not None else sql)
+        if returning:
+            src += f" RETURNING {returning}"
+        self.pg, self.pg_numbered, self.nparams = _translate(src)
+
+        self.prepared_name = "q_" + re.sub(r"\W", "_", name)
+        self.pg_prepare = f"PREPARE {self.prepared_name} AS {self.pg_numbered}"
+        args = f" ({', '.join(['%s'] * self.nparams)})" if self.nparams else ""
+        self.pg_execute = f"EXECUTE {self.prepared_name}{args}"
+
+    def __repr__(self):
+        return f"<Statement {self.name}>"
+
+
+class QueryRegistry:
+    def __init__(self, postgres: bool, prepare: bool = PG_PREPARE):
+        self.postgres = postgres
+        self.prepare = prepare
+        self._stmts: dict[str, Statement] = {}
+        self._calls: dict[str, int] = {}
+        self._prepares: dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._cursor_ids = itertools.count(1)
+        self.observer = None
+
+    def define(self, name: str, sql: str, pg: str | None = None, returning: str | None = None) -> Statement:
+        """
+        Registra uma consulta. `pg` só quando o Postgres precisa de outro texto (ILIKE, ANY, ...);
+        `returning="id"` faz o INSERT devolver o id no Postgres (no SQLite vale o lastrowid).
+        """
+        if name in self._stmts:
+            raise ValueError(f"Consulta já registrada: {name}")
+        stmt = Statement(name, sql, pg=pg, returning=returning)
+        self._stmts[name] = stmt
+        return stmt
+
+    def __getitem__(self, name: str) -> Statement:
+        return self._stmts[name]
+
+    def __len__(self):
+        return len(self._stmts)
+
+    def __iter__(self):
+        return iter(self._stmts.values())
+
+    def sqlite_cache_size(self) -> int:
+        # todas as consultas do registro + folga para SQL avulso (migrations, relatórios)
+        return max(128, 2 * len(self._stmts))
+
+    def _count(self, counter: dict, name: str, n: int = 1):
+        with self._lock:
+            counter[name] = counter.get(name, 0) + n
+
+    # ---------- execução ----------
+
+    def sql(self, name: str, numbered: bool = False) -> str:
+        """
+        Só o texto, para drivers que executam por conta própria (utils/db_async.py):
+        numbered=True → versão Postgres com $1, $2... (asyncpg); senão a versão com ? (aiosqlite).
+        """
+        stmt = self._stmts[name]
+        self._count(self._calls, name)
+        return stmt.pg_numbered if numbered else stmt.sqlite
+
+    def run(self, cur, name: str, params=()):
+        """Executa a consulta registrada `name` no cursor e devolve o cursor."""
+        stmt = self._stmts[name]
+        self._count(self._calls, name)
+        started = time.perf_counter()
+        try:
+            self._execute(cur, stmt, params)
+        finally:
+            if self.observer is not None:
+                self.observer(name, params, time.perf_counter() - started)
+        return cur
+
+    def _execute(self, cur, stmt: Statement, params):
+        if not self.postgres:
+            cur.execute(stmt.sqlite, params)
+            return
+
+        prepared = getattr(cur.connection, "prepared", None) if self.prepare else None
+        if prepared is None:
+            cur.execute(stmt.pg, params)
+            return
+        if stmt.prepared_name not in prepared:
+            cur.execute(stmt.pg_prepare)
+            prepared.add(stmt.prepared_name)
+            self._count(self._prepares, stmt.name)
+        cur.execute(stmt.pg_execute, params)
+
+    def insert(self, cur, name: str, params=()):
+        """INSERT registrado com returning="id" → id da linha nova nos dois bancos."""
+        self.run(cur, name, params)
+        if self.postgres:
+            return cur.fetchone()[self._stmts[name].returning]
+        return cur.lastrowid
+
+    def run_many(self, cur, name: str, rows: list):
+        """
+        Várias linhas de uma vez. No SQLite é executemany do texto normal; no Postgres é
+        execute_values, então a versão `pg` precisa ter um único ? no lugar do VALUES (...).
+        """
+        stmt = self._stmts[name]
+        self._count(self._calls, name)
+        started = time.perf_counter()
+        try:
+            if self.postgres:
+                from psycopg2.extras import execute_values
+                execute_values(cur, stmt.pg, rows, page_size=max(1, len(rows)))
+            else:
+                cur.executemany(stmt.sqlite, rows)
+        finally:
+            if self.observer is not None:
+                self.observer(name, rows, time.perf_counter() - started)
+        return cur
+
+    def stream(self, conn, name: str, params=(), batch: int = 1000):
+        """
+        Gera o resultado em lotes (listas de até `batch` linhas) sem trazer tudo para a memória.
+        Postgres: cursor com nome (DECLARE/FETCH no servidor; o psycopg2 busca `batch` por vez),
+        que não combina com PREPARE — roda o texto normal. SQLite: fetchmany, o sqlite3 já
+        anda pelo resultado sob demanda. A conexão tem que ficar aberta até o fim do loop.
+        """
+        stmt = self._stmts[name]
+        self._count(self._calls, name)
+        started = time.perf_counter()
+        try:
+            if self.postgres:
+                cur = conn.cursor(name=f"{stmt.prepared_name}_{next(self._cursor_ids)}")
+                cur.itersize = batch
+                cur.execute(stmt.pg, params)
+            else:
+                cur = conn.cursor()
+                cur.execute(stmt.sqlite, params)
+        finally:
+            if self.observer is not None:
+                self.observer(name, params, time.perf_counter() - started)
+        try:
+            while True:
+                rows = cur.fetchmany(batch)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            cur.close()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {"calls": self._calls.get(name, 0), "prepares": self._prepares.get(name, 0)}
+                for name in sorted(self._stmts)
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self._calls.clear()
+            self._prepares.clear()
+
+
+_pg_connection_cls = None
+
+def pg_connection_class():
+    """connection_factory do psycopg2 que guarda os statements já preparados na conexão."""
+    global _pg_connection_cls
+    if _pg_connection_cls is None:
+        from psycopg2.extensions import connection
+
+        class PreparingConnection(connection):
+            def __init__(self, *args, **kwargs):
+                super().__init__(*args, **kwargs)
+                self.prepared = set()
+
+        _pg_connection_cls = PreparingConnection
+    return _pg_connection_cls